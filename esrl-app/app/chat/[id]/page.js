@@ -80,7 +80,7 @@ export default function DocumentPage() {
                 headers: {
                     "Content-Type": "application/json",
                 },
-                body: JSON.stringify({}),
+                body: JSON.stringify({ document_id: decodeURIComponent(docId) }),
             })
                 .then((res) => {
                     if (!res.ok) throw new Error("Summary request failed")
@@ -102,7 +102,7 @@ export default function DocumentPage() {
                 headers: {
                     "Content-Type": "application/json",
                 },
-                body: JSON.stringify({}),
+                body: JSON.stringify({ document_id: decodeURIComponent(docId) }),
             })
                 .then((res) => {
                     if (!res.ok) throw new Error("Notes request failed")
@@ -166,50 +166,89 @@ export default function DocumentPage() {
     useEffect(() => {
         if (!gameTaskId) return
 
-        let intervalId = null
+        // Status is pushed over server-sent events; if the stream cannot be
+        // opened, fall back to long-polling /game/status with the last version.
+        let cancelled = false
+        let eventSource = null
+        let lastVersion = -1
+        const abortController = new AbortController()
 
-        const pollStatus = async () => {
-            try {
-                const response = await fetch(`${apiBase}/game/status/${gameTaskId}`)
-                if (!response.ok) {
-                    throw new Error("Could not fetch game status")
-                }
-                const data = await response.json()
-                setGameStatus(data.status || "queued")
-                setGamePhase(data.phase || "")
+        const applyStatus = async (data) => {
+            if (typeof data.version === "number") lastVersion = data.version
+            setGameStatus(data.status || "queued")
+            setGamePhase(data.phase || "")
+
+            if (data.status === "failed") {
+                setGameError(data.error || "Game generation failed.")
+            }
 
-                if (data.status === "failed") {
-                    setGameError(data.error || "Game generation failed.")
+            if (data.status === "completed" && !hasAutoLaunched.current) {
+                hasAutoLaunched.current = true
+                setGameLaunching(true)
+                try {
+                    const launchResponse = await fetch(`${apiBase}/game/launch/${gameTaskId}`, {
+                        method: "POST",
+                    })
+                    const launchData = await launchResponse.json()
+                    if (!launchResponse.ok) {
+                        throw new Error(launchData?.error || "Game launch failed.")
+                    }
+                } catch (err) {
+                    console.error("Game launch failed:", err)
+                    setGameError("Game generated, but auto-launch failed. Try Launch Game.")
+                } finally {
+                    setGameLaunching(false)
                 }
+            }
+            return data.status === "completed" || data.status === "failed"
+        }
 
-                if (data.status === "completed" && !hasAutoLaunched.current) {
-                    hasAutoLaunched.current = true
-                    setGameLaunching(true)
-                    try {
-                        const launchResponse = await fetch(`${apiBase}/game/launch/${gameTaskId}`, {
-                            method: "POST",
-                        })
-                        const launchData = await launchResponse.json()
-                        if (!launchResponse.ok) {
-                            throw new Error(launchData?.error || "Game launch failed.")
-                        }
-                    } catch (err) {
-                        console.error("Game launch failed:", err)
-                        setGameError("Game generated, but auto-launch failed. Try Launch Game.")
-                    } finally {
-                        setGameLaunching(false)
+        const longPoll = async () => {
+            while (!cancelled) {
+                try {
+                    const response = await fetch(
+                        `${apiBase}/game/status/${gameTaskId}?since=${lastVersion}&wait=25`,
+                        { signal: abortController.signal }
+                    )
+                    if (!response.ok) {
+                        throw new Error("Could not fetch game status")
                     }
+                    if (await applyStatus(await response.json())) return
+                } catch (err) {
+                    if (cancelled) return
+                    console.error("Game status poll failed:", err)
+                    await new Promise((resolve) => setTimeout(resolve, 4000))
                 }
-            } catch (err) {
-                console.error("Game status poll failed:", err)
             }
         }
 
-        pollStatus()
-        intervalId = setInterval(pollStatus, 4000)
+        if (typeof EventSource === "undefined") {
+            longPoll()
+        } else {
+            eventSource = new EventSource(`${apiBase}/game/status/${gameTaskId}/events`)
+            eventSource.addEventListener("status", (event) => {
+                const data = JSON.parse(event.data)
+                // Closed before the auto-launch request so the stream ending
+                // does not trigger a reconnect.
+                if ((data.status === "completed" || data.status === "failed") && eventSource) {
+                    eventSource.close()
+                    eventSource = null
+                }
+                applyStatus(data)
+            })
+            eventSource.onerror = () => {
+                // EventSource reconnects by itself after a dropped stream; only
+                // give up on it when the server refused it outright.
+                if (!eventSource || eventSource.readyState !== EventSource.CLOSED) return
+                eventSource = null
+                longPoll()
+            }
+        }
 
         return () => {
-            if (intervalId) clearInterval(intervalId)
+            cancelled = true
+            abortController.abort()
+            if (eventSource) eventSource.close()
         }
     }, [apiBase, gameTaskId])
 
@@ -650,20 +689,52 @@ function ChatPanel({ apiBase }) {
                             headers: {
                                 "Content-Type": "application/json",
                             },
-                            body: JSON.stringify({ messages: updatedMessages }),
+                            body: JSON.stringify({ messages: updatedMessages, stream: true }),
                         })
 
-                        const data = await response.json()
-                        const answer = response.ok && data?.answer ? data.answer : "Sorry, I could not get a response."
+                        if (!response.ok || !response.body) {
+                            throw new Error("Chat request failed")
+                        }
+
+                        // The backend streams newline-delimited JSON events:
+                        // one "context" event (sources + images), then "token" events, then "done".
+                        let answer = ""
+                        let images = []
+                        const reader = response.body.getReader()
+                        const decoder = new TextDecoder()
+                        let buffer = ""
+
+                        const handleEvent = (event) => {
+                            if (event.type === "context") {
+                                images = Array.isArray(event.images)
+                                    ? event.images.map((image) => ({
+                                          ...image,
+                                          url: buildMediaUrl(image.url || image.path, apiBase),
+                                      }))
+                                    : []
+                            } else if (event.type === "token") {
+                                answer += event.text || ""
+                            } else if (event.type === "error") {
+                                throw new Error(event.detail || "Chat stream failed")
+                            }
+                            setMessages([...updatedMessages, { role: "assistant", content: answer, images }])
+                        }
 
-                        const images = Array.isArray(data?.images)
-                            ? data.images.map((image) => ({
-                                  ...image,
-                                  url: buildMediaUrl(image.url || image.path, apiBase),
-                              }))
-                            : []
+                        while (true) {
+                            const { value, done } = await reader.read()
+                            if (done) break
+                            buffer += decoder.decode(value, { stream: true })
+                            const lines = buffer.split("\n")
+                            buffer = lines.pop()
+                            for (const line of lines) {
+                                if (line.trim()) handleEvent(JSON.parse(line))
+                            }
+                        }
+                        if (buffer.trim()) handleEvent(JSON.parse(buffer))
 
-                        setMessages([...updatedMessages, { role: "assistant", content: answer, images }])
+                        if (!answer) {
+                            setMessages([...updatedMessages, { role: "assistant", content: "Sorry, I could not get a response.", images }])
+                        }
                     } catch (err) {
                         console.error("Chat request failed:", err)
                         setMessages([...updatedMessages, { role: "assistant", content: "Sorry, something went wrong." }])
@@ -0,0 +1,147 @@
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from app.services.env_utils import env_bool, env_float, env_list
+from app.services.metrics_service import counter, register_gauge
+
+# Heavy endpoints admitted per worker: (concurrent, waiting). Each video run
+# starts its own Chromium plus FFmpeg processes and each upload runs OCR and
+# embedding, so past these limits requests are shed with 429 + Retry-After
+# instead of piling up until the node runs out of memory.
+DEFAULT_ADMISSION_LIMITS = "upload_pdf=2:8,generate_video=1:2,game_generate=2:4"
+
+ADMISSION_ENABLED = env_bool("ADMISSION_ENABLED", True)
+# Longest a request waits in the queue before it is shed as well.
+ADMISSION_QUEUE_TIMEOUT_SECONDS = env_float("ADMISSION_QUEUE_TIMEOUT_SECONDS", 120.0, minimum=1.0)
+# Retry-After estimate before any request on an endpoint has finished.
+_DEFAULT_SERVICE_SECONDS = 10.0
+_EWMA_WEIGHT = 0.2
+
+ADMISSION_DECISIONS = counter(
+    "esrl_admission_total", "Admission decisions by endpoint.", ("endpoint", "outcome")
+)
+
+
+def _parse_limits() -> Dict[str, Tuple[int, int]]:
+    # ADMISSION_LIMITS="upload_pdf=2:8,generate_video=1:2" (concurrent:queue)
+    limits: Dict[str, Tuple[int, int]] = {}
+    for item in env_list("ADMISSION_LIMITS", DEFAULT_ADMISSION_LIMITS):
+        endpoint, _, raw = item.partition("=")
+        concurrent, _, queue = raw.partition(":")
+        try:
+            limits[endpoint.strip()] = (max(1, int(concurrent)), max(0, int(queue or 0)))
+        except ValueError:
+            continue
+    return limits
+
+
+ADMISSION_LIMITS = _parse_limits()
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, endpoint: str, retry_after: int, reason: str):
+        super().__init__(f"{endpoint} is at capacity ({reason}); retry in {retry_after}s")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class _Gate:
+    def __init__(self, limit: int, queue: int):
+        self.limit = limit
+        self.queue = queue
+        self.active = 0
+        self.waiting = 0
+        self.avg_seconds: Optional[float] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Created on first use so it binds to the serving event loop.
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        return self._semaphore
+
+    def retry_after(self) -> int:
+        # Roughly when a slot frees up for someone joining the back of the queue.
+        per_request = self.avg_seconds or _DEFAULT_SERVICE_SECONDS
+        return max(1, math.ceil(per_request * (self.waiting + 1) / self.limit))
+
+    def record(self, seconds: float) -> None:
+        if self.avg_seconds is None:
+            self.avg_seconds = seconds
+        else:
+            self.avg_seconds += _EWMA_WEIGHT * (seconds - self.avg_seconds)
+
+
+_gates: Dict[str, _Gate] = {
+    endpoint: _Gate(limit, queue) for endpoint, (limit, queue) in ADMISSION_LIMITS.items()
+}
+
+
+def _reject(endpoint: str, gate: _Gate, reason: str) -> AdmissionRejected:
+    ADMISSION_DECISIONS.inc(endpoint, reason)
+    return AdmissionRejected(endpoint, gate.retry_after(), reason)
+
+
+@asynccontextmanager
+async def admit(endpoint: str) -> AsyncIterator[None]:
+    # Holds one of the endpoint's slots for the duration of the block. Waits in
+    # a bounded FIFO queue when all slots are busy; raises AdmissionRejected
+    # when the queue is full or the wait times out. Endpoints without a
+    # configured limit pass straight through.
+    gate = _gates.get(endpoint)
+    if gate is None or not ADMISSION_ENABLED:
+        yield
+        return
+
+    if gate.semaphore.locked():
+        if gate.waiting >= gate.queue:
+            raise _reject(endpoint, gate, "rejected")
+        gate.waiting += 1
+        try:
+            await asyncio.wait_for(gate.semaphore.acquire(), ADMISSION_QUEUE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            raise _reject(endpoint, gate, "timeout") from None
+        finally:
+            gate.waiting -= 1
+        ADMISSION_DECISIONS.inc(endpoint, "queued")
+    else:
+        await gate.semaphore.acquire()
+        ADMISSION_DECISIONS.inc(endpoint, "admitted")
+
+    gate.active += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        gate.active -= 1
+        gate.record(time.perf_counter() - started)
+        gate.semaphore.release()
+
+
+def get_admission_stats() -> Dict[str, Dict]:
+    return {
+        endpoint: {
+            "max_concurrent": gate.limit,
+            "max_queue": gate.queue,
+            "active": gate.active,
+            "waiting": gate.waiting,
+            "avg_seconds": round(gate.avg_seconds, 3) if gate.avg_seconds is not None else None,
+            "retry_after": gate.retry_after()
+        }
+        for endpoint, gate in _gates.items()
+    }
+
+
+register_gauge(
+    "esrl_admission_active", "Admitted requests currently running.", ("endpoint",),
+    lambda: [((endpoint,), gate.active) for endpoint, gate in _gates.items()]
+)
+register_gauge(
+    "esrl_admission_waiting", "Requests waiting for admission.", ("endpoint",),
+    lambda: [((endpoint,), gate.waiting) for endpoint, gate in _gates.items()]
+)
@@ -0,0 +1,148 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Hashable, List, Optional, Tuple
+
+from app.services.env_utils import env_bool, env_float, env_int
+from app.services.metrics_service import register_gauge
+
+ANSWER_CACHE_ENABLED = env_bool("ANSWER_CACHE_ENABLED", True)
+ANSWER_CACHE_SIMILARITY = env_float("ANSWER_CACHE_SIMILARITY", 0.95)
+ANSWER_CACHE_TTL_SECONDS = env_float("ANSWER_CACHE_TTL_SECONDS", 1800.0)
+ANSWER_CACHE_MAX_ENTRIES = env_int("ANSWER_CACHE_MAX_ENTRIES", 1024)
+
+
+def _normalize(vector: List[float]) -> List[float]:
+    norm = math.sqrt(sum(value * value for value in vector))
+    if norm == 0:
+        return list(vector)
+    return [value / norm for value in vector]
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    return sum(x * y for x, y in zip(a, b))
+
+
+class SemanticAnswerCache:
+    # An entry only matches when the exact same chunk-id set was retrieved, so a
+    # similar question that pulls different context is never answered from cache.
+
+    def __init__(self, threshold: float, ttl_seconds: float, max_entries: int):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._by_context: Dict[Hashable, List[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        ids = self._by_context.get(entry["context_key"], [])
+        if entry_id in ids:
+            ids.remove(entry_id)
+        if not ids:
+            self._by_context.pop(entry["context_key"], None)
+
+    def lookup(self, embedding: List[float], context_key: Hashable) -> Optional[str]:
+        query = _normalize(embedding)
+        now = time.monotonic()
+        with self._lock:
+            best_id = None
+            best_score = self.threshold
+            for entry_id in list(self._by_context.get(context_key, [])):
+                entry = self._entries[entry_id]
+                if now - entry["created_at"] > self.ttl_seconds:
+                    self._remove(entry_id)
+                    self.expirations += 1
+                    continue
+                score = _cosine(query, entry["embedding"])
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id]["answer"]
+
+    def store(self, embedding: List[float], context_key: Hashable, answer: str) -> None:
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                "embedding": _normalize(embedding),
+                "context_key": context_key,
+                "answer": answer,
+                "created_at": time.monotonic()
+            }
+            self._by_context.setdefault(context_key, []).append(entry_id)
+            while len(self._entries) > self.max_entries:
+                oldest_id = next(iter(self._entries))
+                self._remove(oldest_id)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_context.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": ANSWER_CACHE_ENABLED,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "similarity_threshold": self.threshold,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+_answer_cache = SemanticAnswerCache(
+    ANSWER_CACHE_SIMILARITY,
+    ANSWER_CACHE_TTL_SECONDS,
+    ANSWER_CACHE_MAX_ENTRIES
+)
+
+
+def answer_context_key(model_name: str, chunk_ids: List[str]) -> Tuple[str, FrozenSet[str]]:
+    return model_name, frozenset(chunk_ids)
+
+
+def lookup_answer(embedding: List[float], context_key: Hashable) -> Optional[str]:
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    return _answer_cache.lookup(embedding, context_key)
+
+
+def store_answer(embedding: List[float], context_key: Hashable, answer: str) -> None:
+    if not ANSWER_CACHE_ENABLED or not answer:
+        return
+    _answer_cache.store(embedding, context_key, answer)
+
+
+def get_answer_cache_stats() -> Dict:
+    return _answer_cache.stats()
+
+
+register_gauge(
+    "esrl_answer_cache", "Semantic answer cache counters.", ("field",),
+    lambda: [
+        ((field,), value) for field, value in get_answer_cache_stats().items()
+        if field in ("entries", "hits", "misses", "evictions", "expirations", "hit_rate")
+    ]
+)
@@ -0,0 +1,140 @@
+import json
+import os
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.content_selection_service import select_document_chunks, select_text
+from app.services.derived_cache_service import content_hash, derived_dir, get_or_generate, load_document_text
+from app.services.embedding_service import get_images_for_document
+from app.services.env_utils import env_int
+from app.services.executor_service import run_cpu, run_io
+from app.services.llm_gateway import PRIORITY_INTERACTIVE
+from app.services.notes_service import MODEL_NAME as NOTES_MODEL_NAME
+from app.services.notes_service import NOTES_PROMPT_VERSION, NOTES_TOKEN_BUDGET, generate_quick_notes
+from app.services.summarizer_service import MODEL_NAME as SUMMARY_MODEL_NAME
+from app.services.singleflight_service import coalesce
+from app.services.summarizer_service import SUMMARY_PROMPT_VERSION, summarize_text_levels
+from app.services.video_gen_service import MODEL_NAME as SLIDE_PLAN_MODEL_NAME
+from app.services.video_gen_service import (
+    SLIDE_PLAN_PROMPT_VERSION,
+    SLIDE_PLAN_TOKEN_BUDGET,
+    generate_slide_plan,
+    normalize_chroma_images
+)
+
+# Derived artifacts shared by the endpoints and the post-ingest precompute, so
+# both read and fill the same on-disk cache entries.
+
+STUDY_NOTES_TOKEN_BUDGET = env_int("STUDY_NOTES_TOKEN_BUDGET", 3000)
+STUDY_NOTES_VERSION = "2"
+
+
+def _notes_cacheable(notes: Any) -> bool:
+    # generate_quick_notes falls back to {"notes": raw} when the reply is not JSON.
+    return isinstance(notes, dict) and bool(notes) and "notes" not in notes
+
+
+async def _notes_source(text: str, document_id: Optional[str]) -> str:
+    # Stored documents reuse their Chroma vectors; ad-hoc text is embedded on the fly.
+    if document_id:
+        chunks = await run_cpu(select_document_chunks, document_id, NOTES_TOKEN_BUDGET)
+        if chunks:
+            return "\n\n".join(chunk["text"] for chunk in chunks)
+    return await run_cpu(select_text, text, NOTES_TOKEN_BUDGET)
+
+
+# get_notes and get_summary return (result, cache_hit, shared). Concurrent
+# calls for the same text share one computation, whichever of the endpoints
+# or the post-ingest precompute starts it, and run at the first caller's
+# priority.
+
+
+async def get_notes(
+    text: str,
+    refresh: bool = False,
+    priority: int = PRIORITY_INTERACTIVE,
+    document_id: Optional[str] = None
+) -> Tuple[Dict, bool, bool]:
+    async def generate() -> Dict:
+        return await generate_quick_notes(await _notes_source(text, document_id), priority=priority)
+
+    (notes, hit), shared = await coalesce(
+        "notes", [content_hash(text), document_id, refresh],
+        partial(
+            get_or_generate, "notes", text, NOTES_PROMPT_VERSION, NOTES_MODEL_NAME, generate,
+            refresh=refresh,
+            cacheable=_notes_cacheable
+        )
+    )
+    return notes, hit, shared
+
+
+async def get_summary(
+    text: str,
+    refresh: bool = False,
+    priority: int = PRIORITY_INTERACTIVE
+) -> Tuple[Dict, bool, bool]:
+    (summary, hit), shared = await coalesce(
+        "summary", [content_hash(text), refresh],
+        partial(
+            get_or_generate, "summary", text, SUMMARY_PROMPT_VERSION, SUMMARY_MODEL_NAME,
+            partial(summarize_text_levels, text, priority=priority),
+            refresh=refresh,
+            cacheable=lambda result: bool((result or {}).get("summary")) and not result.get("failed_batches")
+        )
+    )
+    return summary, hit, shared
+
+
+def build_study_notes(document_id: str, token_budget: int = STUDY_NOTES_TOKEN_BUDGET) -> str:
+    # Raises LookupError when the document has no chunks.
+    chunks = select_document_chunks(document_id, token_budget)
+    if not chunks:
+        raise LookupError(f"No chunks found for document_id: {document_id}")
+    return "\n\n".join(chunk["text"].strip() for chunk in chunks).strip()
+
+
+async def get_study_notes(document_id: str, refresh: bool = False) -> Tuple[str, bool]:
+    text = await run_io(load_document_text, document_id)
+    build = partial(run_cpu, build_study_notes, document_id)
+    if text is None:
+        return await build(), False
+    return await get_or_generate(
+        "study_notes", text, STUDY_NOTES_VERSION, "chunks", build,
+        refresh=refresh,
+        variant=str(STUDY_NOTES_TOKEN_BUDGET)
+    )
+
+
+def load_slide_inputs(document_id: str) -> Tuple[List[Dict], List[Dict]]:
+    text_chunks = select_document_chunks(document_id, SLIDE_PLAN_TOKEN_BUDGET)
+    image_chunks = normalize_chroma_images(get_images_for_document(document_id))
+    return text_chunks, image_chunks
+
+
+async def get_slide_plan(
+    document_id: str,
+    text_chunks: List[Dict],
+    image_chunks: List[Dict],
+    refresh: bool = False
+) -> Tuple[Any, bool]:
+    text = await run_io(load_document_text, document_id)
+    generate = partial(generate_slide_plan, text_chunks, image_chunks)
+    if text is None:
+        return await generate(), False
+    # The plan references image ids, so the exact inputs are part of the key.
+    variant = json.dumps([
+        [chunk.get("text") for chunk in text_chunks],
+        [[image.get("id"), image.get("caption")] for image in image_chunks]
+    ])
+    return await get_or_generate(
+        "slide_plan", text, SLIDE_PLAN_PROMPT_VERSION, SLIDE_PLAN_MODEL_NAME, generate,
+        refresh=refresh,
+        cacheable=lambda plan: isinstance(plan, list) and bool(plan),
+        variant=variant
+    )
+
+
+def get_tts_cache_dir(document_id: str) -> Optional[str]:
+    text = load_document_text(document_id)
+    return None if text is None else os.path.join(derived_dir(text), "tts")
@@ -1,8 +1,17 @@
+import json
+import os
+from typing import Dict, Iterator, List, Optional
+
 from app.services.embedding_service import get_chroma_collection
+from app.services.metrics_service import timed
 
 
 MAX_CHARS = 800
 OVERLAP_CHARS = 120
+MANIFEST_DIR = "storage/manifests"
+MANIFEST_FETCH_BATCH = 16
+
+os.makedirs(MANIFEST_DIR, exist_ok=True)
 
 
 def _split_paragraphs(text: str):
@@ -28,6 +37,7 @@ def _chunk_text(text: str):
     return chunks
 
 
+@timed("chunking")
 def chunk_sections(sections, document_id):
     chunks = []
     chunk_id = 0
@@ -53,7 +63,130 @@ def chunk_sections(sections, document_id):
 
     return chunks
 
-def get_chunks_for_document(document_id: str):
+def _manifest_path(document_id: str) -> str:
+    safe_id = "".join(ch if ch.isalnum() or ch in ("-", "_", ".") else "_" for ch in document_id)
+    return os.path.join(MANIFEST_DIR, f"{safe_id}.json")
+
+
+def build_chunk_manifest(chunks: List[Dict]) -> List[Dict]:
+    manifest = []
+    offset = 0
+    for chunk in chunks:
+        length = len(chunk.get("text") or "")
+        manifest.append({
+            "id": chunk["id"],
+            "page": chunk.get("page"),
+            "offset": offset,
+            "length": length
+        })
+        offset += length
+    return manifest
+
+
+def write_chunk_manifest(document_id: str, chunks: List[Dict]) -> List[Dict]:
+    manifest = build_chunk_manifest(chunks)
+    path = _manifest_path(document_id)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"document_id": document_id, "chunks": manifest}, f)
+    os.replace(tmp_path, path)
+    return manifest
+
+
+def load_chunk_manifest(document_id: str) -> Optional[List[Dict]]:
+    path = _manifest_path(document_id)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("chunks"), list):
+        return None
+    return data["chunks"]
+
+
+def delete_chunk_manifest(document_id: str) -> None:
+    path = _manifest_path(document_id)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _get_or_rebuild_manifest(document_id: str) -> List[Dict]:
+    manifest = load_chunk_manifest(document_id)
+    if manifest is not None:
+        return manifest
+
+    # Documents ingested before manifests existed: scan once, then persist.
+    chunks = _scan_chunks_for_document(document_id)
+    if not chunks:
+        return []
+    ordered = [
+        {"id": chunk["id"], "text": chunk["text"], "page": chunk["metadata"].get("page")}
+        for chunk in chunks
+    ]
+    return write_chunk_manifest(document_id, ordered)
+
+
+def spread_sample(items: List, limit: Optional[int]) -> List:
+    # At most `limit` items spaced evenly across the list, in order, so a
+    # capped read still covers the whole document rather than its start.
+    if limit is None or len(items) <= limit:
+        return list(items)
+    if limit <= 0:
+        return []
+    step = len(items) / limit
+    return [items[int(i * step)] for i in range(limit)]
+
+
+def iter_chunks_for_document(
+    document_id: str,
+    max_chars: Optional[int] = None,
+    batch_size: int = MANIFEST_FETCH_BATCH,
+    include_embeddings: bool = False,
+    max_chunks: Optional[int] = None
+) -> Iterator[Dict]:
+    # Reading order comes from the manifest; Chroma is hit one batch at a time,
+    # so consumers that stop early never fetch the rest of the document.
+    # max_chunks keeps an evenly spread subset of the (prefix-limited) manifest.
+    manifest = _get_or_rebuild_manifest(document_id)
+    if max_chars is not None:
+        manifest = [entry for entry in manifest if entry["offset"] < max_chars]
+    manifest = spread_sample(manifest, max_chunks)
+
+    collection = get_chroma_collection()
+    for start in range(0, len(manifest), batch_size):
+        batch = manifest[start:start + batch_size]
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        results = collection.get(
+            ids=[entry["id"] for entry in batch],
+            include=include
+        )
+        embeddings = results.get("embeddings") if include_embeddings else None
+        if embeddings is None:
+            embeddings = [None] * len(results["ids"])
+        by_id = {
+            chunk_id: (doc, meta, embedding)
+            for chunk_id, doc, meta, embedding in zip(
+                results["ids"], results["documents"], results["metadatas"], embeddings
+            )
+        }
+        for entry in batch:
+            if entry["id"] not in by_id:
+                continue
+            doc, meta, embedding = by_id[entry["id"]]
+            chunk = {
+                "id": entry["id"],
+                "text": doc,
+                "metadata": meta or {}
+            }
+            if include_embeddings:
+                chunk["embedding"] = embedding
+            yield chunk
+
+
+def _scan_chunks_for_document(document_id: str):
     collection = get_chroma_collection()
 
     results = collection.get(
@@ -74,10 +207,17 @@ def get_chunks_for_document(document_id: str):
             "metadata": results["metadatas"][i]
         })
 
-    # SORT BY PAGE
+    # SORT BY PAGE, then by chunk sequence within the page
     chunks = sorted(
         chunks,
-        key=lambda x: x["metadata"].get("page", 0)
+        key=lambda x: (x["metadata"].get("page") or 0, _chunk_sequence(x["id"]))
     )
 
-    return chunks
\ No newline at end of file
+    return chunks
+
+
+def _chunk_sequence(chunk_id: str) -> int:
+    try:
+        return int(chunk_id.rsplit("_", 1)[-1])
+    except ValueError:
+        return 0
@@ -1,31 +1,32 @@
 from typing import Dict, List
-import spacy
 
-_nlp = None
+from app.services.model_registry import register_model, use_model
 
 
-def _get_nlp():
-    global _nlp
-    if _nlp is None:
-        _nlp = spacy.load("en_core_web_sm")
-    return _nlp
+def _load_nlp():
+    import spacy
+
+    return spacy.load("en_core_web_sm")
+
+
+register_model("spacy", _load_nlp, idle_seconds=900)
 
 
 def extract_concepts(sections: List[Dict]) -> List[Dict]:
-    nlp = _get_nlp()
     concepts: List[Dict] = []
 
-    for section in sections:
-        doc = nlp(section.get("content", ""))
-        key_terms = [chunk.text for chunk in doc.noun_chunks][:5]
-        for term in key_terms:
-            concepts.append({
-                "concept": term,
-                "definition": "",
-                "prerequisites": [],
-                "related_concepts": [],
-                "heading": section.get("heading"),
-                "document_id": section.get("document_id")
-            })
+    with use_model("spacy") as nlp:
+        for section in sections:
+            doc = nlp(section.get("content", ""))
+            key_terms = [chunk.text for chunk in doc.noun_chunks][:5]
+            for term in key_terms:
+                concepts.append({
+                    "concept": term,
+                    "definition": "",
+                    "prerequisites": [],
+                    "related_concepts": [],
+                    "heading": section.get("heading"),
+                    "document_id": section.get("document_id")
+                })
 
     return concepts
@@ -0,0 +1,103 @@
+import math
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from app.services.chunk_service import MAX_CHARS as CHUNK_MAX_CHARS
+from app.services.chunk_service import iter_chunks_for_document, spread_sample
+from app.services.embedding_service import embed_texts
+from app.services.env_utils import env_float
+from app.services.metrics_service import timed
+
+CHARS_PER_TOKEN = 4
+# Maximal marginal relevance trade-off: 1.0 ranks purely by similarity to the
+# document centroid (representative), 0.0 purely by novelty (diverse).
+CONTENT_SELECTION_LAMBDA = min(1.0, env_float("CONTENT_SELECTION_LAMBDA", 0.5))
+# Candidates considered per selection, as a multiple of the chunks that fit
+# the budget. Larger documents are thinned evenly before anything is fetched
+# or embedded, so memory and MMR time stay bounded by the budget.
+CONTENT_SELECTION_CANDIDATE_FACTOR = env_float("CONTENT_SELECTION_CANDIDATE_FACTOR", 8.0, minimum=1.0)
+_MIN_CANDIDATES = 64
+# Raw text without stored chunks is split into pieces of about this size.
+_PIECE_CHARS = 800
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def _max_candidates(token_budget: int, chunk_chars: int = CHUNK_MAX_CHARS) -> int:
+    fitting = token_budget * CHARS_PER_TOKEN / chunk_chars
+    return max(_MIN_CANDIDATES, math.ceil(fitting * CONTENT_SELECTION_CANDIDATE_FACTOR))
+
+
+def mmr_select(
+    texts: Sequence[str],
+    embeddings: Sequence[Sequence[float]],
+    token_budget: int,
+    mmr_lambda: float = CONTENT_SELECTION_LAMBDA
+) -> List[int]:
+    # Greedy MMR under a token budget. Returns the chosen indices in their
+    # original (reading) order; everything is kept when it already fits.
+    costs = np.array([_estimate_tokens(text) for text in texts])
+    if not len(costs) or costs.sum() <= token_budget:
+        return list(range(len(costs)))
+
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1.0, norms)
+    centroid = vectors.mean(axis=0)
+    centroid = centroid / (np.linalg.norm(centroid) or 1.0)
+    relevance = vectors @ centroid
+    redundancy = np.zeros(len(costs), dtype=np.float32)
+
+    available = np.ones(len(costs), dtype=bool)
+    remaining = token_budget
+    selected: List[int] = []
+    while True:
+        candidates = available & (costs <= remaining)
+        if not candidates.any():
+            break
+        scores = mmr_lambda * relevance - (1 - mmr_lambda) * redundancy
+        scores[~candidates] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        remaining -= int(costs[best])
+        redundancy = np.maximum(redundancy, vectors @ vectors[best])
+    return sorted(selected)
+
+
+@timed("content_selection")
+def select_document_chunks(document_id: str, token_budget: int) -> List[Dict]:
+    # Diverse, representative chunks of a stored document under token_budget,
+    # in reading order, using the vectors already in Chroma.
+    chunks = [
+        chunk for chunk in iter_chunks_for_document(
+            document_id, include_embeddings=True, max_chunks=_max_candidates(token_budget)
+        )
+        if (chunk.get("text") or "").strip()
+    ]
+    if not chunks:
+        return []
+    embeddings = [chunk.pop("embedding", None) for chunk in chunks]
+    if any(embedding is None for embedding in embeddings):
+        embeddings = embed_texts([chunk["text"] for chunk in chunks])
+    indices = mmr_select([chunk["text"] for chunk in chunks], embeddings, token_budget)
+    return [chunks[index] for index in indices]
+
+
+@timed("content_selection")
+def select_text(text: str, token_budget: int) -> str:
+    # Same selection for ad-hoc text that was never ingested; pieces are
+    # embedded on the fly only when the text does not fit the budget.
+    if _estimate_tokens(text) <= token_budget:
+        return text
+    pieces: List[str] = []
+    for paragraph in (part.strip() for part in text.split("\n\n")):
+        pieces.extend(
+            paragraph[start:start + _PIECE_CHARS] for start in range(0, len(paragraph), _PIECE_CHARS)
+        )
+    pieces = spread_sample([piece for piece in pieces if piece], _max_candidates(token_budget, _PIECE_CHARS))
+    indices = mmr_select(pieces, embed_texts(pieces), token_budget)
+    return "\n\n".join(pieces[index] for index in indices)
@@ -0,0 +1,176 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+import threading
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.services.executor_service import run_io
+from app.services.metrics_service import counter
+
+TEXT_DIR = "storage/texts"
+DERIVED_DIR = "storage/derived"
+
+os.makedirs(TEXT_DIR, exist_ok=True)
+os.makedirs(DERIVED_DIR, exist_ok=True)
+
+DERIVED_CACHE = counter("esrl_derived_cache_total", "Derived-artifact cache lookups.", ("kind", "outcome"))
+
+_stats: Dict[str, Dict[str, int]] = {}
+_stats_lock = threading.Lock()
+
+
+def _safe_name(value: str) -> str:
+    return "".join(ch if ch.isalnum() or ch in ("-", "_", ".") else "_" for ch in value)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _text_path(document_id: str) -> str:
+    return os.path.join(TEXT_DIR, f"{_safe_name(document_id)}.txt")
+
+
+def write_document_text(document_id: str, text: str) -> str:
+    # Cleaned full text, written at ingest so notes and summaries never have to
+    # re-extract the PDF.
+    path = _text_path(document_id)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_document_text(document_id: str) -> Optional[str]:
+    path = _text_path(document_id)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def delete_document_text(document_id: str) -> None:
+    path = _text_path(document_id)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def derived_dir(text: str) -> str:
+    # One directory per content hash, so everything derived from a document's
+    # text can be dropped together. Identical uploads share it.
+    return os.path.join(DERIVED_DIR, content_hash(text))
+
+
+def text_shared_with_other_document(document_id: str, text: str) -> bool:
+    # True when another stored document has the same text, and so the same
+    # derived directory. Only files of equal size are read and hashed.
+    own_path = _text_path(document_id)
+    size = len(text.encode("utf-8"))
+    text_hash = content_hash(text)
+    for path in glob.glob(os.path.join(TEXT_DIR, "*.txt")):
+        if path == own_path:
+            continue
+        try:
+            if os.path.getsize(path) != size:
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                if content_hash(f.read()) == text_hash:
+                    return True
+        except OSError:
+            continue
+    return False
+
+
+def _derived_path(kind: str, text: str, prompt_version: str, model: str, variant: str = "") -> str:
+    # `variant` covers inputs other than the text (e.g. image captions for the
+    # slide plan).
+    name = f"{_safe_name(kind)}__v{_safe_name(prompt_version)}__{_safe_name(model)}"
+    if variant:
+        name += f"__{content_hash(variant)[:16]}"
+    return os.path.join(derived_dir(text), f"{name}.json")
+
+
+def load_derived(kind: str, text: str, prompt_version: str, model: str, variant: str = "") -> Optional[Any]:
+    path = _derived_path(kind, text, prompt_version, model, variant)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if not isinstance(data, dict) or "result" not in data:
+        return None
+    return data["result"]
+
+
+def store_derived(kind: str, text: str, prompt_version: str, model: str, result: Any, variant: str = "") -> str:
+    text_hash = content_hash(text)
+    path = _derived_path(kind, text, prompt_version, model, variant)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "kind": kind,
+            "content_hash": text_hash,
+            "prompt_version": prompt_version,
+            "model": model,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "result": result
+        }, f)
+    os.replace(tmp_path, path)
+    return path
+
+
+def delete_derived_for_text(text: str) -> None:
+    shutil.rmtree(derived_dir(text), ignore_errors=True)
+
+
+_STAT_KEYS = {"hit": "hits", "miss": "misses", "refresh": "refreshes"}
+
+
+def record_lookup(kind: str, outcome: str) -> None:
+    DERIVED_CACHE.inc(kind, outcome)
+    with _stats_lock:
+        entry = _stats.setdefault(kind, {"hits": 0, "misses": 0, "refreshes": 0})
+        entry[_STAT_KEYS[outcome]] += 1
+
+
+async def get_or_generate(
+    kind: str,
+    text: str,
+    prompt_version: str,
+    model: str,
+    generate: Callable[[], Awaitable[Any]],
+    refresh: bool = False,
+    cacheable: Callable[[Any], bool] = bool,
+    variant: str = ""
+) -> Tuple[Any, bool]:
+    # Returns (result, cache_hit). Results that fail `cacheable` (e.g. an
+    # unparseable model reply) are returned but not stored.
+    if not refresh:
+        cached = await run_io(load_derived, kind, text, prompt_version, model, variant)
+        if cached is not None:
+            record_lookup(kind, "hit")
+            return cached, True
+    record_lookup(kind, "refresh" if refresh else "miss")
+
+    result = await generate()
+    if cacheable(result):
+        try:
+            await run_io(store_derived, kind, text, prompt_version, model, result, variant)
+        except OSError as exc:
+            print(f"Could not cache {kind}: {exc}")
+    return result, False
+
+
+def get_derived_cache_stats() -> Dict[str, Dict[str, int]]:
+    with _stats_lock:
+        return {kind: dict(entry) for kind, entry in _stats.items()}
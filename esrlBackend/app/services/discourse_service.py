@@ -1,6 +1,9 @@
 from typing import List, Dict
 
+from app.services.metrics_service import timed
 
+
+@timed("discourse")
 def classify_discourse(sections: List[Dict]) -> List[Dict]:
     # Placeholder: rule-based heuristics only
     for section in sections:
@@ -1,35 +1,183 @@
-from typing import Dict, List
+import copy
+import hashlib
+import os
+import re
+import threading
+from typing import Dict, List, Optional
 
-from sentence_transformers import SentenceTransformer
-import chromadb
+try:
+    import fcntl
+except ImportError:  # Windows: bumps are serialized per process only.
+    fcntl = None
+
+import numpy as np
+
+from app.services.cache_service import LRUCache
+from app.services.env_utils import env_int
+from app.services.metrics_service import register_gauge, span, timed
+from app.services.model_registry import get_model, is_model_loaded, register_model, use_model
 
 CHROMA_DIR = "storage/chroma"
-COLLECTION_NAME = "knowledge"
+COLLECTION_NAME = os.getenv("CHROMA_COLLECTION", "knowledge").strip() or "knowledge"
+# HNSW index parameters, applied only when the collection is first created.
+# 0 / empty keeps Chroma's defaults. See benchmarks/retrieval_bench.py for tuning.
+CHROMA_HNSW_SPACE = os.getenv("CHROMA_HNSW_SPACE", "").strip().lower()
+CHROMA_HNSW_M = env_int("CHROMA_HNSW_M", 0, minimum=0)
+CHROMA_HNSW_CONSTRUCTION_EF = env_int("CHROMA_HNSW_CONSTRUCTION_EF", 0, minimum=0)
+CHROMA_HNSW_SEARCH_EF = env_int("CHROMA_HNSW_SEARCH_EF", 0, minimum=0)
+
+RETRIEVAL_CACHE_MAX_ENTRIES = env_int("RETRIEVAL_CACHE_MAX_ENTRIES", 512)
+QUERY_EMBEDDING_CACHE_MAX_ENTRIES = env_int("QUERY_EMBEDDING_CACHE_MAX_ENTRIES", 1024)
+# "hash" swaps MiniLM for a deterministic feature-hashing embedder so benchmarks
+# run offline without downloading model weights. Retrieval quality is lower.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "minilm").strip().lower()
+EMBEDDING_DIM = 384
 
-_model = None
 _client = None
 _collection = None
+# sentence_transformers (torch) and chromadb are imported on first use so
+# importing the API stays fast; startup warmup can load them in the background.
+_collection_lock = threading.Lock()
+
+_retrieval_cache = LRUCache(RETRIEVAL_CACHE_MAX_ENTRIES)
+_query_embedding_cache = LRUCache(QUERY_EMBEDDING_CACHE_MAX_ENTRIES)
+_versions_lock = threading.Lock()
+
+
+class HashingEmbedder:
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    def _encode_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        words = re.findall(r"\w+", text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dim
+            sign = 1.0 if digest[4] & 1 else -1.0
+            vector[index] += sign
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return np.stack([self._encode_one(text) for text in texts]) if texts else np.zeros((0, self.dim))
+
+
+def _load_embedder():
+    if EMBEDDING_BACKEND == "hash":
+        return HashingEmbedder()
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer("all-MiniLM-L6-v2")
+
+
+# Every query needs the embedder, so it has no idle timeout by default; it can
+# still be evicted to make room under MODEL_MEMORY_BUDGET_MB.
+register_model("embedder", _load_embedder)
+
 
+def get_embedder():
+    return get_model("embedder")
 
-def get_embedder() -> SentenceTransformer:
-    global _model
-    if _model is None:
-        _model = SentenceTransformer("all-MiniLM-L6-v2")
-    return _model
+
+def is_embedder_loaded() -> bool:
+    return is_model_loaded("embedder")
+
+
+def _hnsw_metadata() -> Optional[Dict]:
+    metadata = {}
+    if CHROMA_HNSW_SPACE:
+        metadata["hnsw:space"] = CHROMA_HNSW_SPACE
+    if CHROMA_HNSW_M:
+        metadata["hnsw:M"] = CHROMA_HNSW_M
+    if CHROMA_HNSW_CONSTRUCTION_EF:
+        metadata["hnsw:construction_ef"] = CHROMA_HNSW_CONSTRUCTION_EF
+    if CHROMA_HNSW_SEARCH_EF:
+        metadata["hnsw:search_ef"] = CHROMA_HNSW_SEARCH_EF
+    return metadata or None
 
 
 def get_chroma_collection():
     global _client, _collection
-    if _client is None:
-        _client = chromadb.PersistentClient(path=CHROMA_DIR)
     if _collection is None:
-        _collection = _client.get_or_create_collection(COLLECTION_NAME)
+        with _collection_lock:
+            if _client is None:
+                import chromadb
+
+                _client = chromadb.PersistentClient(path=CHROMA_DIR)
+            if _collection is None:
+                _collection = _client.get_or_create_collection(COLLECTION_NAME, metadata=_hnsw_metadata())
     return _collection
 
 
+def is_chroma_loaded() -> bool:
+    return _collection is not None
+
+
+def _version_path(name: str) -> str:
+    return os.path.join(CHROMA_DIR, f"{name}.version")
+
+
+def get_collection_version(name: str = COLLECTION_NAME) -> int:
+    # The version lives next to the Chroma data rather than in memory, so an
+    # upsert or delete in one uvicorn worker invalidates every worker's cache.
+    try:
+        with open(_version_path(name), "r", encoding="utf-8") as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def bump_collection_version(name: str = COLLECTION_NAME) -> int:
+    path = _version_path(name)
+    os.makedirs(CHROMA_DIR, exist_ok=True)
+    with _versions_lock, open(f"{path}.lock", "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        version = get_collection_version(name) + 1
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(str(version))
+        os.replace(tmp_path, path)
+    return version
+
+
+def _normalize_query(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def _cached_query(kind: str, text: str, scope: Optional[str], top_k: int, run_query) -> Dict:
+    key = (kind, _normalize_query(text), scope, top_k, get_collection_version())
+    hit, value = _retrieval_cache.get(key)
+    if hit:
+        return copy.deepcopy(value)
+    result = run_query()
+    _retrieval_cache.set(key, result)
+    return copy.deepcopy(result)
+
+
+def get_retrieval_cache_stats() -> Dict:
+    stats = _retrieval_cache.stats()
+    stats["collection_version"] = get_collection_version()
+    return stats
+
+
+@timed("embedding")
 def embed_texts(texts: List[str]) -> List[List[float]]:
-    model = get_embedder()
-    return model.encode(texts).tolist()
+    with use_model("embedder") as model:
+        return model.encode(texts).tolist()
+
+
+def embed_query(text: str) -> List[float]:
+    # Queries are embedded by retrieval and again by the answer cache; keep one copy.
+    key = _normalize_query(text)
+    hit, embedding = _query_embedding_cache.get(key)
+    if hit:
+        return embedding
+    embedding = embed_texts([text])[0]
+    _query_embedding_cache.set(key, embedding)
+    return embedding
 
 
 def upsert_chunks(chunks: List[Dict]) -> None:
@@ -52,12 +200,14 @@ def upsert_chunks(chunks: List[Dict]) -> None:
     ]
 
     collection = get_chroma_collection()
-    collection.upsert(
-        documents=texts,
-        embeddings=embeddings,
-        metadatas=metadatas,
-        ids=ids
-    )
+    with span("chroma_upsert"):
+        collection.upsert(
+            documents=texts,
+            embeddings=embeddings,
+            metadatas=metadatas,
+            ids=ids
+        )
+    bump_collection_version()
 
 
 def upsert_images(image_chunks: List[Dict]) -> None:
@@ -80,22 +230,39 @@ def upsert_images(image_chunks: List[Dict]) -> None:
     ]
 
     collection = get_chroma_collection()
-    collection.upsert(
-        documents=texts,
-        embeddings=embeddings,
-        metadatas=metadatas,
-        ids=ids
-    )
+    with span("chroma_upsert"):
+        collection.upsert(
+            documents=texts,
+            embeddings=embeddings,
+            metadatas=metadatas,
+            ids=ids
+        )
+    bump_collection_version()
 
 
-def query_similar(text: str, top_k: int = 5) -> Dict:
+def delete_document_vectors(document_id: str) -> int:
+    # Removes every text and image vector of a document; returns how many.
     collection = get_chroma_collection()
-    embedding = embed_texts([text])[0]
-    return collection.query(
-        query_embeddings=[embedding],
-        n_results=top_k,
-        include=["documents", "metadatas", "distances"]
-    )
+    existing = collection.get(where={"document_id": document_id}, include=[])
+    ids = existing.get("ids") or []
+    if ids:
+        collection.delete(ids=ids)
+        bump_collection_version()
+    return len(ids)
+
+
+def query_similar(text: str, top_k: int = 5) -> Dict:
+    def run_query():
+        collection = get_chroma_collection()
+        embedding = embed_query(text)
+        with span("chroma_query"):
+            return collection.query(
+                query_embeddings=[embedding],
+                n_results=top_k,
+                include=["documents", "metadatas", "distances"]
+            )
+
+    return _cached_query("text", text, None, top_k, run_query)
 
 
 def get_images_for_document(document_id: str, limit: int = 5) -> Dict:
@@ -108,20 +275,37 @@ def get_images_for_document(document_id: str, limit: int = 5) -> Dict:
 
 
 def query_images_for_document(query: str, document_id: str, limit: int = 5) -> Dict:
-    collection = get_chroma_collection()
-    embedding = embed_texts([query])[0]
-    return collection.query(
-        query_embeddings=[embedding],
-        n_results=limit,
-        where={"$and": [{"document_id": document_id}, {"type": "image"}]},
-        include=["documents", "metadatas", "distances"]
-    )
+    def run_query():
+        collection = get_chroma_collection()
+        embedding = embed_query(query)
+        with span("chroma_query"):
+            return collection.query(
+                query_embeddings=[embedding],
+                n_results=limit,
+                where={"$and": [{"document_id": document_id}, {"type": "image"}]},
+                include=["documents", "metadatas", "distances"]
+            )
+
+    return _cached_query("image", query, document_id, limit, run_query)
 
 
 def get_text_for_page(document_id: str, page: int, limit: int = 1) -> Dict:
-    collection = get_chroma_collection()
-    return collection.get(
-        where={"$and": [{"document_id": document_id}, {"type": "text"}, {"page": page}]},
-        limit=limit,
-        include=["documents", "metadatas"]
-    )
+    def run_query():
+        collection = get_chroma_collection()
+        return collection.get(
+            where={"$and": [{"document_id": document_id}, {"type": "text"}, {"page": page}]},
+            limit=limit,
+            include=["documents", "metadatas"]
+        )
+
+    return _cached_query("page", str(page), document_id, limit, run_query)
+
+
+register_gauge(
+    "esrl_retrieval_cache", "Retrieval cache counters and collection version.", ("field",),
+    lambda: [((field,), value) for field, value in get_retrieval_cache_stats().items()]
+)
+register_gauge(
+    "esrl_query_embedding_cache", "Query embedding cache counters.", ("field",),
+    lambda: [((field,), value) for field, value in _query_embedding_cache.stats().items()]
+)
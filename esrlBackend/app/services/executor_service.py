@@ -0,0 +1,148 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+from app.services.env_utils import env_int
+from app.services.metrics_service import histogram, register_gauge
+
+T = TypeVar("T")
+
+# Blocking work runs off the event loop on one of three separately sized
+# pools, so e.g. a burst of PDF ingests cannot starve Chroma lookups for chat:
+# - cpu: model inference and parsing (SentenceTransformer, BLIP, PyMuPDF, MMR).
+#   Threads rather than processes, since torch/numpy/MuPDF release the GIL and
+#   the model registry keeps one copy of each model per worker.
+# - io: Chroma, file and cache reads/writes, blocking HTTP.
+# - subprocess: Tesseract, FFmpeg and other work that waits on a child process.
+EXECUTOR_CPU_WORKERS = env_int("EXECUTOR_CPU_WORKERS", min(4, os.cpu_count() or 1))
+EXECUTOR_IO_WORKERS = env_int("EXECUTOR_IO_WORKERS", 16)
+EXECUTOR_SUBPROCESS_WORKERS = env_int("EXECUTOR_SUBPROCESS_WORKERS", 4)
+
+EXECUTOR_WAIT = histogram(
+    "esrl_executor_wait_seconds", "Time a task waited for a free executor thread.", ("pool",)
+)
+
+# Thread id -> calls running on it, for work submitted from a context that
+# called start_thread_tracking (the request profiler).
+_tracked_threads: contextvars.ContextVar[Optional[Dict[int, int]]] = contextvars.ContextVar(
+    "executor_tracked_threads", default=None
+)
+
+
+def start_thread_tracking() -> Tuple[Dict[int, int], contextvars.Token]:
+    threads: Dict[int, int] = {}
+    return threads, _tracked_threads.set(threads)
+
+
+def stop_thread_tracking(token: contextvars.Token) -> None:
+    _tracked_threads.reset(token)
+
+
+def _call_tracked(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    # Runs inside the submitter's copied context. Each thread only touches its
+    # own key, so the profiler can read the dict without a lock.
+    threads = _tracked_threads.get()
+    if threads is None:
+        return func(*args, **kwargs)
+    ident = threading.get_ident()
+    threads[ident] = threads.get(ident, 0) + 1
+    try:
+        return func(*args, **kwargs)
+    finally:
+        if threads[ident] <= 1:
+            del threads[ident]
+        else:
+            threads[ident] -= 1
+
+
+class _Pool:
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"esrl-{name}")
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.active = 0
+        self.completed = 0
+
+    def _run(self, queued_at: float, call: Callable[[], T]) -> T:
+        EXECUTOR_WAIT.observe(time.perf_counter() - queued_at, self.name)
+        with self._lock:
+            self.active += 1
+        try:
+            return call()
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        # Copies the context like asyncio.to_thread, so request-scoped timing
+        # spans recorded in the worker still reach the request.
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, _call_tracked, func, *args, **kwargs)
+        with self._lock:
+            self.submitted += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._run, time.perf_counter(), call)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            queued = self.submitted - self.completed - self.active
+            return {
+                "max_workers": self.max_workers,
+                "active": self.active,
+                "queued": queued,
+                "completed": self.completed,
+                "saturation": round((self.active + queued) / self.max_workers, 3)
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pools: Dict[str, _Pool] = {
+    "cpu": _Pool("cpu", EXECUTOR_CPU_WORKERS),
+    "io": _Pool("io", EXECUTOR_IO_WORKERS),
+    "subprocess": _Pool("subprocess", EXECUTOR_SUBPROCESS_WORKERS),
+}
+
+
+async def run_cpu(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    return await _pools["cpu"].run(func, *args, **kwargs)
+
+
+async def run_io(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    return await _pools["io"].run(func, *args, **kwargs)
+
+
+async def run_subprocess(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    return await _pools["subprocess"].run(func, *args, **kwargs)
+
+
+def get_executor_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: pool.stats() for name, pool in _pools.items()}
+
+
+def shutdown_executors() -> None:
+    for pool in _pools.values():
+        pool.shutdown()
+
+
+register_gauge(
+    "esrl_executor_workers", "Executor pool size.", ("pool",),
+    lambda: [((name,), pool.max_workers) for name, pool in _pools.items()]
+)
+register_gauge(
+    "esrl_executor_active", "Executor tasks currently running.", ("pool",),
+    lambda: [((name,), pool.stats()["active"]) for name, pool in _pools.items()]
+)
+register_gauge(
+    "esrl_executor_queued", "Executor tasks waiting for a free thread.", ("pool",),
+    lambda: [((name,), pool.stats()["queued"]) for name, pool in _pools.items()]
+)
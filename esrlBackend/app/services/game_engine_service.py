@@ -0,0 +1,249 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import weakref
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+from app.services.env_utils import env_float, env_int
+from app.services.metrics_service import counter, register_gauge, span
+
+GAME_ENGINE_API_URL = os.getenv("GAME_ENGINE_API_URL", "http://127.0.0.1:8000").rstrip("/")
+REQUEST_TIMEOUT_SECONDS = env_float("GAME_ENGINE_TIMEOUT_SECONDS", 30.0, minimum=1.0)
+# A dead engine should fail on connect, not after the full request timeout.
+GAME_ENGINE_CONNECT_TIMEOUT_SECONDS = env_float("GAME_ENGINE_CONNECT_TIMEOUT_SECONDS", 2.0, minimum=0.1)
+# Caps the pool for ordinary proxied calls. Event streams and long-polls hold
+# their connection for minutes, so they get a separate, uncapped client and
+# cannot starve /game/generate or /game/launch.
+GAME_ENGINE_MAX_CONNECTIONS = env_int("GAME_ENGINE_MAX_CONNECTIONS", 20)
+GAME_ENGINE_MAX_KEEPALIVE = env_int("GAME_ENGINE_MAX_KEEPALIVE", 10)
+# Consecutive failures that open the breaker, and how long it stays open
+# before one probe request is let through.
+GAME_ENGINE_BREAKER_FAILURES = env_int("GAME_ENGINE_BREAKER_FAILURES", 5)
+GAME_ENGINE_BREAKER_RESET_SECONDS = env_float("GAME_ENGINE_BREAKER_RESET_SECONDS", 15.0, minimum=1.0)
+
+GAME_ENGINE_REQUESTS = counter(
+    "esrl_game_engine_requests_total", "Proxied game-engine requests by outcome.", ("method", "outcome")
+)
+
+
+class GameEngineUnavailable(Exception):
+    # Could not reach the engine, or the breaker is open (retry_after set).
+    def __init__(self, message: str, retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class GameEngineError(Exception):
+    # The engine answered with an error status; detail is its response body.
+    def __init__(self, status_code: int, detail: Any):
+        super().__init__(f"game-engine returned {status_code}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+class _CircuitBreaker:
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_seconds:
+                return "half_open"
+            return "open"
+
+    def before_request(self) -> None:
+        # Open: fail fast. Half-open: a single probe goes through; everyone
+        # else keeps failing fast until it succeeds.
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.reset_seconds - (time.monotonic() - self.opened_at)
+            if remaining > 0 or self.probing:
+                raise GameEngineUnavailable(
+                    f"game-engine at {GAME_ENGINE_API_URL} is unavailable (circuit open)",
+                    retry_after=max(1, int(remaining + 0.999))
+                )
+            self.probing = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def abandon_probe(self) -> None:
+        with self._lock:
+            self.probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self.probing:
+                    print(f"game-engine circuit opened after {self.failures} failures")
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+
+_breaker = _CircuitBreaker(GAME_ENGINE_BREAKER_FAILURES, GAME_ENGINE_BREAKER_RESET_SECONDS)
+# httpx.AsyncClient binds its connection pool to the loop it first runs on.
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_stream_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+
+def _get_client(long_lived: bool = False) -> httpx.AsyncClient:
+    # long_lived: the client for event streams and long-polls, which has no
+    # connection cap.
+    loop = asyncio.get_running_loop()
+    clients = _stream_clients if long_lived else _clients
+    client = clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            base_url=GAME_ENGINE_API_URL,
+            timeout=httpx.Timeout(REQUEST_TIMEOUT_SECONDS, connect=GAME_ENGINE_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=None if long_lived else GAME_ENGINE_MAX_CONNECTIONS,
+                max_keepalive_connections=GAME_ENGINE_MAX_KEEPALIVE
+            )
+        )
+        clients[loop] = client
+    return client
+
+
+async def close_game_engine_client() -> None:
+    loop = asyncio.get_running_loop()
+    for clients in (_clients, _stream_clients):
+        client = clients.pop(loop, None)
+        if client is not None:
+            await client.aclose()
+
+
+async def request_game_engine(
+    method: str,
+    path: str,
+    payload: Optional[Dict[str, Any]] = None,
+    params: Optional[Dict[str, Any]] = None,
+    extra_timeout: float = 0.0
+) -> Any:
+    # Returns the engine's JSON body. Raises GameEngineUnavailable on transport
+    # errors, timeouts or an open breaker, and GameEngineError on an error
+    # status. Transport errors and 5xx count towards opening the breaker; a
+    # full local pool does not, since it says nothing about the engine.
+    # `extra_timeout` extends the read timeout for long-poll calls, which go
+    # through the uncapped long-lived client.
+    method = method.upper()
+    _breaker.before_request()
+    timeout = httpx.Timeout(REQUEST_TIMEOUT_SECONDS + extra_timeout, connect=GAME_ENGINE_CONNECT_TIMEOUT_SECONDS)
+    client = _get_client(long_lived=extra_timeout > 0)
+    try:
+        with span("game_engine"):
+            if method == "GET":
+                response = await client.get(path, params=params, timeout=timeout)
+            else:
+                response = await client.request(method, path, json=payload or {}, params=params, timeout=timeout)
+    except httpx.PoolTimeout as exc:
+        _breaker.abandon_probe()
+        GAME_ENGINE_REQUESTS.inc(method, "pool_timeout")
+        raise GameEngineUnavailable(
+            f"No free connection to game-engine at {GAME_ENGINE_API_URL}", retry_after=1
+        ) from exc
+    except httpx.HTTPError as exc:
+        _breaker.record_failure()
+        GAME_ENGINE_REQUESTS.inc(method, "unreachable")
+        raise GameEngineUnavailable(
+            f"Failed to connect to game-engine at {GAME_ENGINE_API_URL}: {exc!r}"
+        ) from exc
+    except BaseException:
+        _breaker.abandon_probe()  # e.g. the client disconnected mid-probe
+        raise
+
+    try:
+        data = response.json()
+    except ValueError:
+        data = {"raw": response.text}
+
+    if response.status_code >= 500:
+        _breaker.record_failure()
+        GAME_ENGINE_REQUESTS.inc(method, "server_error")
+        raise GameEngineError(response.status_code, data)
+    _breaker.record_success()
+    if response.is_error:
+        GAME_ENGINE_REQUESTS.inc(method, "client_error")
+        raise GameEngineError(response.status_code, data)
+    GAME_ENGINE_REQUESTS.inc(method, "ok")
+    return data
+
+
+async def open_game_engine_stream(path: str) -> AsyncIterator[bytes]:
+    # Opens a streaming GET (server-sent events) and returns an iterator over
+    # its raw bytes. Connection and status errors are raised here, before the
+    # caller has sent any response. The read timeout only has to outlast the
+    # engine's heartbeats. The stream just ends if the engine goes away
+    # mid-way, and EventSource clients reconnect on their own.
+    _breaker.before_request()
+    client = _get_client(long_lived=True)
+    request = client.build_request("GET", path, headers={"Accept": "text/event-stream"})
+    try:
+        response = await client.send(request, stream=True)
+    except httpx.HTTPError as exc:
+        _breaker.record_failure()
+        GAME_ENGINE_REQUESTS.inc("STREAM", "unreachable")
+        raise GameEngineUnavailable(
+            f"Failed to connect to game-engine at {GAME_ENGINE_API_URL}: {exc!r}"
+        ) from exc
+    except BaseException:
+        _breaker.abandon_probe()
+        raise
+
+    if response.is_error:
+        body = await response.aread()
+        await response.aclose()
+        try:
+            detail = json.loads(body)
+        except ValueError:
+            detail = {"raw": body.decode("utf-8", "replace")}
+        if response.status_code >= 500:
+            _breaker.record_failure()
+        else:
+            _breaker.record_success()
+        GAME_ENGINE_REQUESTS.inc("STREAM", "server_error" if response.status_code >= 500 else "client_error")
+        raise GameEngineError(response.status_code, detail)
+    _breaker.record_success()
+    GAME_ENGINE_REQUESTS.inc("STREAM", "ok")
+
+    async def relay() -> AsyncIterator[bytes]:
+        try:
+            async for chunk in response.aiter_raw():
+                yield chunk
+        except httpx.HTTPError as exc:
+            print(f"game-engine status stream ended: {exc!r}")
+        finally:
+            await response.aclose()
+
+    return relay()
+
+
+def get_game_engine_stats() -> Dict[str, Any]:
+    return {
+        "url": GAME_ENGINE_API_URL,
+        "breaker": _breaker.state,
+        "consecutive_failures": _breaker.failures
+    }
+
+
+register_gauge(
+    "esrl_game_engine_breaker_open", "1 while the game-engine circuit breaker is open or half-open.", (),
+    lambda: [((), 0 if _breaker.state == "closed" else 1)]
+)
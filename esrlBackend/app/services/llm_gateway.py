@@ -0,0 +1,367 @@
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.services.env_utils import env_float, env_int, env_list
+from app.services.executor_service import run_cpu
+from app.services.metrics_service import model_load, record_duration, register_gauge, span
+
+if TYPE_CHECKING:
+    from google import genai
+
+# Lower value = served first. Chat/RAG and anything a student is waiting on is
+# interactive; video and game pipelines run as background work.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+LLM_MAX_CONCURRENCY = env_int("LLM_MAX_CONCURRENCY", 8)
+LLM_BACKGROUND_MAX_CONCURRENCY = min(
+    LLM_MAX_CONCURRENCY,
+    env_int("LLM_BACKGROUND_MAX_CONCURRENCY", max(1, LLM_MAX_CONCURRENCY // 2))
+)
+LLM_TIMEOUT_SECONDS = env_float("LLM_TIMEOUT_SECONDS", 90.0, minimum=1.0)
+LLM_DEFAULT_RPM = env_int("LLM_DEFAULT_RPM", 120)
+LLM_RATE_BURST = env_int("LLM_RATE_BURST", 5)
+LLM_MAX_RETRIES = env_int("LLM_MAX_RETRIES", 4, minimum=0)
+LLM_BACKOFF_BASE_SECONDS = env_float("LLM_BACKOFF_BASE_SECONDS", 1.0, minimum=0.01)
+LLM_BACKOFF_MAX_SECONDS = env_float("LLM_BACKOFF_MAX_SECONDS", 30.0, minimum=0.01)
+# Points the client at an alternate Gemini-compatible endpoint, e.g. the offline
+# stand-in in benchmarks/gemini_stub_server.py.
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "").strip()
+
+
+def _parse_model_rpm() -> Dict[str, int]:
+    # LLM_MODEL_RPM="gemini-2.5-flash=1000,gemini-2.5-flash-preview-tts=10"
+    limits: Dict[str, int] = {}
+    for item in env_list("LLM_MODEL_RPM"):
+        model, _, raw = item.partition("=")
+        try:
+            limits[model.strip()] = max(1, int(raw))
+        except ValueError:
+            continue
+    return limits
+
+
+LLM_MODEL_RPM = _parse_model_rpm()
+
+_client = None
+_client_lock = threading.Lock()
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+    weakref.WeakKeyDictionary()
+)
+_buckets: Dict[str, "_TokenBucket"] = {}
+_model_stats: Dict[str, Dict[str, Any]] = {}
+_in_flight = 0
+
+
+def get_client() -> "genai.Client":
+    # One long-lived client per process so HTTP connections are pooled and reused.
+    # google.genai is imported here rather than at module load (~1s of imports).
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                api_key = os.getenv("GEMINI_API_KEY", "")
+                if not api_key:
+                    raise RuntimeError("GEMINI_API_KEY is not set")
+                with model_load("genai_client"):
+                    from google import genai
+                    from google.genai import types
+
+                    http_options = types.HttpOptions(timeout=int(LLM_TIMEOUT_SECONDS * 1000))
+                    if GEMINI_BASE_URL:
+                        http_options.base_url = GEMINI_BASE_URL
+                    _client = genai.Client(api_key=api_key, http_options=http_options)
+    return _client
+
+
+def is_client_ready() -> bool:
+    return _client is not None
+
+
+async def _get_client_async() -> "genai.Client":
+    # The first call pays for the import and client setup off the event loop.
+    if _client is not None:
+        return _client
+    return await run_cpu(get_client)
+
+
+class _TokenBucket:
+    # Requests-per-minute bucket whose waiters are served strictly by priority,
+    # then FIFO, so a queue of background jobs never starves interactive calls.
+
+    def __init__(self, requests_per_minute: int, burst: int):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(max(1, burst))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _pump(self) -> None:
+        self._timer = None
+        self._refill()
+        now = time.monotonic()
+        if now >= self.paused_until:
+            while self._waiters and self.tokens >= 1:
+                _, _, future = heapq.heappop(self._waiters)
+                if future.done():
+                    continue
+                self.tokens -= 1
+                future.set_result(None)
+
+        while self._waiters and self._waiters[0][2].done():
+            heapq.heappop(self._waiters)
+        if self._waiters:
+            delay = max(self.paused_until - now, (1 - self.tokens) / self.rate, 0.005)
+            self._timer = asyncio.get_running_loop().call_later(delay, self._pump)
+
+    async def acquire(self, priority: int) -> None:
+        self._refill()
+        if not self._waiters and self.tokens >= 1 and time.monotonic() >= self.paused_until:
+            self.tokens -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        if self._timer is None:
+            self._pump()
+        await future
+
+    def pause(self, seconds: float) -> None:
+        # Called on 429s so every caller of this model backs off, not just the one that failed.
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = min(self.tokens, 0.0)
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+
+def _get_bucket(model: str) -> _TokenBucket:
+    bucket = _buckets.get(model)
+    if bucket is None:
+        bucket = _TokenBucket(LLM_MODEL_RPM.get(model, LLM_DEFAULT_RPM), LLM_RATE_BURST)
+        _buckets[model] = bucket
+    return bucket
+
+
+def _get_stats(model: str) -> Dict[str, Any]:
+    stats = _model_stats.get(model)
+    if stats is None:
+        stats = {
+            "requests": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "rate_limited": 0,
+            "retries": 0,
+            "queue_wait_seconds": 0.0,
+            "prompt_tokens": 0,
+            "response_tokens": 0,
+            "total_tokens": 0
+        }
+        _model_stats[model] = stats
+    return stats
+
+
+def _record_usage(model: str, response: Any) -> None:
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    stats = _get_stats(model)
+    stats["prompt_tokens"] += getattr(usage, "prompt_token_count", None) or 0
+    stats["response_tokens"] += getattr(usage, "candidates_token_count", None) or 0
+    stats["total_tokens"] += getattr(usage, "total_token_count", None) or 0
+
+
+def _get_semaphore(name: str, limit: int) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    per_loop = _semaphores.get(loop)
+    if per_loop is None:
+        per_loop = {}
+        _semaphores[loop] = per_loop
+    semaphore = per_loop.get(name)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(limit)
+        per_loop[name] = semaphore
+    return semaphore
+
+
+@asynccontextmanager
+async def _llm_slot(model: str, priority: int):
+    # Background work is capped below the global limit so interactive calls
+    # always have free slots, then every call waits for a rate-limit token.
+    global _in_flight
+    started = time.monotonic()
+    lanes = [_get_semaphore("global", LLM_MAX_CONCURRENCY)]
+    if priority > PRIORITY_INTERACTIVE:
+        lanes.insert(0, _get_semaphore("background", LLM_BACKGROUND_MAX_CONCURRENCY))
+
+    acquired: List[asyncio.Semaphore] = []
+    try:
+        for semaphore in lanes:
+            await semaphore.acquire()
+            acquired.append(semaphore)
+        await _get_bucket(model).acquire(priority)
+        waited = time.monotonic() - started
+        _get_stats(model)["queue_wait_seconds"] += waited
+        record_duration(f"llm_queue.{model}", waited)
+        _in_flight += 1
+        try:
+            yield
+        finally:
+            _in_flight -= 1
+    finally:
+        for semaphore in reversed(acquired):
+            semaphore.release()
+
+
+def _is_retryable(exc: Exception) -> bool:
+    from google.genai import errors
+
+    if isinstance(exc, errors.APIError):
+        code = getattr(exc, "code", None) or 0
+        return code == 429 or code >= 500
+    return False
+
+
+def _backoff_delay(attempt: int) -> float:
+    # Exponential backoff, jittered over the upper half of the window.
+    ceiling = min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * (2 ** attempt))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+async def _handle_failure(model: str, exc: Exception, attempt: int, retries: int) -> None:
+    stats = _get_stats(model)
+    if getattr(exc, "code", None) == 429:
+        stats["rate_limited"] += 1
+    if not _is_retryable(exc) or attempt >= retries:
+        stats["failed"] += 1
+        raise exc
+    delay = _backoff_delay(attempt)
+    if getattr(exc, "code", None) == 429:
+        _get_bucket(model).pause(delay)
+    stats["retries"] += 1
+    await asyncio.sleep(delay)
+
+
+async def generate_content(
+    model: str,
+    contents: Any,
+    config: Optional[Any] = None,
+    timeout: Optional[float] = None,
+    priority: int = PRIORITY_INTERACTIVE,
+    max_retries: Optional[int] = None
+):
+    client = await _get_client_async()
+    retries = LLM_MAX_RETRIES if max_retries is None else max_retries
+    stats = _get_stats(model)
+    stats["requests"] += 1
+    attempt = 0
+    with span(f"llm.{model}"):
+        while True:
+            try:
+                async with _llm_slot(model, priority):
+                    response = await asyncio.wait_for(
+                        client.aio.models.generate_content(model=model, contents=contents, config=config),
+                        timeout=timeout or LLM_TIMEOUT_SECONDS
+                    )
+            except Exception as exc:
+                await _handle_failure(model, exc, attempt, retries)
+                attempt += 1
+                continue
+            stats["succeeded"] += 1
+            _record_usage(model, response)
+            return response
+
+
+async def stream_content(
+    model: str,
+    contents: Any,
+    config: Optional[Any] = None,
+    timeout: Optional[float] = None,
+    priority: int = PRIORITY_INTERACTIVE,
+    max_retries: Optional[int] = None
+) -> AsyncIterator[Any]:
+    # The timeout bounds the wait for each chunk, not the whole stream. Failures
+    # are only retried before the first chunk has been handed to the caller.
+    client = await _get_client_async()
+    retries = LLM_MAX_RETRIES if max_retries is None else max_retries
+    chunk_timeout = timeout or LLM_TIMEOUT_SECONDS
+    stats = _get_stats(model)
+    stats["requests"] += 1
+    attempt = 0
+    while True:
+        yielded = False
+        last_chunk = None
+        try:
+            async with _llm_slot(model, priority):
+                stream = await asyncio.wait_for(
+                    client.aio.models.generate_content_stream(model=model, contents=contents, config=config),
+                    timeout=chunk_timeout
+                )
+                iterator = stream.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(iterator.__anext__(), timeout=chunk_timeout)
+                    except StopAsyncIteration:
+                        break
+                    last_chunk = chunk
+                    yielded = True
+                    yield chunk
+        except Exception as exc:
+            if yielded:
+                stats["failed"] += 1
+                raise
+            await _handle_failure(model, exc, attempt, retries)
+            attempt += 1
+            continue
+        stats["succeeded"] += 1
+        if last_chunk is not None:
+            _record_usage(model, last_chunk)
+        return
+
+
+def get_llm_stats() -> Dict[str, Any]:
+    return {
+        "max_concurrency": LLM_MAX_CONCURRENCY,
+        "background_max_concurrency": LLM_BACKGROUND_MAX_CONCURRENCY,
+        "timeout_seconds": LLM_TIMEOUT_SECONDS,
+        "in_flight": _in_flight,
+        "models": {
+            model: dict(
+                stats,
+                rpm_limit=LLM_MODEL_RPM.get(model, LLM_DEFAULT_RPM),
+                queued=_buckets[model].queued if model in _buckets else 0
+            )
+            for model, stats in _model_stats.items()
+        }
+    }
+
+
+register_gauge(
+    "esrl_llm_queued", "Gemini calls waiting for a rate-limit token.", ("model",),
+    lambda: [((model,), bucket.queued) for model, bucket in list(_buckets.items())]
+)
+register_gauge("esrl_llm_in_flight", "Gemini calls currently in flight.", (), lambda: [((), _in_flight)])
+register_gauge(
+    "esrl_llm_calls", "Gemini calls by model and outcome since start.", ("model", "outcome"),
+    lambda: [
+        ((model, outcome), stats[outcome])
+        for model, stats in list(_model_stats.items())
+        for outcome in ("requests", "succeeded", "failed", "rate_limited", "retries")
+    ]
+)
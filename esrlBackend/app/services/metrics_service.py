@@ -0,0 +1,231 @@
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Seconds; spans range from sub-millisecond packing to multi-minute video renders.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series: Dict[LabelValues, Dict] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                self._series[label_values] = series
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][index] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {key: dict(value, buckets=list(value["buckets"])) for key, value in self._series.items()}
+        for label_values, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["buckets"]):
+                cumulative += count
+                labels = _format_labels(self.label_names, label_values, f'le="{_format_number(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, label_values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {series['count']}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_number(series['sum'])}")
+            lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._lock = threading.Lock()
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = dict(self._values)
+        for label_values, value in sorted(snapshot.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {_format_number(value)}")
+        return lines
+
+
+class Gauge:
+    # Read at scrape time so services expose live state (cache sizes, queue depths)
+    # without pushing updates.
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], read: Callable):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.read = read
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        try:
+            samples = list(self.read())
+        except Exception:
+            return lines
+        for label_values, value in samples:
+            if value is None:
+                continue
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {_format_number(value)}")
+        return lines
+
+
+_registry: Dict[str, object] = {}
+_registry_lock = threading.Lock()
+
+
+def _register(metric):
+    with _registry_lock:
+        existing = _registry.get(metric.name)
+        if existing is not None and not isinstance(metric, Gauge):
+            return existing
+        _registry[metric.name] = metric
+    return metric
+
+
+def histogram(name: str, help_text: str, label_names: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return _register(Histogram(name, help_text, label_names, buckets))
+
+
+def counter(name: str, help_text: str, label_names: Tuple[str, ...] = ()) -> Counter:
+    return _register(Counter(name, help_text, label_names))
+
+
+def register_gauge(
+    name: str,
+    help_text: str,
+    label_names: Tuple[str, ...],
+    read: Callable[[], Iterable[Tuple[LabelValues, Optional[float]]]]
+) -> None:
+    _register(Gauge(name, help_text, label_names, read))
+
+
+def render_prometheus() -> str:
+    with _registry_lock:
+        metrics = [_registry[name] for name in sorted(_registry)]
+    lines: List[str] = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = histogram("esrl_stage_seconds", "Time spent in a pipeline stage.", ("stage",))
+STAGE_ERRORS = counter("esrl_stage_errors_total", "Pipeline stage calls that raised.", ("stage",))
+MODEL_LOAD_SECONDS = histogram("esrl_model_load_seconds", "Time to load a model into memory.", ("model",))
+REQUEST_SECONDS = histogram("esrl_request_seconds", "HTTP request latency by route.", ("method", "route", "status"))
+
+# Per-request timing collector. The dict is shared by reference, so spans recorded
+# in asyncio.to_thread workers (which copy the context) land in the same request.
+_request_timings: contextvars.ContextVar[Optional[Dict[str, Dict[str, float]]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+def start_request_timings() -> contextvars.Token:
+    return _request_timings.set({})
+
+
+def get_request_timings() -> Optional[Dict[str, Dict[str, float]]]:
+    timings = _request_timings.get()
+    if timings is None:
+        return None
+    return {stage: {"ms": round(entry["ms"], 3), "count": entry["count"]} for stage, entry in timings.items()}
+
+
+def reset_request_timings(token: contextvars.Token) -> None:
+    _request_timings.reset(token)
+
+
+def record_duration(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        entry = timings.setdefault(stage, {"ms": 0.0, "count": 0})
+        entry["ms"] += seconds * 1000
+        entry["count"] += 1
+
+
+@contextmanager
+def span(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage)
+        raise
+    finally:
+        record_duration(stage, time.perf_counter() - started)
+
+
+def timed(stage: str):
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def model_load(model: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        MODEL_LOAD_SECONDS.observe(seconds, model)
+        record_duration(f"model_load.{model}", seconds)
+
+
+def observe_request(method: str, route: str, status: int, seconds: float) -> None:
+    REQUEST_SECONDS.observe(seconds, method, route, str(status))
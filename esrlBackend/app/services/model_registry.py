@@ -0,0 +1,237 @@
+import gc
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict
+
+from app.services.env_utils import env_float, env_int
+from app.services.metrics_service import counter, model_load, register_gauge
+
+# Total resident size allowed for registered models (0 = unlimited). Loading a
+# model that would exceed it first evicts least-recently-used idle models.
+MODEL_MEMORY_BUDGET_MB = env_int("MODEL_MEMORY_BUDGET_MB", 0, minimum=0)
+MODEL_REAPER_INTERVAL_SECONDS = env_float("MODEL_REAPER_INTERVAL_SECONDS", 30.0, minimum=1.0)
+
+MODEL_LOADS = counter("esrl_model_loads_total", "Model loads into memory.", ("model",))
+MODEL_EVICTIONS = counter("esrl_model_evictions_total", "Models unloaded, by reason.", ("model", "reason"))
+MODEL_BUDGET_OVERRUNS = counter(
+    "esrl_model_budget_overruns_total", "Loads that exceeded the budget because nothing was evictable.", ("model",)
+)
+
+
+def _process_rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0
+
+
+def _tensor_bytes(obj: Any) -> int:
+    # torch modules report their exact parameter + buffer size; anything else
+    # (tokenizers, spaCy pipelines) falls back to the RSS delta of the load.
+    if isinstance(obj, (tuple, list)):
+        return sum(_tensor_bytes(item) for item in obj)
+    total = 0
+    for attr in ("parameters", "buffers"):
+        tensors = getattr(obj, attr, None)
+        if not callable(tensors):
+            continue
+        try:
+            total += sum(t.numel() * t.element_size() for t in tensors())
+        except Exception:
+            return 0
+    return total
+
+
+def _release_memory() -> None:
+    gc.collect()
+    try:
+        import ctypes
+
+        # Hand freed arenas back to the OS so the eviction shows up in RSS.
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+class _Entry:
+    def __init__(self, name: str, loader: Callable[[], Any], idle_seconds: float):
+        self.name = name
+        self.loader = loader
+        self.idle_seconds = idle_seconds
+        self.model = None
+        self.bytes = 0
+        self.last_used = 0.0
+        self.in_use = 0
+        self.loads = 0
+        self.evictions = 0
+        self.last_load_seconds = 0.0
+        self.load_lock = threading.Lock()
+
+
+class ModelRegistry:
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def register(self, name: str, loader: Callable[[], Any], idle_seconds: float = 0.0) -> None:
+        # idle_seconds <= 0 keeps the model until the budget forces it out.
+        idle_seconds = env_float(f"MODEL_IDLE_SECONDS_{name.upper()}", idle_seconds)
+        with self._lock:
+            if name not in self._entries:
+                self._entries[name] = _Entry(name, loader, idle_seconds)
+        if idle_seconds > 0:
+            self._start_reaper()
+
+    def _entry(self, name: str) -> _Entry:
+        entry = self._entries.get(name)
+        if entry is None:
+            raise KeyError(f"Model {name!r} is not registered")
+        return entry
+
+    def _resident_bytes(self) -> int:
+        return sum(entry.bytes for entry in self._entries.values() if entry.model is not None)
+
+    def _enforce_budget(self, incoming: _Entry, needed: int) -> None:
+        # Caller holds self._lock. Evicts least-recently-used idle models.
+        candidates = sorted(
+            (e for e in self._entries.values() if e.model is not None and e.in_use == 0 and e is not incoming),
+            key=lambda e: e.last_used
+        )
+        while self._resident_bytes() + needed > self.budget_bytes and candidates:
+            self._unload(candidates.pop(0), "budget")
+
+    def _unload(self, entry: _Entry, reason: str) -> None:
+        entry.model = None
+        entry.evictions += 1
+        MODEL_EVICTIONS.inc(entry.name, reason)
+        _release_memory()
+
+    def _load(self, entry: _Entry) -> Any:
+        if self.budget_bytes:
+            # Make room for the last measured size; unknown on the first load,
+            # which is handled once the size has been measured below.
+            with self._lock:
+                self._enforce_budget(entry, entry.bytes)
+        rss_before = _process_rss_bytes()
+        started = time.perf_counter()
+        with model_load(entry.name):
+            model = entry.loader()
+        entry.last_load_seconds = time.perf_counter() - started
+        entry.bytes = _tensor_bytes(model) or max(0, _process_rss_bytes() - rss_before)
+        entry.loads += 1
+        MODEL_LOADS.inc(entry.name)
+        with self._lock:
+            entry.model = model
+            entry.last_used = time.monotonic()
+            if self.budget_bytes:
+                self._enforce_budget(entry, 0)
+            if self.budget_bytes and self._resident_bytes() > self.budget_bytes:
+                MODEL_BUDGET_OVERRUNS.inc(entry.name)
+                print(f"Model budget exceeded after loading {entry.name}: "
+                      f"{self._resident_bytes() / 2**20:.0f} MB > {self.budget_bytes / 2**20:.0f} MB")
+        return model
+
+    @contextmanager
+    def use(self, name: str):
+        # Pins the model for the duration of the block so the reaper or a budget
+        # eviction cannot unload it mid-inference.
+        entry = self._entry(name)
+        with self._lock:
+            entry.in_use += 1
+            model = entry.model
+        try:
+            if model is None:
+                with entry.load_lock:
+                    model = entry.model if entry.model is not None else self._load(entry)
+            yield model
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+                entry.last_used = time.monotonic()
+
+    def get(self, name: str) -> Any:
+        with self.use(name) as model:
+            return model
+
+    def is_loaded(self, name: str) -> bool:
+        entry = self._entries.get(name)
+        return entry is not None and entry.model is not None
+
+    def evict(self, name: str, reason: str = "manual") -> bool:
+        with self._lock:
+            entry = self._entry(name)
+            if entry.model is None or entry.in_use:
+                return False
+            self._unload(entry, reason)
+        return True
+
+    def evict_idle(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for entry in self._entries.values():
+                if entry.model is None or entry.in_use or entry.idle_seconds <= 0:
+                    continue
+                if now - entry.last_used >= entry.idle_seconds:
+                    self._unload(entry, "idle")
+
+    def _start_reaper(self) -> None:
+        with self._lock:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reap_forever, name="model-reaper", daemon=True)
+        self._reaper.start()
+
+    def _reap_forever(self) -> None:
+        while True:
+            time.sleep(MODEL_REAPER_INTERVAL_SECONDS)
+            try:
+                self.evict_idle()
+            except Exception as exc:
+                print(f"Model reaper failed: {exc}")
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            models = {
+                entry.name: {
+                    "loaded": entry.model is not None,
+                    "resident_mb": round(entry.bytes / 2**20, 1) if entry.model is not None else 0.0,
+                    "last_size_mb": round(entry.bytes / 2**20, 1),
+                    "in_use": entry.in_use,
+                    "idle_seconds": round(now - entry.last_used, 1) if entry.model is not None else None,
+                    "idle_ttl_seconds": entry.idle_seconds,
+                    "loads": entry.loads,
+                    "evictions": entry.evictions,
+                    "last_load_seconds": round(entry.last_load_seconds, 3)
+                }
+                for entry in self._entries.values()
+            }
+            resident = self._resident_bytes()
+        return {
+            "budget_mb": round(self.budget_bytes / 2**20, 1),
+            "resident_mb": round(resident / 2**20, 1),
+            "process_rss_mb": round(_process_rss_bytes() / 2**20, 1),
+            "models": models
+        }
+
+
+_registry = ModelRegistry(MODEL_MEMORY_BUDGET_MB * 2**20)
+
+register_model = _registry.register
+use_model = _registry.use
+get_model = _registry.get
+is_model_loaded = _registry.is_loaded
+evict_model = _registry.evict
+get_model_stats = _registry.stats
+
+register_gauge(
+    "esrl_model_resident_bytes", "Measured resident size of each loaded model.", ("model",),
+    lambda: [((entry.name,), entry.bytes if entry.model is not None else 0) for entry in list(_registry._entries.values())]
+)
+register_gauge("esrl_model_budget_bytes", "Configured model memory budget (0 = unlimited).", (),
+               lambda: [((), _registry.budget_bytes)])
@@ -1,20 +1,18 @@
 from typing import Dict
-import os
 import json
-from google import genai
-
-MODEL_NAME = "gemini-2.5-flash"
 
+from app.services.env_utils import env_int
+from app.services.llm_gateway import PRIORITY_INTERACTIVE, generate_content
 
-def _get_client():
-    api_key = os.getenv("GEMINI_API_KEY", "")
-    if not api_key:
-        raise RuntimeError("GEMINI_API_KEY is not set")
-    return genai.Client(api_key=api_key)
+MODEL_NAME = "gemini-2.5-flash"
+# Bump whenever the prompt changes so cached results on disk are regenerated.
+NOTES_PROMPT_VERSION = "2"
+CHARS_PER_TOKEN = 4
+# Token budget for the source text; callers pick content with the selector.
+NOTES_TOKEN_BUDGET = env_int("NOTES_TOKEN_BUDGET", 1500)
 
 
-def generate_quick_notes(text: str) -> Dict:
-    client = _get_client()
+async def generate_quick_notes(text: str, priority: int = PRIORITY_INTERACTIVE) -> Dict:
     prompt = (
         "Return ONLY valid JSON with this schema:\n"
         "{\n"
@@ -28,11 +26,12 @@ def generate_quick_notes(text: str) -> Dict:
         "- One-page cheat sheet\n"
         "- 5 MCQs with answers\n"
         "- 5 interview questions\n\n"
-        f"Text:\n{text[:4000]}"
+        f"Text:\n{text[:NOTES_TOKEN_BUDGET * CHARS_PER_TOKEN]}"
     )
-    response = client.models.generate_content(
+    response = await generate_content(
         model=MODEL_NAME,
-        contents=prompt
+        contents=prompt,
+        priority=priority
     )
     raw = response.text.strip()
     try:
@@ -1,5 +1,6 @@
 import os
 import io
+import glob
 import json
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
@@ -8,6 +9,9 @@ import fitz
 from PIL import Image
 import pytesseract
 
+from app.services.executor_service import run_io
+from app.services.metrics_service import span, timed
+
 UPLOAD_DIR = "storage/pdfs"
 IMAGE_DIR = "storage/images"
 LAST_UPLOADED_FILE = "storage/last_uploaded.json"
@@ -19,14 +23,18 @@ os.makedirs(os.path.dirname(LAST_UPLOADED_FILE), exist_ok=True)
 MIN_TEXT_THRESHOLD = 50
 
 
+def _write_bytes(path: str, content: bytes) -> None:
+    with open(path, "wb") as f:
+        f.write(content)
+
+
 async def save_pdf(file) -> str:
     file_path = os.path.join(
         UPLOAD_DIR,
         f"{datetime.now().timestamp()}_{file.filename}"
     )
     content = await file.read()
-    with open(file_path, "wb") as f:
-        f.write(content)
+    await run_io(_write_bytes, file_path, content)
     return file_path
 
 
@@ -35,6 +43,15 @@ def generate_document_id(file_path: str) -> str:
     return f"doc_{int(datetime.now().timestamp())}_{base}"
 
 
+def get_pdf_path_for_document(document_id: str) -> Optional[str]:
+    # document ids are doc_<timestamp>_<saved file name>
+    parts = document_id.split("_", 2)
+    if len(parts) != 3 or parts[0] != "doc":
+        return None
+    path = os.path.join(UPLOAD_DIR, os.path.basename(parts[2]))
+    return path if os.path.exists(path) else None
+
+
 def is_scanned(page) -> bool:
     blocks = page.get_text("dict")["blocks"]
 
@@ -58,6 +75,7 @@ def ocr_page(page) -> str:
     return pytesseract.image_to_string(image)
 
 
+@timed("text_extraction")
 def extract_text_from_pdf(pdf_path: str) -> Tuple[str, List[str]]:
     doc = fitz.open(pdf_path)
     full_text = ""
@@ -69,7 +87,8 @@ def extract_text_from_pdf(pdf_path: str) -> Tuple[str, List[str]]:
         if not is_scanned(page):
             page_text = text
         else:
-            page_text = ocr_page(page)
+            with span("ocr"):
+                page_text = ocr_page(page)
 
         pages_text.append(page_text)
         full_text += f"\n\n--- Page {page_num + 1} ---\n" + page_text
@@ -77,6 +96,7 @@ def extract_text_from_pdf(pdf_path: str) -> Tuple[str, List[str]]:
     return full_text, pages_text
 
 
+@timed("image_extraction")
 def extract_images_from_pdf(pdf_path: str, document_id: str) -> List[Dict]:
     doc = fitz.open(pdf_path)
     image_data: List[Dict] = []
@@ -115,6 +135,26 @@ def record_last_uploaded(file_path: str, document_id: str) -> None:
         f.write(json.dumps(data))
 
 
+def delete_document_files(document_id: str) -> int:
+    # Uploaded PDF and extracted images; returns how many files were removed.
+    paths = glob.glob(os.path.join(IMAGE_DIR, f"{glob.escape(document_id)}_p*_img*.png"))
+    pdf_path = get_pdf_path_for_document(document_id)
+    if pdf_path:
+        paths.append(pdf_path)
+    removed = 0
+    for path in paths:
+        try:
+            os.remove(path)
+            removed += 1
+        except OSError:
+            pass
+
+    last_uploaded = get_last_uploaded()
+    if last_uploaded and last_uploaded.get("document_id") == document_id:
+        os.remove(LAST_UPLOADED_FILE)
+    return removed
+
+
 def get_last_uploaded() -> Optional[Dict]:
     if not os.path.exists(LAST_UPLOADED_FILE):
         return None
@@ -3,6 +3,8 @@ from app.services.pdf_extraction_service import (
     extract_text_from_pdf,
     extract_images_from_pdf,
     generate_document_id,
+    delete_document_files,
+    get_pdf_path_for_document,
     record_last_uploaded,
     get_last_uploaded
 )
@@ -12,6 +14,8 @@ __all__ = [
     "extract_text_from_pdf",
     "extract_images_from_pdf",
     "generate_document_id",
+    "delete_document_files",
+    "get_pdf_path_for_document",
     "record_last_uploaded",
     "get_last_uploaded"
 ]
\ No newline at end of file
@@ -0,0 +1,204 @@
+import asyncio
+import contextvars
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.services.artifact_service import (
+    get_notes,
+    get_slide_plan,
+    get_study_notes,
+    get_summary,
+    get_tts_cache_dir,
+    load_slide_inputs
+)
+from app.services.derived_cache_service import load_document_text
+from app.services.env_utils import env_bool, env_float, env_int, env_list
+from app.services.executor_service import run_cpu, run_io
+from app.services.llm_gateway import PRIORITY_BACKGROUND
+from app.services.metrics_service import counter, register_gauge, span
+from app.services.video_gen_service import cache_voiceovers
+
+
+async def _stored_text(document_id: str) -> str:
+    text = await run_io(load_document_text, document_id)
+    if text is None:
+        raise LookupError(f"No stored text for document_id: {document_id}")
+    return text
+
+
+async def _precompute_summary(document_id: str) -> Dict:
+    _, hit, _ = await get_summary(await _stored_text(document_id), priority=PRIORITY_BACKGROUND)
+    return {"cached": hit}
+
+
+async def _precompute_notes(document_id: str) -> Dict:
+    _, hit, _ = await get_notes(await _stored_text(document_id), priority=PRIORITY_BACKGROUND, document_id=document_id)
+    return {"cached": hit}
+
+
+async def _precompute_study_notes(document_id: str) -> Dict:
+    _, hit = await get_study_notes(document_id)
+    return {"cached": hit}
+
+
+async def _slide_plan(document_id: str):
+    text_chunks, image_chunks = await run_cpu(load_slide_inputs, document_id)
+    if not text_chunks:
+        raise LookupError(f"No chunks found for document_id: {document_id}")
+    return await get_slide_plan(document_id, text_chunks, image_chunks)
+
+
+async def _precompute_slide_plan(document_id: str) -> Dict:
+    _, hit = await _slide_plan(document_id)
+    return {"cached": hit}
+
+
+async def _precompute_tts(document_id: str) -> Dict:
+    slides, _ = await _slide_plan(document_id)
+    cache_dir = await run_io(get_tts_cache_dir, document_id)
+    if not cache_dir:
+        raise LookupError(f"No stored text for document_id: {document_id}")
+    return await cache_voiceovers(slides, cache_dir)
+
+
+# Run in this order; tts reuses the cached slide plan.
+ARTIFACTS: Dict[str, Callable[[str], Awaitable[Dict]]] = {
+    "summary": _precompute_summary,
+    "notes": _precompute_notes,
+    "study_notes": _precompute_study_notes,
+    "slide_plan": _precompute_slide_plan,
+    "tts": _precompute_tts,
+}
+
+PRECOMPUTE_ENABLED = env_bool("PRECOMPUTE_ENABLED", True)
+PRECOMPUTE_ARTIFACTS = [
+    name for name in env_list("PRECOMPUTE_ARTIFACTS", ",".join(ARTIFACTS)) if name in ARTIFACTS
+]
+# Documents precomputed at once. Gemini calls run at background priority, so
+# interactive chat is served first regardless.
+PRECOMPUTE_WORKERS = env_int("PRECOMPUTE_WORKERS", 1)
+PRECOMPUTE_CANCEL_WAIT_SECONDS = env_float("PRECOMPUTE_CANCEL_WAIT_SECONDS", 5.0)
+# Finished jobs kept for the status endpoint.
+PRECOMPUTE_HISTORY = 256
+
+PRECOMPUTE_RUNS = counter("esrl_precompute_total", "Precompute artifact runs, by outcome.", ("artifact", "outcome"))
+
+
+class _Job:
+    def __init__(self, document_id: str, artifacts: List[str]):
+        self.document_id = document_id
+        self.artifacts = {name: {"state": "queued"} for name in artifacts}
+        self.state = "queued"
+        self.cancelled = False
+        self.task: Optional[asyncio.Task] = None
+        self.created_at = time.time()
+
+    def status(self) -> Dict:
+        return {
+            "document_id": self.document_id,
+            "state": self.state,
+            "artifacts": {name: dict(entry) for name, entry in self.artifacts.items()}
+        }
+
+
+_jobs: Dict[str, _Job] = {}
+_queue: Optional[asyncio.Queue] = None
+_workers: List[asyncio.Task] = []
+
+
+async def _run_job(job: _Job) -> None:
+    job.state = "running"
+    for name, entry in job.artifacts.items():
+        entry["state"] = "running"
+        started = time.perf_counter()
+        try:
+            with span(f"precompute.{name}"):
+                entry.update(await ARTIFACTS[name](job.document_id))
+        except asyncio.CancelledError:
+            entry["state"] = "cancelled"
+            raise
+        except Exception as exc:
+            entry.update(state="failed", error=str(exc))
+            PRECOMPUTE_RUNS.inc(name, "failed")
+            print(f"Precompute of {name} for {job.document_id} failed: {exc}")
+        else:
+            entry["state"] = "done"
+            PRECOMPUTE_RUNS.inc(name, "cached" if entry.get("cached") else "done")
+        entry["seconds"] = round(time.perf_counter() - started, 3)
+    job.state = "done"
+
+
+async def _worker() -> None:
+    while True:
+        job = await _queue.get()
+        try:
+            if job.cancelled:
+                continue
+            job.task = asyncio.create_task(_run_job(job))
+            try:
+                await job.task
+            except asyncio.CancelledError:
+                if not job.cancelled:
+                    raise
+        finally:
+            _queue.task_done()
+
+
+def _ensure_workers() -> None:
+    global _queue
+    if _queue is None:
+        _queue = asyncio.Queue()
+    _workers[:] = [worker for worker in _workers if not worker.done()]
+    while len(_workers) < PRECOMPUTE_WORKERS:
+        # Workers outlive the upload request that starts them, so they get an
+        # empty context instead of inheriting its timing and profiling state.
+        _workers.append(asyncio.create_task(_worker(), name="precompute-worker", context=contextvars.Context()))
+
+
+def schedule_precompute(document_id: str) -> Optional[Dict]:
+    # Called from the upload handler once ingestion has finished; returns the
+    # job status, or None when precompute is disabled.
+    if not PRECOMPUTE_ENABLED or not PRECOMPUTE_ARTIFACTS:
+        return None
+    existing = _jobs.get(document_id)
+    if existing is not None and existing.state in ("queued", "running"):
+        return existing.status()
+    _ensure_workers()
+    job = _Job(document_id, PRECOMPUTE_ARTIFACTS)
+    _jobs.pop(document_id, None)
+    _jobs[document_id] = job
+    finished = [key for key, other in _jobs.items() if other.state == "done"]
+    for key in finished[:max(0, len(finished) - PRECOMPUTE_HISTORY)]:
+        del _jobs[key]
+    _queue.put_nowait(job)
+    return job.status()
+
+
+async def cancel_precompute(document_id: str) -> bool:
+    # Stops queued or running work for a document and waits briefly for the
+    # running task to unwind so it does not write cache entries after deletion.
+    job = _jobs.pop(document_id, None)
+    if job is None:
+        return False
+    was_active = job.state in ("queued", "running")
+    job.cancelled = True
+    job.state = "cancelled"
+    task = job.task
+    if task is not None and not task.done():
+        task.cancel()
+        await asyncio.wait([task], timeout=PRECOMPUTE_CANCEL_WAIT_SECONDS)
+    return was_active
+
+
+def get_precompute_status(document_id: str) -> Optional[Dict]:
+    job = _jobs.get(document_id)
+    return job.status() if job is not None else None
+
+
+register_gauge(
+    "esrl_precompute_jobs", "Precompute jobs by state.", ("state",),
+    lambda: [
+        ((state,), sum(1 for job in list(_jobs.values()) if job.state == state))
+        for state in ("queued", "running", "done")
+    ]
+)
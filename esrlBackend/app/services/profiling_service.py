@@ -0,0 +1,72 @@
+import os
+from typing import Dict, List, Optional
+
+from app.services.env_utils import env_bool, env_float, env_int
+from app.services.executor_service import run_io, start_thread_tracking, stop_thread_tracking
+from app.services.request_profiler import RequestProfiler, render_folded
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "storage/profiles")
+# Fraction of requests profiled without being asked (0 disables sampling).
+PROFILE_SAMPLE_RATE = env_float("PROFILE_SAMPLE_RATE", 0.0)
+PROFILE_INTERVAL_MS = env_float("PROFILE_INTERVAL_MS", 5.0, minimum=1.0)
+PROFILE_MAX_FILES = env_int("PROFILE_MAX_FILES", 50)
+PROFILE_MAX_CONCURRENT = env_int("PROFILE_MAX_CONCURRENT", 2)
+PROFILE_MAX_SECONDS = env_float("PROFILE_MAX_SECONDS", 600.0, minimum=1.0)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "").strip()
+# Lets a client request a profile with "X-Profile: 1" plus a matching
+# X-Admin-Token. Off unless ADMIN_TOKEN is configured.
+PROFILE_HEADER_ENABLED = env_bool("PROFILE_HEADER_ENABLED", bool(ADMIN_TOKEN))
+
+# The sampler itself lives in request_profiler.py, shared with the game engine.
+# Here it also samples executor threads running this request's run_cpu/run_io
+# work, and writes profiles through the I/O pool.
+_profiler = RequestProfiler(
+    profile_dir=PROFILE_DIR,
+    admin_token=ADMIN_TOKEN,
+    admin_prefix="/admin/",
+    offload=run_io,
+    sample_rate=PROFILE_SAMPLE_RATE,
+    header_enabled=PROFILE_HEADER_ENABLED,
+    interval_ms=PROFILE_INTERVAL_MS,
+    max_files=PROFILE_MAX_FILES,
+    max_concurrent=PROFILE_MAX_CONCURRENT,
+    max_seconds=PROFILE_MAX_SECONDS,
+    track_threads=start_thread_tracking,
+    untrack_threads=stop_thread_tracking
+)
+
+
+def is_admin(token: Optional[str]) -> bool:
+    return _profiler.is_admin(token)
+
+
+class ProfilingMiddleware:
+    # Plain ASGI middleware (not BaseHTTPMiddleware) so the endpoint runs in the
+    # same task and its await chain can be sampled.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        await _profiler.profile_request(self.app, scope, receive, send)
+
+
+def get_profile_path(profile_id: str) -> Optional[str]:
+    return _profiler.get_profile_path(profile_id)
+
+
+def load_profile(profile_id: str) -> Optional[Dict]:
+    return _profiler.load_profile(profile_id)
+
+
+def list_profiles() -> List[Dict]:
+    return _profiler.list_profiles()
+
+
+__all__ = [
+    "ProfilingMiddleware",
+    "get_profile_path",
+    "is_admin",
+    "list_profiles",
+    "load_profile",
+    "render_folded"
+]
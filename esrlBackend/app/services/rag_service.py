@@ -1,17 +1,19 @@
-from typing import Dict, List, Tuple
-import os
-from google import genai
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+import re
 
-from app.services.embedding_service import query_similar
+from app.services.answer_cache_service import answer_context_key, lookup_answer, store_answer
+from app.services.chunk_service import OVERLAP_CHARS
+from app.services.embedding_service import embed_query, query_similar
+from app.services.env_utils import env_float, env_int
+from app.services.executor_service import run_cpu
+from app.services.llm_gateway import generate_content, stream_content
+from app.services.metrics_service import timed
 
 MODEL_NAME = "gemini-2.5-flash"
-
-
-def _get_client():
-    api_key = os.getenv("GEMINI_API_KEY", "")
-    if not api_key:
-        raise RuntimeError("GEMINI_API_KEY is not set")
-    return genai.Client(api_key=api_key)
+RAG_CONTEXT_TOKEN_BUDGET = env_int("RAG_CONTEXT_TOKEN_BUDGET", 1800)
+NEAR_DUPLICATE_THRESHOLD = env_float("RAG_NEAR_DUPLICATE_THRESHOLD", 0.85)
+CHARS_PER_TOKEN = 4
+MIN_MERGE_OVERLAP = 20
 
 
 def retrieve_context(query: str, top_k: int = 5) -> Dict:
@@ -33,26 +35,142 @@ def _score_block(query_terms: List[str], doc: str, meta: Dict) -> int:
     return score
 
 
-def _build_context_blocks(query: str, context: Dict, max_items: int = 8) -> List[Tuple[str, Dict]]:
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def _chunk_position(chunk_id: str) -> Optional[int]:
+    try:
+        return int(str(chunk_id).rsplit("_", 1)[-1])
+    except ValueError:
+        return None
+
+
+def _merge_texts(left: str, right: str) -> str:
+    # Consecutive chunks of one paragraph share up to OVERLAP_CHARS of text.
+    max_overlap = min(len(left), len(right), OVERLAP_CHARS + 40)
+    for size in range(max_overlap, MIN_MERGE_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return left + "\n\n" + right
+
+
+def _shingles(text: str) -> Set[Tuple[str, ...]]:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < 3:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + 3]) for i in range(len(words) - 2)}
+
+
+def _is_near_duplicate(candidate: Set[Tuple[str, ...]], accepted: List[Set[Tuple[str, ...]]]) -> bool:
+    if not candidate:
+        return True
+    for other in accepted:
+        if not other:
+            continue
+        overlap = len(candidate & other) / min(len(candidate), len(other))
+        if overlap >= NEAR_DUPLICATE_THRESHOLD:
+            return True
+    return False
+
+
+def _merge_adjacent_items(items: List[Dict]) -> List[Dict]:
+    groups: Dict[Tuple, List[Dict]] = {}
+    unpositioned: List[Dict] = []
+    for item in items:
+        if item["position"] is None:
+            unpositioned.append(item)
+            continue
+        key = (item["meta"].get("document_id"), item["meta"].get("page"))
+        groups.setdefault(key, []).append(item)
+
+    merged: List[Dict] = []
+    for group in groups.values():
+        group.sort(key=lambda item: item["position"])
+        current = dict(group[0], chunk_ids=[group[0]["id"]])
+        for item in group[1:]:
+            if item["position"] == current["position"] + 1:
+                current["text"] = _merge_texts(current["text"], item["text"])
+                current["position"] = item["position"]
+                current["rank"] = min(current["rank"], item["rank"])
+                current["chunk_ids"].append(item["id"])
+                continue
+            merged.append(current)
+            current = dict(item, chunk_ids=[item["id"]])
+        merged.append(current)
+
+    for item in unpositioned:
+        merged.append(dict(item, chunk_ids=[item["id"]]))
+    return merged
+
+
+@timed("context_packing")
+def _build_context_blocks(
+    query: str,
+    context: Dict,
+    max_items: int = 8,
+    token_budget: int = RAG_CONTEXT_TOKEN_BUDGET
+) -> List[Tuple[str, Dict]]:
     documents: List[str] = (context.get("documents") or [[]])[0]
     metadatas: List[Dict] = (context.get("metadatas") or [[]])[0]
-    items: List[Tuple[str, Dict]] = []
-
-    for doc, meta in zip(documents, metadatas):
-        items.append((doc, meta or {}))
-
+    ids: List[str] = (context.get("ids") or [[]])[0]
     query_terms = [t for t in query.lower().split() if len(t) > 2]
-    items.sort(key=lambda item: _score_block(query_terms, item[0], item[1]), reverse=True)
-
-    return items[:max_items]
-
-
-def generate_answer(query: str, context: Dict) -> str:
-    client = _get_client()
-    blocks = _build_context_blocks(query, context)
-    if not blocks:
-        return "Not found in the provided notes. Try rephrasing or upload more pages."
 
+    items: List[Dict] = []
+    for rank, (doc, meta) in enumerate(zip(documents, metadatas)):
+        if not doc:
+            continue
+        meta = meta or {}
+        chunk_id = ids[rank] if rank < len(ids) else f"rank_{rank}"
+        items.append({
+            "id": chunk_id,
+            "text": doc.strip(),
+            "meta": meta,
+            "rank": rank,
+            "position": _chunk_position(chunk_id) if rank < len(ids) else None,
+        })
+
+    merged = _merge_adjacent_items(items)
+    for block in merged:
+        block["score"] = _score_block(query_terms, block["text"], block["meta"])
+    merged.sort(key=lambda block: (-block["score"], block["rank"]))
+
+    packed: List[Tuple[str, Dict]] = []
+    accepted_shingles: List[Set[Tuple[str, ...]]] = []
+    used_tokens = 0
+    for block in merged:
+        if len(packed) >= max_items:
+            break
+        shingles = _shingles(block["text"])
+        if _is_near_duplicate(shingles, accepted_shingles):
+            continue
+
+        text = block["text"]
+        tokens = _estimate_tokens(text)
+        if used_tokens + tokens > token_budget:
+            if packed:
+                continue
+            # Always keep the best block, trimmed to the budget.
+            text = text[:token_budget * CHARS_PER_TOKEN]
+            tokens = _estimate_tokens(text)
+
+        meta = dict(block["meta"], chunk_ids=block["chunk_ids"])
+        packed.append((text, meta))
+        accepted_shingles.append(shingles)
+        used_tokens += tokens
+
+    return packed
+
+
+def _retrieved_chunk_ids(context: Dict) -> List[str]:
+    ids = context.get("ids") or [[]]
+    return [str(chunk_id) for chunk_id in (ids[0] if ids and isinstance(ids[0], list) else ids)]
+
+
+NOT_FOUND_ANSWER = "Not found in the provided notes. Try rephrasing or upload more pages."
+
+
+def _build_prompt(query: str, blocks: List[Tuple[str, Dict]]) -> str:
     formatted_blocks = []
     for index, (doc, meta) in enumerate(blocks, start=1):
         heading = meta.get("heading") or "Source"
@@ -63,7 +181,7 @@ def generate_answer(query: str, context: Dict) -> str:
             f"[{index}] ({page_tag}, {heading}, {discourse})\n{doc}"
         )
 
-    prompt = (
+    return (
         "Answer the question using only the context. "
         "If the answer is not in the context, say 'Not found in the provided notes.' "
         "Write the answer in Markdown with clear sections. "
@@ -80,8 +198,56 @@ def generate_answer(query: str, context: Dict) -> str:
         + "\n\nQuestion: "
         + query
     )
-    response = client.models.generate_content(
+
+
+def _lookup_cached_answer(query: str, context: Dict, use_cache: bool):
+    if not use_cache:
+        return None, None, None
+    cache_key = answer_context_key(MODEL_NAME, _retrieved_chunk_ids(context))
+    query_embedding = embed_query(query)
+    return cache_key, query_embedding, lookup_answer(query_embedding, cache_key)
+
+
+async def generate_answer(query: str, context: Dict, use_cache: bool = True) -> str:
+    blocks = _build_context_blocks(query, context)
+    if not blocks:
+        return NOT_FOUND_ANSWER
+
+    cache_key, query_embedding, cached = await run_cpu(_lookup_cached_answer, query, context, use_cache)
+    if cached is not None:
+        return cached
+
+    response = await generate_content(
         model=MODEL_NAME,
-        contents=prompt
+        contents=_build_prompt(query, blocks)
     )
-    return response.text
+    answer = response.text
+    if cache_key is not None:
+        store_answer(query_embedding, cache_key, answer)
+    return answer
+
+
+async def generate_answer_stream(query: str, context: Dict, use_cache: bool = True) -> AsyncIterator[str]:
+    blocks = _build_context_blocks(query, context)
+    if not blocks:
+        yield NOT_FOUND_ANSWER
+        return
+
+    cache_key, query_embedding, cached = await run_cpu(_lookup_cached_answer, query, context, use_cache)
+    if cached is not None:
+        yield cached
+        return
+
+    parts: List[str] = []
+    async for chunk in stream_content(
+        model=MODEL_NAME,
+        contents=_build_prompt(query, blocks)
+    ):
+        text = chunk.text
+        if not text:
+            continue
+        parts.append(text)
+        yield text
+
+    if cache_key is not None:
+        store_answer(query_embedding, cache_key, "".join(parts))
@@ -0,0 +1,342 @@
+import asyncio
+import glob
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# Sampling request profiler shared by the backend (profiling_service.py) and
+# the game engine (game-engine/profiling.py, which loads this file by path).
+# Standard library only, so it can be loaded without the backend's packages;
+# each service supplies its configuration, how to run blocking file I/O, and
+# optionally how to learn which worker threads are running the request's work.
+
+MAX_STACK_DEPTH = 96
+_PROFILE_ID = re.compile(r"^[0-9a-f]{16}$")
+# Top frames of a thread that is parked rather than doing work. With the
+# default event loop an idle loop sits in selectors.select.
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("socket.py", "accept"),
+    ("runners.py", "run"),
+    ("base_events.py", "run_forever"),
+    ("base_events.py", "run_until_complete"),
+}
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _stack(frame) -> List[str]:
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def _is_idle(frame) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES
+
+
+def _await_stack(task) -> List[str]:
+    # Walk the suspended coroutine chain so wall time spent awaiting I/O (Gemini,
+    # worker threads, subprocesses) is attributed to the awaiting code.
+    labels = []
+    coro = task.get_coro() if task is not None else None
+    while coro is not None and len(labels) < MAX_STACK_DEPTH:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None) or getattr(coro, "ag_frame", None)
+        if frame is None:
+            break
+        labels.append(_frame_label(frame))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+    return labels
+
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def _thread_cpu_seconds(native_id: Optional[int]) -> Optional[float]:
+    if native_id is None:
+        return None
+    try:
+        with open(f"/proc/self/task/{native_id}/schedstat", "r") as f:
+            return int(f.read().split()[0]) / 1e9
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        with open(f"/proc/self/task/{native_id}/stat", "r") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _Sampler(threading.Thread):
+    # Samples only the profiled request: the event loop while the request's
+    # task is the one running on it, its suspended await chain otherwise, and
+    # worker threads currently running work the request submitted.
+    def __init__(self, loop, task, request_threads: Dict[int, int], interval: float, max_seconds: float):
+        super().__init__(name="request-profiler", daemon=True)
+        self.loop = loop
+        self.loop_thread_id = threading.get_ident()
+        self.task = task
+        self.request_threads = request_threads
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.samples = 0
+        self.wall: Dict[str, float] = {}
+        self.cpu: Dict[str, float] = {}
+        self.threads: Dict[str, Dict[str, float]] = {}
+        self.cpu_source = "proc"
+        # Per-thread CPU readings from the previous tick. Threads that were not
+        # sampled (busy with other requests) drop out, so their next delta is
+        # skipped rather than charged to this request.
+        self._last_cpu: Dict[int, float] = {}
+        self._next_cpu: Dict[int, float] = {}
+        self._last_tick = time.perf_counter()
+        self._deadline = self._last_tick + max_seconds
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.join(timeout=1.0)
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            if time.perf_counter() > self._deadline:
+                break
+            try:
+                self._sample()
+            except Exception:
+                continue
+
+    def _add(self, table: Dict[str, float], key: str, ms: float) -> None:
+        table[key] = table.get(key, 0.0) + ms
+
+    def _record(self, name: str, thread, frame, elapsed_ms: float) -> None:
+        key = ";".join([name] + _stack(frame))
+        self._add(self.wall, key, elapsed_ms)
+        totals = self.threads.setdefault(name, {"wall_ms": 0.0, "cpu_ms": 0.0})
+        totals["wall_ms"] += elapsed_ms
+
+        native_id = getattr(thread, "native_id", None)
+        cpu_now = _thread_cpu_seconds(native_id)
+        if cpu_now is None:
+            # No per-thread CPU clock (non-Linux): treat busy samples as on-CPU.
+            self.cpu_source = "approximate"
+            self._add(self.cpu, key, elapsed_ms)
+            totals["cpu_ms"] += elapsed_ms
+            return
+        previous = self._last_cpu.get(native_id)
+        self._next_cpu[native_id] = cpu_now
+        if previous is not None and cpu_now > previous:
+            cpu_ms = (cpu_now - previous) * 1000
+            self._add(self.cpu, key, cpu_ms)
+            totals["cpu_ms"] += cpu_ms
+
+    def _sample(self) -> None:
+        now = time.perf_counter()
+        elapsed_ms = (now - self._last_tick) * 1000
+        self._last_tick = now
+        self.samples += 1
+
+        threads = {t.ident: t for t in threading.enumerate()}
+        frames = sys._current_frames()
+
+        loop_frame = frames.get(self.loop_thread_id)
+        if asyncio.current_task(self.loop) is self.task and loop_frame is not None and not _is_idle(loop_frame):
+            self._record("event-loop", threads.get(self.loop_thread_id), loop_frame, elapsed_ms)
+        elif self.task is not None and not self.task.done():
+            awaiting = _await_stack(self.task)
+            if awaiting:
+                self._add(self.wall, ";".join(["await"] + awaiting), elapsed_ms)
+
+        for ident, frame in frames.items():
+            if ident not in self.request_threads or _is_idle(frame):
+                continue
+            thread = threads.get(ident)
+            self._record(thread.name if thread is not None else f"thread-{ident}", thread, frame, elapsed_ms)
+
+        self._last_cpu, self._next_cpu = self._next_cpu, {}
+
+
+def _round_table(table: Dict[str, float]) -> Dict[str, float]:
+    return {key: round(value, 3) for key, value in sorted(table.items(), key=lambda item: -item[1])}
+
+
+def render_folded(profile: Dict, kind: str = "wall") -> str:
+    # Brendan Gregg "folded" format (stack;frames value), consumable by
+    # flamegraph.pl and speedscope. Values are microseconds.
+    table = profile.get("cpu" if kind == "cpu" else "wall") or {}
+    lines: List[Tuple[str, int]] = [(stack, int(round(ms * 1000))) for stack, ms in table.items()]
+    return "\n".join(f"{stack} {value}" for stack, value in lines if value > 0) + "\n"
+
+
+class RequestProfiler:
+    def __init__(
+        self,
+        profile_dir: str,
+        admin_token: str,
+        admin_prefix: str,
+        offload: Callable[..., Awaitable[Any]],
+        sample_rate: float = 0.0,
+        header_enabled: Optional[bool] = None,
+        interval_ms: float = 5.0,
+        max_files: int = 50,
+        max_concurrent: int = 2,
+        max_seconds: float = 600.0,
+        track_threads: Optional[Callable[[], Tuple[Dict[int, int], Any]]] = None,
+        untrack_threads: Optional[Callable[[Any], None]] = None
+    ):
+        # offload(func, *args) runs blocking file I/O off the event loop.
+        # track_threads() returns (thread id -> running calls, token) for
+        # worker threads running the request's work; untrack_threads(token)
+        # ends it. Without them only the event loop is sampled.
+        self.profile_dir = profile_dir
+        self.admin_token = admin_token
+        self.admin_prefix = admin_prefix
+        self.offload = offload
+        self.sample_rate = sample_rate
+        # The X-Profile header trigger is off unless an admin token is set.
+        self.header_enabled = bool(admin_token) if header_enabled is None else header_enabled
+        self.interval_ms = interval_ms
+        self.max_files = max_files
+        self.max_seconds = max_seconds
+        self.track_threads = track_threads
+        self.untrack_threads = untrack_threads
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._write_lock = threading.Lock()
+
+    def is_admin(self, token: Optional[str]) -> bool:
+        # Profiles hold stacks from the running process, so the admin
+        # endpoints stay closed until an admin token is configured.
+        return bool(self.admin_token) and hmac.compare_digest(
+            (token or "").encode("utf-8"), self.admin_token.encode("utf-8")
+        )
+
+    def should_profile(self, scope) -> bool:
+        if scope.get("path", "").startswith(self.admin_prefix):
+            return False
+        headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope.get("headers", [])}
+        if self.header_enabled and headers.get("x-profile", "").strip().lower() in ("1", "true", "yes"):
+            return self.is_admin(headers.get("x-admin-token"))
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def write_profile(self, profile: Dict) -> None:
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f"{profile['id']}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(profile, f)
+        os.replace(tmp_path, path)
+
+        # Bounded ring: drop the oldest profiles beyond max_files.
+        with self._write_lock:
+            files = sorted(glob.glob(os.path.join(self.profile_dir, "*.json")), key=os.path.getmtime)
+            for stale in files[:-self.max_files]:
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+
+    def get_profile_path(self, profile_id: str) -> Optional[str]:
+        if not _PROFILE_ID.match(profile_id or ""):
+            return None
+        path = os.path.join(self.profile_dir, f"{profile_id}.json")
+        return path if os.path.exists(path) else None
+
+    def load_profile(self, profile_id: str) -> Optional[Dict]:
+        # None when the id is invalid or the ring has already dropped the file.
+        path = self.get_profile_path(profile_id)
+        if not path:
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def list_profiles(self) -> List[Dict]:
+        # Summaries, newest first.
+        summaries = []
+        paths = []
+        for path in glob.glob(os.path.join(self.profile_dir, "*.json")):
+            try:
+                paths.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+        for _, path in sorted(paths, reverse=True):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    profile = json.load(f)
+            except (OSError, ValueError):
+                continue
+            summaries.append({
+                key: profile.get(key)
+                for key in ("id", "created_at", "method", "path", "status", "duration_ms", "samples", "cpu_source")
+            })
+        return summaries
+
+    async def profile_request(self, app, scope, receive, send) -> None:
+        if scope["type"] != "http" or not self.should_profile(scope) or not self._slots.acquire(blocking=False):
+            await app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex[:16]
+        status = {"code": 500}
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                headers = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode("ascii"))]
+                message = dict(message, headers=headers)
+            await send(message)
+
+        request_threads, tracking = self.track_threads() if self.track_threads else ({}, None)
+        sampler = _Sampler(
+            asyncio.get_running_loop(), asyncio.current_task(), request_threads,
+            self.interval_ms / 1000, self.max_seconds
+        )
+        created_at = datetime.now(timezone.utc).isoformat()
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await app(scope, receive, send_with_id)
+        finally:
+            sampler.stop()
+            if self.untrack_threads and tracking is not None:
+                self.untrack_threads(tracking)
+            self._slots.release()
+            profile = {
+                "id": profile_id,
+                "created_at": created_at,
+                "method": scope.get("method"),
+                "path": scope.get("path"),
+                "status": status["code"],
+                "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                "interval_ms": self.interval_ms,
+                "samples": sampler.samples,
+                "cpu_source": sampler.cpu_source,
+                "threads": {name: {k: round(v, 3) for k, v in totals.items()} for name, totals in sampler.threads.items()},
+                "wall": _round_table(sampler.wall),
+                "cpu": _round_table(sampler.cpu)
+            }
+            try:
+                await self.offload(self.write_profile, profile)
+            except OSError:
+                pass
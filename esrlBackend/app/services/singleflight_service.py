@@ -0,0 +1,227 @@
+import asyncio
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: coalescing stays per process.
+    fcntl = None
+
+from app.services.env_utils import env_bool, env_float
+from app.services.executor_service import run_io
+from app.services.metrics_service import counter, register_gauge
+
+SINGLEFLIGHT_DIR = "storage/singleflight"
+SINGLEFLIGHT_ENABLED = env_bool("SINGLEFLIGHT_ENABLED", True)
+# How long a request waits on another worker's computation before running its
+# own; video renders can take several minutes.
+SINGLEFLIGHT_WAIT_SECONDS = env_float("SINGLEFLIGHT_WAIT_SECONDS", 900.0, minimum=1.0)
+_POLL_SECONDS = 0.1
+# Results only need to outlive the waiters that were queued on the lock.
+_RESULT_TTL_SECONDS = 60.0
+
+os.makedirs(SINGLEFLIGHT_DIR, exist_ok=True)
+
+SINGLEFLIGHT_CALLS = counter(
+    "esrl_singleflight_total",
+    "Coalescable requests by role: leader computed it, shared awaited one in this worker, "
+    "shared_remote reused another worker's result.",
+    ("endpoint", "role")
+)
+
+_inflight: Dict[str, asyncio.Task] = {}
+_waiters: Dict[asyncio.Task, int] = {}
+_last_sweep = 0.0
+_sweep_lock = threading.Lock()
+
+
+def singleflight_key(endpoint: str, parts: Sequence[Any]) -> str:
+    raw = json.dumps([endpoint, *parts], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _result_path(key: str) -> str:
+    return os.path.join(SINGLEFLIGHT_DIR, f"{key}.json")
+
+
+def _lock_path(key: str) -> str:
+    return os.path.join(SINGLEFLIGHT_DIR, f"{key}.lock")
+
+
+def _load_result(key: str, since: float) -> Tuple[bool, Any]:
+    # Only a result finished after this request started waiting counts; older
+    # files are left over from earlier, unrelated requests.
+    try:
+        with open(_result_path(key), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return False, None
+    if not isinstance(data, dict) or data.get("finished_at", 0) < since:
+        return False, None
+    return True, data.get("result")
+
+
+def _sweep_results() -> None:
+    global _last_sweep
+    now = time.time()
+    with _sweep_lock:
+        if now - _last_sweep < _RESULT_TTL_SECONDS:
+            return
+        _last_sweep = now
+    for path in glob.glob(os.path.join(SINGLEFLIGHT_DIR, "*.json")):
+        try:
+            if now - os.path.getmtime(path) > _RESULT_TTL_SECONDS:
+                os.remove(path)
+        except OSError:
+            pass
+    for path in glob.glob(os.path.join(SINGLEFLIGHT_DIR, "*.lock")):
+        _remove_stale_lock(path, now)
+
+
+def _remove_stale_lock(path: str, now: float) -> None:
+    # Removed only while we hold its lock, so nobody is computing under it.
+    # A worker that opened it just before the unlink notices in _lead (the
+    # path no longer points at its file) and reopens.
+    try:
+        if now - os.path.getmtime(path) <= _RESULT_TTL_SECONDS:
+            return
+        with open(path, "a+") as handle:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+            os.remove(path)
+    except OSError:
+        pass
+
+
+def _store_result(key: str, result: Any) -> None:
+    try:
+        payload = json.dumps({"finished_at": time.time(), "result": result})
+    except (TypeError, ValueError):
+        return  # Not shareable across workers; waiters compute their own.
+    path = _result_path(key)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    except OSError as exc:
+        print(f"Could not store singleflight result: {exc}")
+    _sweep_results()
+
+
+def _open_lock(key: str):
+    # Touching the file marks the key as recently used for the stale-lock sweep.
+    path = _lock_path(key)
+    handle = open(path, "a+")
+    os.utime(path)
+    return handle
+
+
+def _lock_is_current(key: str, handle) -> bool:
+    try:
+        return os.stat(_lock_path(key)).st_ino == os.fstat(handle.fileno()).st_ino
+    except OSError:
+        return False
+
+
+async def _lead(endpoint: str, key: str, compute: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+    # Runs once per key in this worker. The file lock extends that to other
+    # workers: whoever holds it computes, and waiters pick up its stored result.
+    if fcntl is None:
+        SINGLEFLIGHT_CALLS.inc(endpoint, "leader")
+        return await compute(), False
+
+    handle = await run_io(_open_lock, key)
+    try:
+        waited_since = time.time()
+        deadline = time.monotonic() + SINGLEFLIGHT_WAIT_SECONDS
+        contended = False
+        while True:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                if _lock_is_current(key, handle):
+                    break
+                # The sweep removed the file between our open and flock.
+                handle.close()
+                handle = await run_io(_open_lock, key)
+                continue
+            except BlockingIOError:
+                contended = True
+                if time.monotonic() >= deadline:
+                    print(f"Singleflight wait for {endpoint} timed out; computing without the lock")
+                    break
+                await asyncio.sleep(_POLL_SECONDS)
+
+        if contended:
+            found, result = await run_io(_load_result, key, waited_since)
+            if found:
+                SINGLEFLIGHT_CALLS.inc(endpoint, "shared_remote")
+                return result, True
+
+        SINGLEFLIGHT_CALLS.inc(endpoint, "leader")
+        result = await compute()
+        await run_io(_store_result, key, result)
+        return result, False
+    finally:
+        handle.close()  # Also releases the lock.
+
+
+def _forget(key: str, task: asyncio.Task) -> None:
+    if _inflight.get(key) is task:
+        del _inflight[key]
+    _waiters.pop(task, None)
+    if not task.cancelled():
+        task.exception()  # Callers already got it; avoids a "never retrieved" warning.
+
+
+async def _wait(key: str, task: asyncio.Task) -> Tuple[Any, bool]:
+    # Shielded, so one caller being cancelled does not cancel the work for the
+    # others. Once every caller has gone (e.g. a deleted document's precompute
+    # job), the work is cancelled too.
+    _waiters[task] = _waiters.get(task, 0) + 1
+    try:
+        return await asyncio.shield(task)
+    finally:
+        remaining = _waiters.get(task, 1) - 1
+        if remaining > 0:
+            _waiters[task] = remaining
+        else:
+            _waiters.pop(task, None)
+            if not task.done():
+                if _inflight.get(key) is task:
+                    del _inflight[key]  # Later callers start fresh work.
+                task.cancel()
+
+
+async def coalesce(
+    endpoint: str,
+    key_parts: Sequence[Any],
+    compute: Callable[[], Awaitable[Any]]
+) -> Tuple[Any, bool]:
+    # Returns (result, shared). Concurrent calls with the same endpoint and key
+    # parts await a single computation; errors reach every caller.
+    if not SINGLEFLIGHT_ENABLED:
+        return await compute(), False
+    key = singleflight_key(endpoint, key_parts)
+    task: Optional[asyncio.Task] = _inflight.get(key)
+    if task is not None:
+        SINGLEFLIGHT_CALLS.inc(endpoint, "shared")
+        result, _ = await _wait(key, task)
+        return result, True
+    task = asyncio.create_task(_lead(endpoint, key, compute))
+    _inflight[key] = task
+    task.add_done_callback(lambda done: _forget(key, done))
+    return await _wait(key, task)
+
+
+register_gauge(
+    "esrl_singleflight_inflight", "Coalesced computations currently running in this worker.", (),
+    lambda: [((), len(_inflight))]
+)
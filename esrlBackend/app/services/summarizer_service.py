@@ -1,50 +1,239 @@
-from typing import Dict, List
-import os
-from google import genai
+import asyncio
+import hashlib
+from functools import partial
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.services.derived_cache_service import load_derived, store_derived
+from app.services.env_utils import env_float, env_int
+from app.services.executor_service import run_io
+from app.services.llm_gateway import PRIORITY_INTERACTIVE, generate_content
+from app.services.metrics_service import span
 
 MODEL_NAME = "gemini-2.5-flash"
+# Bump whenever the prompt changes so cached results on disk are regenerated.
+SUMMARY_PROMPT_VERSION = "2"
+PARTIAL_PROMPT_VERSION = "1"
+
+CHARS_PER_TOKEN = 4
+# Input bound for one map or reduce prompt, and for the final three-level prompt.
+SUMMARY_BATCH_TOKENS = env_int("SUMMARY_BATCH_TOKENS", 3000, minimum=200)
+SUMMARY_MAX_CONCURRENCY = env_int("SUMMARY_MAX_CONCURRENCY", 4)
+SUMMARY_MAX_DEPTH = 4
+# Bounds one section or batch summary, including gateway queueing and retries.
+SECTION_SUMMARY_TIMEOUT_SECONDS = env_float("SECTION_SUMMARY_TIMEOUT_SECONDS", 180.0, minimum=1.0)
+# When a batch cannot be summarized, this much of its leading text stands in
+# for it so the final summary still covers that part of the document.
+_FALLBACK_CHARS = 1200
+# A batch may also close early (once half full) after a section whose hash hits
+# this modulus. Boundaries then depend on content rather than position, so an
+# edit only changes the batches around it and the rest stay cached.
+_BOUNDARY_MODULUS = 4
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def split_sections(text: str) -> List[str]:
+    return [part.strip() for part in text.split("\n\n") if part.strip()]
+
+
+def _is_boundary(section: str) -> bool:
+    return int(hashlib.sha1(section.encode("utf-8")).hexdigest()[:8], 16) % _BOUNDARY_MODULUS == 0
+
+
+def batch_sections(sections: List[str], max_tokens: int = SUMMARY_BATCH_TOKENS) -> List[str]:
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    pieces: List[str] = []
+    for section in sections:
+        pieces.extend(section[start:start + max_chars] for start in range(0, len(section), max_chars))
+
+    batches: List[str] = []
+    current: List[str] = []
+    used = 0
+    for piece in pieces:
+        tokens = _estimate_tokens(piece)
+        if current and used + tokens > max_tokens:
+            batches.append("\n\n".join(current))
+            current, used = [], 0
+        current.append(piece)
+        used += tokens
+        if used >= max_tokens // 2 and _is_boundary(piece):
+            batches.append("\n\n".join(current))
+            current, used = [], 0
+    if current:
+        batches.append("\n\n".join(current))
+    return batches
+
+
+def _partial_prompt(kind: str, batch: str) -> str:
+    if kind == "summary_map":
+        return (
+            "Summarize this part of a longer document as 4-8 dense bullet points. "
+            "Keep every key concept, definition, result and example; no introduction.\n\n"
+            f"Text:\n{batch}"
+        )
+    return (
+        "Summarize these consecutive partial summaries of one document into a single "
+        "list of dense bullet points, in document order, keeping every key concept.\n\n"
+        f"Partial summaries:\n{batch}"
+    )
+
+
+async def _fan_out(
+    items: Sequence[Any],
+    worker: Callable[[Any], Awaitable[Any]],
+    max_concurrency: int,
+    timeout_seconds: float
+) -> AsyncIterator[Tuple[int, Any, Optional[str]]]:
+    # Runs worker(item) with at most max_concurrency in flight and yields
+    # (index, result, error) in completion order. A failure or timeout only
+    # affects its own item. Closing the iterator early cancels the rest.
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
 
+    async def run(index: int, item: Any) -> Tuple[int, Any, Optional[str]]:
+        async with semaphore:
+            try:
+                return index, await asyncio.wait_for(worker(item), timeout_seconds), None
+            except asyncio.TimeoutError:
+                return index, None, f"timed out after {timeout_seconds:g}s"
+            except Exception as exc:
+                return index, None, str(exc) or type(exc).__name__
 
-def _get_client():
-    api_key = os.getenv("GEMINI_API_KEY", "")
-    if not api_key:
-        raise RuntimeError("GEMINI_API_KEY is not set")
-    return genai.Client(api_key=api_key)
+    tasks = [asyncio.create_task(run(index, item)) for index, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
 
 
-def summarize_text_levels(text: str) -> Dict:
-    client = _get_client()
+async def _summarize_partial(kind: str, batch: str, priority: int) -> str:
+    # Cached per input hash, so only batches whose text changed are re-summarized.
+    cached = await run_io(load_derived, kind, batch, PARTIAL_PROMPT_VERSION, MODEL_NAME)
+    if cached is not None:
+        return cached
+    response = await generate_content(
+        model=MODEL_NAME,
+        contents=_partial_prompt(kind, batch),
+        priority=priority
+    )
+    summary = (response.text or "").strip()
+    if summary:
+        await run_io(store_derived, kind, batch, PARTIAL_PROMPT_VERSION, MODEL_NAME, summary)
+    return summary
+
+
+async def condense_text(text: str, priority: int = PRIORITY_INTERACTIVE) -> Tuple[str, int, int]:
+    # Map-reduce until the text fits one prompt. Returns (text, levels, failed
+    # batches); short documents come back unchanged with zero levels.
+    sections = split_sections(text)
+    current = text
+    depth = 0
+    failed = 0
+    while _estimate_tokens(current) > SUMMARY_BATCH_TOKENS and depth < SUMMARY_MAX_DEPTH:
+        kind = "summary_map" if depth == 0 else "summary_reduce"
+        batches = batch_sections(sections, SUMMARY_BATCH_TOKENS)
+        partials: List[str] = [""] * len(batches)
+        with span(kind):
+            async for index, summary, error in _fan_out(
+                batches, partial(_summarize_partial, kind, priority=priority),
+                SUMMARY_MAX_CONCURRENCY, SECTION_SUMMARY_TIMEOUT_SECONDS
+            ):
+                if error:
+                    failed += 1
+                    print(f"{kind} batch {index} failed: {error}")
+                    summary = batches[index][:_FALLBACK_CHARS]
+                partials[index] = summary
+        sections = [summary for summary in partials if summary]
+        current = "\n\n".join(sections)
+        depth += 1
+    return current[:SUMMARY_BATCH_TOKENS * CHARS_PER_TOKEN], depth, failed
+
+
+def partial_summary_inputs(text: str) -> List[str]:
+    # Every map/reduce input of `text` whose partial summary is cached, so
+    # document deletion can drop them.
+    inputs: List[str] = []
+    sections = split_sections(text)
+    current = text
+    depth = 0
+    while _estimate_tokens(current) > SUMMARY_BATCH_TOKENS and depth < SUMMARY_MAX_DEPTH:
+        kind = "summary_map" if depth == 0 else "summary_reduce"
+        batches = batch_sections(sections, SUMMARY_BATCH_TOKENS)
+        inputs.extend(batches)
+        partials: List[Optional[str]] = [
+            load_derived(kind, batch, PARTIAL_PROMPT_VERSION, MODEL_NAME) for batch in batches
+        ]
+        if any(partial is None for partial in partials):
+            break
+        sections = [partial for partial in partials if partial]
+        current = "\n\n".join(sections)
+        depth += 1
+    return inputs
+
+
+async def summarize_text_levels(text: str, priority: int = PRIORITY_INTERACTIVE) -> Dict:
+    condensed, _, failed = await condense_text(text, priority=priority)
     prompt = (
         "Summarize the text at three levels:\n"
         "1) TL;DR (1-2 sentences)\n"
         "2) Concept summary (3-5 bullets)\n"
         "3) Beginner-friendly (short paragraph)\n\n"
-        f"Text:\n{text[:4000]}"
+        f"Text:\n{condensed}"
     )
-    response = client.models.generate_content(
+    response = await generate_content(
         model=MODEL_NAME,
-        contents=prompt
+        contents=prompt,
+        priority=priority
     )
-    return {"summary": response.text}
+    result = {"summary": response.text}
+    if failed:
+        # Reported so callers do not cache a summary built from fallback text.
+        result["failed_batches"] = failed
+    return result
 
 
-def summarize_sections(sections: List[Dict]) -> List[Dict]:
-    client = _get_client()
-    summaries: List[Dict] = []
+async def _summarize_section(section: Dict, priority: int) -> str:
+    content = section.get("content", "")
+    prompt = (
+        "Summarize this section in 2-3 sentences."
+        f"\n\n{content[:2000]}"
+    )
+    response = await generate_content(
+        model=MODEL_NAME,
+        contents=prompt,
+        priority=priority
+    )
+    return response.text
+
+
+async def stream_section_summaries(
+    sections: List[Dict],
+    max_concurrency: int = SUMMARY_MAX_CONCURRENCY,
+    timeout_seconds: float = SECTION_SUMMARY_TIMEOUT_SECONDS,
+    priority: int = PRIORITY_INTERACTIVE
+) -> AsyncIterator[Dict]:
+    # Yields {"index", "heading", "summary"} as each section finishes; a failed
+    # section has summary None and an "error".
+    async for index, summary, error in _fan_out(
+        sections, partial(_summarize_section, priority=priority), max_concurrency, timeout_seconds
+    ):
+        item = {"index": index, "heading": sections[index].get("heading"), "summary": summary}
+        if error:
+            item["error"] = error
+        yield item
 
-    for section in sections:
-        content = section.get("content", "")
-        prompt = (
-            "Summarize this section in 2-3 sentences."
-            f"\n\n{content[:2000]}"
-        )
-        response = client.models.generate_content(
-            model=MODEL_NAME,
-            contents=prompt
-        )
-        summaries.append({
-            "heading": section.get("heading"),
-            "summary": response.text
-        })
 
+async def summarize_sections(
+    sections: List[Dict],
+    max_concurrency: int = SUMMARY_MAX_CONCURRENCY,
+    timeout_seconds: float = SECTION_SUMMARY_TIMEOUT_SECONDS,
+    priority: int = PRIORITY_INTERACTIVE
+) -> List[Dict]:
+    # Same order as `sections`, whatever order the calls finish in.
+    summaries: List[Dict] = [{} for _ in sections]
+    async for item in stream_section_summaries(sections, max_concurrency, timeout_seconds, priority):
+        summaries[item.pop("index")] = item
     return summaries
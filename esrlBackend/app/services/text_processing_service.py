@@ -1,6 +1,10 @@
 import re
 from typing import List, Dict
 
+from app.services.metrics_service import timed
+
+
+@timed("clean_text")
 def clean_text(text: str) -> str:
     # Remove multiple newlines
     text = re.sub(r'\n{2,}', '\n\n', text)
@@ -53,6 +57,7 @@ def normalize_heading(heading: str) -> str:
     return heading[:120]
 
 
+@timed("structure")
 def structure_pages(pages_text: List[str]) -> List[Dict]:
     sections: List[Dict] = []
     for page_index, page_text in enumerate(pages_text):
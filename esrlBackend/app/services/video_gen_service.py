@@ -1,20 +1,35 @@
 import asyncio
+import glob
+import hashlib
 import json
 import os
+import shutil
 import subprocess
-import time
 import uuid
 import wave
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
-from google import genai
-from google.genai import types
-from playwright.async_api import Browser, async_playwright
-from pydub import AudioSegment
+from app.services.derived_cache_service import record_lookup
+from app.services.env_utils import env_int
+from app.services.executor_service import run_io, run_subprocess
+from app.services.llm_gateway import PRIORITY_BACKGROUND, generate_content
+from app.services.metrics_service import timed
+
+# playwright, pydub and google.genai are imported inside the functions that use
+# them, so importing this module (and main.py) does not pay for video support.
+if TYPE_CHECKING:
+    from playwright.async_api import Browser
 
 MODEL_NAME = "gemini-2.5-flash"
+TTS_MODEL_NAME = "gemini-2.5-flash-preview-tts"
+TTS_VOICE = "puck"
+# Token budget for the document content in the slide-plan prompt; callers
+# pick chunks with the content selector to fit it.
+SLIDE_PLAN_TOKEN_BUDGET = env_int("SLIDE_PLAN_TOKEN_BUDGET", 3000)
+# Bump whenever the slide-plan prompt changes so cached plans are regenerated.
+SLIDE_PLAN_PROMPT_VERSION = "1"
 
 
 # =====================================================
@@ -56,13 +71,6 @@ def _create_run_dirs(document_id: str) -> Dict[str, str]:
     return dirs
 
 
-def _get_client():
-    api_key = os.getenv("GEMINI_API_KEY", "")
-    if not api_key:
-        raise RuntimeError("GEMINI_API_KEY is not set")
-    return genai.Client(api_key=api_key)
-
-
 def _clean_json_response(text: str):
     text = text.strip()
     if text.startswith("```"):
@@ -116,22 +124,26 @@ def normalize_chroma_images(chroma_response):
     return images
 
 
-def _save_pcm_as_wav(pcm_data: bytes, slide_id: int, audio_dir: str = "media/audio"):
-    Path(audio_dir).mkdir(parents=True, exist_ok=True)
-    output_path = os.path.join(audio_dir, f"slide_{slide_id}.wav")
-
+def _write_wav(pcm_data: bytes, output_path: str) -> None:
     with wave.open(output_path, "wb") as wf:
         wf.setnchannels(1)
         wf.setsampwidth(2)
         wf.setframerate(24000)
         wf.writeframes(pcm_data)
 
+
+def _save_pcm_as_wav(pcm_data: bytes, slide_id: int, audio_dir: str = "media/audio"):
+    Path(audio_dir).mkdir(parents=True, exist_ok=True)
+    output_path = os.path.join(audio_dir, f"slide_{slide_id}.wav")
+    _write_wav(pcm_data, output_path)
     return output_path
 
 
 def _generate_silent_wav(slide_id: int, duration_seconds: float = 6.0, audio_dir: str = "media/audio"):
     Path(audio_dir).mkdir(parents=True, exist_ok=True)
     output_path = os.path.join(audio_dir, f"slide_{slide_id}.wav")
+    from pydub import AudioSegment
+
     silence = AudioSegment.silent(duration=max(int(duration_seconds * 1000), 1000))
     silence.export(output_path, format="wav")
     return output_path
@@ -141,11 +153,11 @@ def _generate_silent_wav(slide_id: int, duration_seconds: float = 6.0, audio_dir
 # STEP 1 - Slide Plan
 # =====================================================
 
-def generate_slide_plan(chunks, images):
-    client = _get_client()
+@timed("slide_plan")
+async def generate_slide_plan(chunks, images):
     _ensure_dirs()
 
-    context_text = "\n".join([c["text"] for c in chunks[:20]])
+    context_text = "\n".join([c["text"] for c in chunks])
     image_info = "\n".join([f"Image ID: {img['id']}, Caption: {img.get('caption', '')}" for img in images])
 
     prompt = f"""
@@ -176,10 +188,11 @@ Return JSON list with:
 - image_ids
 """
 
-    response = client.models.generate_content(
+    response = await generate_content(
         model=MODEL_NAME,
         contents=prompt,
         config={"response_mime_type": "application/json"},
+        priority=PRIORITY_BACKGROUND,
     )
 
     clean_text = _clean_json_response(response.text)
@@ -190,40 +203,112 @@ Return JSON list with:
 # STEP 2 - Voice Generation
 # =====================================================
 
-def generate_voice(text: str, slide_id: int, audio_dir: str = "media/audio"):
-    client = _get_client()
-    retries = 3
+def _voice_text(slide: Dict[str, Any]) -> Optional[str]:
+    return slide.get("voiceover") or slide.get("explanation")
 
-    for attempt in range(retries):
-        try:
-            response = client.models.generate_content(
-                model="gemini-2.5-flash-preview-tts",
-                contents=text,
-                config=types.GenerateContentConfig(
-                    response_modalities=["AUDIO"],
-                    speech_config=types.SpeechConfig(
-                        voice_config=types.VoiceConfig(
-                            prebuilt_voice_config=types.PrebuiltVoiceConfig(voice_name="puck")
-                        )
-                    ),
-                ),
-            )
 
-            audio_bytes = response.candidates[0].content.parts[0].inline_data.data
-            return _save_pcm_as_wav(audio_bytes, slide_id, audio_dir=audio_dir)
-        except Exception as exc:
-            if attempt == retries - 1:
-                print(
-                    f"TTS failed for slide {slide_id} after {retries} attempts. "
-                    f"Falling back to silence. Error: {exc}"
+def tts_cache_path(text: str, cache_dir: str) -> str:
+    digest = hashlib.sha256(f"{TTS_MODEL_NAME}|{TTS_VOICE}|{text}".encode("utf-8")).hexdigest()[:32]
+    return os.path.join(cache_dir, f"{digest}.wav")
+
+
+def _store_cached_audio(pcm_data: bytes, cached_path: str) -> None:
+    Path(os.path.dirname(cached_path)).mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{cached_path}.{uuid.uuid4().hex[:8]}.tmp"
+    _write_wav(pcm_data, tmp_path)
+    os.replace(tmp_path, cached_path)
+
+
+def _copy_cached_audio(cached_path: str, slide_id: int, audio_dir: str) -> Optional[str]:
+    # None on a cache miss; checking here keeps the stat off the event loop.
+    if not os.path.exists(cached_path):
+        return None
+    Path(audio_dir).mkdir(parents=True, exist_ok=True)
+    output_path = os.path.join(audio_dir, f"slide_{slide_id}.wav")
+    shutil.copyfile(cached_path, output_path)
+    return output_path
+
+
+def _uncached_texts(texts: List[str], cache_dir: str) -> List[str]:
+    return [text for text in texts if not os.path.exists(tts_cache_path(text, cache_dir))]
+
+
+async def _synthesize_speech(text: str) -> bytes:
+    # Retries with backoff on 429/5xx happen in the LLM gateway; TTS runs as
+    # background work so a burst of videos queues behind interactive chat.
+    from google.genai import types
+
+    response = await generate_content(
+        model=TTS_MODEL_NAME,
+        contents=text,
+        config=types.GenerateContentConfig(
+            response_modalities=["AUDIO"],
+            speech_config=types.SpeechConfig(
+                voice_config=types.VoiceConfig(
+                    prebuilt_voice_config=types.PrebuiltVoiceConfig(voice_name=TTS_VOICE)
                 )
-                return _generate_silent_wav(slide_id, duration_seconds=6.0, audio_dir=audio_dir)
-            wait_seconds = 2**attempt
-            print(f"TTS attempt {attempt + 1}/{retries} failed for slide {slide_id}. Retrying in {wait_seconds}s...")
-            time.sleep(wait_seconds)
+            ),
+        ),
+        priority=PRIORITY_BACKGROUND,
+    )
+    return response.candidates[0].content.parts[0].inline_data.data
+
+
+@timed("tts")
+async def generate_voice(text: str, slide_id: int, audio_dir: str = "media/audio", cache_dir: Optional[str] = None):
+    # With a cache_dir, audio is content-addressed by model, voice and text so a
+    # re-run (or the post-ingest precompute) never synthesizes the same line twice.
+    cached_path = tts_cache_path(text, cache_dir) if cache_dir else None
+    if cached_path:
+        audio_path = await run_io(_copy_cached_audio, cached_path, slide_id, audio_dir)
+        if audio_path:
+            record_lookup("tts", "hit")
+            return audio_path
+        record_lookup("tts", "miss")
+
+    try:
+        audio_bytes = await _synthesize_speech(text)
+    except Exception as exc:
+        print(f"TTS failed for slide {slide_id}. Falling back to silence. Error: {exc}")
+        return await run_io(_generate_silent_wav, slide_id, 6.0, audio_dir)
+
+    if cached_path:
+        await run_io(_store_cached_audio, audio_bytes, cached_path)
+    return await run_io(_save_pcm_as_wav, audio_bytes, slide_id, audio_dir)
+
+
+async def cache_voiceovers(slides: List[Dict[str, Any]], cache_dir: str) -> Dict[str, int]:
+    # Synthesizes every slide voiceover missing from cache_dir, for precompute.
+    texts = list(dict.fromkeys(text for text in (_voice_text(slide) for slide in slides) if text))
+    missing = await run_io(_uncached_texts, texts, cache_dir)
+    semaphore = asyncio.Semaphore(_safe_int_env("VIDEO_TTS_MAX_CONCURRENCY", 5))
+
+    async def synthesize(text: str) -> bool:
+        async with semaphore:
+            try:
+                audio_bytes = await _synthesize_speech(text)
+            except Exception as exc:
+                print(f"TTS precompute failed: {exc}")
+                return False
+        await run_io(_store_cached_audio, audio_bytes, tts_cache_path(text, cache_dir))
+        return True
+
+    results = await asyncio.gather(*(synthesize(text) for text in missing))
+    generated = sum(1 for ok in results if ok)
+    return {"cached": len(texts) - len(missing), "generated": generated, "failed": len(missing) - generated}
+
+
+def delete_video_runs(document_id: str) -> int:
+    pattern = os.path.join("media", "runs", f"*_{glob.escape(_sanitize_name(document_id))}_????????")
+    runs = glob.glob(pattern)
+    for run_dir in runs:
+        shutil.rmtree(run_dir, ignore_errors=True)
+    return len(runs)
 
 
 def get_audio_duration(audio_path: str) -> float:
+    from pydub import AudioSegment
+
     audio = AudioSegment.from_file(audio_path)
     return len(audio) / 1000
 
@@ -253,6 +338,7 @@ def resolve_image_path(slide, all_images):
 # STEP 4 - HTML Slide Renderer
 # =====================================================
 
+@timed("slide_html")
 def render_slide_html(slide, duration, slide_id, all_images, html_dir: str = "media/html"):
     _ensure_dirs()
     Path(html_dir).mkdir(parents=True, exist_ok=True)
@@ -419,7 +505,8 @@ li {{
 # STEP 5 - HTML -> VIDEO (Playwright)
 # =====================================================
 
-async def _record_html_video(browser: Browser, html_path: str, video_dir: str, duration: float) -> str:
+@timed("video_render")
+async def _record_html_video(browser: "Browser", html_path: str, video_dir: str, duration: float) -> str:
     context = await browser.new_context(
         viewport={"width": 1280, "height": 720},
         record_video_dir=video_dir,
@@ -441,7 +528,7 @@ async def html_to_video(
     slide_id: int,
     duration: float,
     video_dir: str = "media/video",
-    browser: Optional[Browser] = None,
+    browser: Optional["Browser"] = None,
 ):
     _ensure_dirs()
     Path(video_dir).mkdir(parents=True, exist_ok=True)
@@ -449,6 +536,8 @@ async def html_to_video(
     if browser is not None:
         return await _record_html_video(browser, html_path, video_dir, duration)
 
+    from playwright.async_api import async_playwright
+
     async with async_playwright() as p:
         tmp_browser = await p.chromium.launch()
         try:
@@ -461,6 +550,7 @@ async def html_to_video(
 # STEP 6 - Image + Audio -> Video
 # =====================================================
 
+@timed("video_mux")
 def image_audio_to_video(webm_path, audio_path, duration, slide_id, video_dir: str = "media/video"):
     Path(video_dir).mkdir(parents=True, exist_ok=True)
     output = os.path.join(video_dir, f"slide_{slide_id}.mp4")
@@ -502,6 +592,7 @@ def image_audio_to_video(webm_path, audio_path, duration, slide_id, video_dir: s
 # STEP 7 - Stitch Videos
 # =====================================================
 
+@timed("video_stitch")
 def stitch_videos(video_paths, output_dir: str = "media/video", final_name: str = "final.mp4"):
     _ensure_dirs()
     Path(output_dir).mkdir(parents=True, exist_ok=True)
@@ -540,16 +631,18 @@ async def _prepare_slide_assets(
     audio_dir: str,
     html_dir: str,
     tts_semaphore: asyncio.Semaphore,
+    tts_cache_dir: Optional[str] = None,
 ) -> Dict[str, Any]:
-    voice_text = slide.get("voiceover") or slide.get("explanation")
+    voice_text = _voice_text(slide)
     if not voice_text:
         return {"slide": slide_id, "ok": False, "stage": "prepare", "error": "Missing voice text"}
 
     try:
         async with tts_semaphore:
-            audio_path = await asyncio.to_thread(generate_voice, voice_text, slide_id, audio_dir)
-        duration = await asyncio.to_thread(get_audio_duration, audio_path)
-        html_path = await asyncio.to_thread(render_slide_html, slide, duration, slide_id, all_images, html_dir)
+            audio_path = await generate_voice(voice_text, slide_id, audio_dir, cache_dir=tts_cache_dir)
+        # pydub decodes through an ffmpeg child process.
+        duration = await run_subprocess(get_audio_duration, audio_path)
+        html_path = await run_io(render_slide_html, slide, duration, slide_id, all_images, html_dir)
         return {
             "slide": slide_id,
             "ok": True,
@@ -563,7 +656,7 @@ async def _prepare_slide_assets(
 
 async def _render_and_mux_slide(
     prepared: Dict[str, Any],
-    browser: Browser,
+    browser: "Browser",
     render_semaphore: asyncio.Semaphore,
     mux_semaphore: asyncio.Semaphore,
     video_dir: str,
@@ -580,7 +673,7 @@ async def _render_and_mux_slide(
             )
 
         async with mux_semaphore:
-            mp4_path = await asyncio.to_thread(
+            mp4_path = await run_subprocess(
                 image_audio_to_video,
                 webm_path,
                 prepared["audio_path"],
@@ -594,7 +687,12 @@ async def _render_and_mux_slide(
         return {"slide": slide_id, "ok": False, "stage": "render_or_mux", "error": str(exc)}
 
 
-async def generate_video_parallel(slides: List[Dict[str, Any]], image_chunks: List[Dict[str, Any]], document_id: str):
+async def generate_video_parallel(
+    slides: List[Dict[str, Any]],
+    image_chunks: List[Dict[str, Any]],
+    document_id: str,
+    tts_cache_dir: Optional[str] = None,
+):
     if not slides:
         return {"error": "Slide generation failed", "slides_requested": 0, "slides_generated": 0, "slide_errors": []}
 
@@ -613,7 +711,7 @@ async def generate_video_parallel(slides: List[Dict[str, Any]], image_chunks: Li
     mux_semaphore = asyncio.Semaphore(mux_max)
 
     prepare_tasks = [
-        _prepare_slide_assets(i, slide, image_chunks, audio_dir, html_dir, tts_semaphore)
+        _prepare_slide_assets(i, slide, image_chunks, audio_dir, html_dir, tts_semaphore, tts_cache_dir)
         for i, slide in enumerate(slides)
     ]
     prepared_results = await asyncio.gather(*prepare_tasks)
@@ -635,6 +733,8 @@ async def generate_video_parallel(slides: List[Dict[str, Any]], image_chunks: Li
             "run_id": run_id,
         }
 
+    from playwright.async_api import async_playwright
+
     async with async_playwright() as p:
         browser = await p.chromium.launch()
         try:
@@ -664,7 +764,7 @@ async def generate_video_parallel(slides: List[Dict[str, Any]], image_chunks: Li
 
     videos_ok.sort(key=lambda item: item["slide"])
     ordered_paths = [item["video_path"] for item in videos_ok]
-    final_video = await asyncio.to_thread(stitch_videos, ordered_paths, video_dir, "final.mp4")
+    final_video = await run_subprocess(stitch_videos, ordered_paths, video_dir, "final.mp4")
 
     return {
         "message": "Video generated successfully",
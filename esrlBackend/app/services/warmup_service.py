@@ -0,0 +1,85 @@
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+from app.services.embedding_service import get_chroma_collection, get_embedder, is_chroma_loaded, is_embedder_loaded
+from app.services.env_utils import env_list
+from app.services.image_service import is_caption_model_loaded, warm_caption_model
+from app.services.llm_gateway import get_client, is_client_ready
+
+
+def _warm_video_stack() -> None:
+    import playwright.async_api  # noqa: F401
+    import pydub  # noqa: F401
+
+
+def _video_stack_loaded() -> bool:
+    return "playwright.async_api" in sys.modules and "pydub" in sys.modules
+
+
+# name -> (load, is_loaded)
+WARMERS: Dict[str, Tuple[Callable[[], object], Callable[[], bool]]] = {
+    "embedder": (get_embedder, is_embedder_loaded),
+    "chroma": (get_chroma_collection, is_chroma_loaded),
+    "caption": (warm_caption_model, is_caption_model_loaded),
+    "llm_client": (get_client, is_client_ready),
+    "video": (_warm_video_stack, _video_stack_loaded),
+}
+
+# Chat and upload both need the embedder and Chroma, so those are warmed by
+# default. Set WARMUP_MODELS="" to start fully lazy.
+WARMUP_MODELS = [name for name in env_list("WARMUP_MODELS", "embedder,chroma") if name in WARMERS]
+
+_status: Dict[str, Dict] = {}
+_status_lock = threading.Lock()
+_thread = None
+_ready_latched = False
+
+
+def _set_status(name: str, **fields) -> None:
+    with _status_lock:
+        _status.setdefault(name, {}).update(fields)
+
+
+def _run_warmup(names: List[str]) -> None:
+    for name in names:
+        load, _ = WARMERS[name]
+        _set_status(name, state="loading")
+        started = time.perf_counter()
+        try:
+            load()
+        except Exception as exc:
+            _set_status(name, state="failed", error=str(exc), seconds=round(time.perf_counter() - started, 3))
+            print(f"Warmup of {name} failed: {exc}")
+            continue
+        _set_status(name, state="ready", seconds=round(time.perf_counter() - started, 3))
+
+
+def start_warmup() -> None:
+    # Runs in a daemon thread so the server accepts requests (and /ready can
+    # report progress) while models load.
+    global _thread
+    if _thread is not None or not WARMUP_MODELS:
+        return
+    for name in WARMUP_MODELS:
+        _set_status(name, state="pending")
+    _thread = threading.Thread(target=_run_warmup, args=(list(WARMUP_MODELS),), name="model-warmup", daemon=True)
+    _thread.start()
+
+
+def get_readiness() -> Dict:
+    global _ready_latched
+    with _status_lock:
+        status = {name: dict(fields) for name, fields in _status.items()}
+    models = {}
+    for name, (_, is_loaded) in WARMERS.items():
+        entry = status.get(name, {"state": "lazy"})
+        entry["hot"] = bool(is_loaded())
+        entry["warmup"] = name in WARMUP_MODELS
+        models[name] = entry
+    # Latched: the registry unloads idle or over-budget models and reloads them
+    # on demand, so a later eviction must not take the worker out of rotation.
+    if not _ready_latched:
+        _ready_latched = all(models[name]["hot"] for name in WARMUP_MODELS)
+    return {"ready": _ready_latched, "models": models}
@@ -0,0 +1,414 @@
+"""Offline stand-in for the Gemini REST API.
+
+Serves ``models/{model}:generateContent`` and ``:streamGenerateContent`` with
+schema-valid responses for every prompt the backend and game-engine send
+(slide plans, notes JSON, summaries, RAG answers, game design/levels/code and
+PCM audio for TTS). Point both services at it with ``GEMINI_BASE_URL``:
+
+    python -m benchmarks.gemini_stub_server --port 8765
+    GEMINI_BASE_URL=http://127.0.0.1:8765 GEMINI_API_KEY=stub uvicorn main:app
+    GEMINI_BASE_URL=http://127.0.0.1:8765 GOOGLE_API_KEY=stub uvicorn app:app
+
+Responses are a pure function of the prompt. Latency and injected errors are
+drawn from an RNG seeded by (STUB_SEED, prompt, occurrence), so a given
+workload replays identically regardless of request interleaving.
+
+Environment:
+    STUB_LATENCY_MEDIAN_MS       median text latency (default 400)
+    STUB_LATENCY_SIGMA           log-normal sigma (default 0.5, 0 = fixed)
+    STUB_TTS_LATENCY_MEDIAN_MS   median TTS latency (default 1200)
+    STUB_STREAM_CHUNK_MS         delay between streamed chunks (default 40)
+    STUB_ERROR_RATE              fraction of requests that fail (default 0)
+    STUB_ERROR_CODES             codes to pick from on failure (default 429,503)
+    STUB_SEED                    RNG seed (default 0)
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LATENCY_MEDIAN_MS = float(os.getenv("STUB_LATENCY_MEDIAN_MS", "400"))
+LATENCY_SIGMA = float(os.getenv("STUB_LATENCY_SIGMA", "0.5"))
+TTS_LATENCY_MEDIAN_MS = float(os.getenv("STUB_TTS_LATENCY_MEDIAN_MS", "1200"))
+STREAM_CHUNK_MS = float(os.getenv("STUB_STREAM_CHUNK_MS", "40"))
+ERROR_RATE = float(os.getenv("STUB_ERROR_RATE", "0"))
+ERROR_CODES = [int(code) for code in os.getenv("STUB_ERROR_CODES", "429,503").split(",") if code.strip()]
+SEED = os.getenv("STUB_SEED", "0")
+
+PCM_SAMPLE_RATE = 24000
+WORDS_PER_SECOND = 2.5
+ERROR_STATUS = {429: "RESOURCE_EXHAUSTED", 500: "INTERNAL", 503: "UNAVAILABLE", 504: "DEADLINE_EXCEEDED"}
+STOPWORDS = {
+    "the", "and", "for", "that", "with", "this", "from", "are", "was", "were", "has", "have",
+    "which", "into", "their", "they", "them", "than", "then", "its", "can", "not", "but",
+    "you", "your", "our", "text", "each", "using", "only", "use", "also", "when", "what"
+}
+
+app = FastAPI(title="Gemini stand-in")
+
+_occurrences: Counter = Counter()
+_occurrences_lock = threading.Lock()
+_stats: Counter = Counter()
+
+
+# =====================================================
+# Request parsing
+# =====================================================
+
+def _collect_text(node: Any) -> List[str]:
+    if isinstance(node, str):
+        return [node]
+    if isinstance(node, list):
+        return [text for item in node for text in _collect_text(item)]
+    if isinstance(node, dict):
+        if "text" in node and isinstance(node["text"], str):
+            return [node["text"]]
+        return [text for key in ("parts", "contents") if key in node for text in _collect_text(node[key])]
+    return []
+
+
+def _parse_request(body: Dict[str, Any]) -> Tuple[str, str, Dict[str, Any]]:
+    prompt = "\n".join(_collect_text(body.get("contents")))
+    system = "\n".join(_collect_text(body.get("systemInstruction") or body.get("system_instruction")))
+    config = body.get("generationConfig") or body.get("generation_config") or {}
+    return prompt, system, config
+
+
+def _rng_for(model: str, prompt: str, system: str) -> random.Random:
+    digest = hashlib.sha256(f"{model}\0{system}\0{prompt}".encode("utf-8")).hexdigest()
+    with _occurrences_lock:
+        occurrence = _occurrences[digest]
+        _occurrences[digest] += 1
+    return random.Random(f"{SEED}:{digest}:{occurrence}")
+
+
+def _keywords(text: str, limit: int = 8) -> List[str]:
+    words = [w for w in re.findall(r"[A-Za-z][A-Za-z\-]{3,}", text.lower()) if w not in STOPWORDS]
+    ranked = [word for word, _ in Counter(words).most_common(limit)]
+    return ranked or ["topic"]
+
+
+def _sentences(text: str, limit: int) -> List[str]:
+    parts = [p.strip() for p in re.split(r"(?<=[.!?])\s+", text) if len(p.strip()) > 30]
+    return parts[:limit]
+
+
+def _section(prompt: str, marker: str, end_markers: Tuple[str, ...] = ()) -> str:
+    index = prompt.find(marker)
+    if index < 0:
+        return prompt
+    body = prompt[index + len(marker):]
+    for end in end_markers:
+        cut = body.find(end)
+        if cut >= 0:
+            body = body[:cut]
+    return body.strip()
+
+
+# =====================================================
+# Canned responses
+# =====================================================
+
+def _slide_plan(prompt: str) -> str:
+    text = _section(prompt, "TEXT:", ("IMAGES:",))
+    image_ids = re.findall(r"Image ID: ([^,\s]+)", prompt)
+    keywords = _keywords(text, 21)
+    sentences = _sentences(text, 14) or [f"This section introduces {keywords[0]}."]
+    slides = []
+    for index in range(min(7, max(3, len(keywords) // 3))):
+        terms = keywords[index * 3:index * 3 + 3] or keywords[:3]
+        explanation = " ".join(sentences[index % len(sentences):index % len(sentences) + 2])
+        words = explanation.split()
+        while len(words) < 60:
+            words += f"Here we look at how {' and '.join(terms)} connect to the rest of the material.".split()
+        slides.append({
+            "title": " ".join(term.title() for term in terms),
+            "bullet_points": [f"Key idea: {term}" for term in terms] + ["Why it matters"],
+            "explanation": " ".join(words[:75]),
+            "image_ids": [image_ids[index]] if index < len(image_ids) else []
+        })
+    return json.dumps(slides)
+
+
+def _quick_notes(prompt: str) -> str:
+    text = _section(prompt, "Text:")
+    keywords = _keywords(text, 10)
+    sentences = _sentences(text, 10) or [f"{keywords[0].title()} is a central idea in this text."]
+    flashcards = [
+        {"question": f"What is {keywords[i % len(keywords)]}?", "answer": sentences[i % len(sentences)]}
+        for i in range(5)
+    ]
+    mcqs = [
+        {
+            "question": f"Which term is most closely related to {keywords[i % len(keywords)]}?",
+            "options": [keywords[(i + j) % len(keywords)] for j in range(4)],
+            "answer": "A"
+        }
+        for i in range(5)
+    ]
+    return json.dumps({
+        "flashcards": flashcards,
+        "cheat_sheet": "\n".join(f"- **{word}**: {sentences[i % len(sentences)]}" for i, word in enumerate(keywords[:6])),
+        "mcqs": mcqs,
+        "interview_questions": [f"Explain {word} in your own words." for word in keywords[:5]]
+    })
+
+
+def _level_summary(prompt: str) -> str:
+    text = _section(prompt, "Text:")
+    keywords = _keywords(text, 5)
+    sentences = _sentences(text, 3) or [f"The text is about {keywords[0]}."]
+    return (
+        f"**TL;DR:** {sentences[0]}\n\n"
+        "**Concept summary:**\n"
+        + "\n".join(f"- {word.title()}" for word in keywords)
+        + f"\n\n**Beginner-friendly:** {' '.join(sentences)}"
+    )
+
+
+def _short_summary(prompt: str) -> str:
+    sentences = _sentences(prompt, 3)
+    if sentences:
+        return " ".join(sentences[:3])
+    return f"This part covers {', '.join(_keywords(prompt, 3))}."
+
+
+def _rag_answer(prompt: str) -> str:
+    question = _section(prompt, "Question:")
+    context = _section(prompt, "Context:", ("\n\nQuestion:",))
+    sources = sorted(set(re.findall(r"^\[(\d+)\]", context, flags=re.M)))[:3] or ["1"]
+    sentences = _sentences(context, 4) or ["Not found in the provided notes."]
+    citations = "".join(f"[{s}]" for s in sources)
+    return (
+        f"# {question[:80] or 'Answer'}\n\n"
+        f"{sentences[0]} {citations}\n\n"
+        "## Key Points\n"
+        + "\n".join(f"- {sentence}" for sentence in sentences[1:] or sentences)
+        + f"\n\n## Sources\n{citations}"
+    )
+
+
+def _game_design(prompt: str) -> str:
+    keywords = _keywords(prompt, 6)
+    return (
+        f"1. **Game Title**: {keywords[0].title()} Quest\n"
+        f"2. **Story/Theme**: Explore a world built around {', '.join(keywords[:3])}.\n"
+        f"3. **Learning Objectives**: {', '.join(keywords)}\n"
+        "4. **Player Role**: A student explorer\n"
+        "5. **Core Gameplay Loop**: Move, collect correct concept orbs, avoid wrong ones\n"
+        "6. **Core Mechanic**: Sorting by moving left/right\n"
+        "7. **Win/Lose Conditions**: Collect 10 correct orbs to win; 3 mistakes lose\n"
+        "8. **How Learning is Embedded**: Each orb shows a term that must match the prompt\n"
+        "9. **Implementation Notes**: Simple rectangles and circles, keyboard input only"
+    )
+
+
+def _level_design(prompt: str) -> str:
+    keywords = _keywords(prompt, 6)
+    return "\n\n".join(
+        f"## Level {level}\n- Concepts: {', '.join(keywords[level - 1:level + 1])}\n"
+        f"- Challenge: sorting, {level * 5} orbs\n- Win: collect {level * 3} correct\n"
+        f"- Lose: 3 mistakes\n- Difficulty: {['easy', 'medium', 'hard'][level - 1]}"
+        for level in (1, 2, 3)
+    )
+
+
+def _game_code(prompt: str) -> str:
+    title = (_keywords(prompt, 1)[0]).title()
+    return f'''import pygame
+import sys
+
+pygame.init()
+screen = pygame.display.set_mode((800, 600))
+pygame.display.set_caption("{title} Quest")
+clock = pygame.time.Clock()
+font = pygame.font.SysFont(None, 36)
+player = pygame.Rect(380, 540, 40, 20)
+showing_instructions = True
+
+while True:
+    for event in pygame.event.get():
+        if event.type == pygame.QUIT:
+            pygame.quit()
+            sys.exit()
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
+            showing_instructions = False
+
+    keys = pygame.key.get_pressed()
+    if keys[pygame.K_LEFT] or keys[pygame.K_a]:
+        player.x = max(0, player.x - 6)
+    if keys[pygame.K_RIGHT] or keys[pygame.K_d]:
+        player.x = min(760, player.x + 6)
+
+    screen.fill((20, 20, 30))
+    if showing_instructions:
+        screen.blit(font.render("Arrow keys to move, SPACE to start", True, (255, 255, 255)), (180, 280))
+    else:
+        pygame.draw.rect(screen, (255, 0, 85), player)
+    pygame.display.flip()
+    clock.tick(60)
+'''
+
+
+def _pcm_audio(prompt: str) -> bytes:
+    seconds = max(1.0, len(prompt.split()) / WORDS_PER_SECOND)
+    samples = int(seconds * PCM_SAMPLE_RATE)
+    # Quiet 220 Hz tone so the audio is audibly non-empty but cheap to generate.
+    frame = bytearray()
+    period = PCM_SAMPLE_RATE // 220
+    cycle = [int(800 * math.sin(2 * math.pi * i / period)) for i in range(period)]
+    for i in range(samples):
+        frame += cycle[i % period].to_bytes(2, "little", signed=True)
+    return bytes(frame)
+
+
+def _respond_text(prompt: str, system: str) -> str:
+    if "Create professional educational slides" in prompt:
+        return _slide_plan(prompt)
+    if "Return ONLY valid JSON" in prompt and "flashcards" in prompt:
+        return _quick_notes(prompt)
+    if "Summarize the text at three levels" in prompt:
+        return _level_summary(prompt)
+    if "Answer the question using only the context" in prompt:
+        return _rag_answer(prompt)
+    if "Pygame code Generator" in system:
+        return _game_code(prompt)
+    if "level progression" in system:
+        return _level_design(prompt)
+    if "educational game designer" in system:
+        return _game_design(prompt)
+    if prompt.lower().startswith("summarize") or "summar" in prompt[:200].lower():
+        return _short_summary(prompt)
+    return f"Stub response about {', '.join(_keywords(prompt, 3))}."
+
+
+# =====================================================
+# HTTP layer
+# =====================================================
+
+def _is_audio(model: str, config: Dict[str, Any]) -> bool:
+    modalities = config.get("responseModalities") or config.get("response_modalities") or []
+    return "tts" in model or "AUDIO" in [str(m).upper() for m in modalities]
+
+
+def _latency_seconds(rng: random.Random, audio: bool) -> float:
+    median = TTS_LATENCY_MEDIAN_MS if audio else LATENCY_MEDIAN_MS
+    if LATENCY_SIGMA <= 0:
+        return median / 1000.0
+    return rng.lognormvariate(math.log(max(median, 1.0)), LATENCY_SIGMA) / 1000.0
+
+
+def _usage(prompt: str, output_chars: int) -> Dict[str, int]:
+    prompt_tokens = max(1, len(prompt) // 4)
+    output_tokens = max(1, output_chars // 4)
+    return {
+        "promptTokenCount": prompt_tokens,
+        "candidatesTokenCount": output_tokens,
+        "totalTokenCount": prompt_tokens + output_tokens
+    }
+
+
+def _candidate(parts: List[Dict[str, Any]], finished: bool = True) -> Dict[str, Any]:
+    candidate = {"content": {"role": "model", "parts": parts}, "index": 0}
+    if finished:
+        candidate["finishReason"] = "STOP"
+    return candidate
+
+
+def _error_response(rng: random.Random) -> Optional[JSONResponse]:
+    if ERROR_RATE <= 0 or rng.random() >= ERROR_RATE:
+        return None
+    code = rng.choice(ERROR_CODES or [503])
+    _stats[f"errors_{code}"] += 1
+    return JSONResponse(
+        {"error": {"code": code, "message": "Injected by Gemini stand-in", "status": ERROR_STATUS.get(code, "UNKNOWN")}},
+        status_code=code
+    )
+
+
+def _split_for_stream(text: str, pieces: int = 12) -> List[str]:
+    size = max(1, math.ceil(len(text) / pieces))
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+async def _handle(model: str, request: Request, stream: bool):
+    body = await request.json()
+    prompt, system, config = _parse_request(body)
+    rng = _rng_for(model, prompt, system)
+    audio = _is_audio(model, config)
+    _stats["requests"] += 1
+
+    await asyncio.sleep(_latency_seconds(rng, audio))
+    error = _error_response(rng)
+    if error is not None:
+        return error
+
+    if audio:
+        pcm = _pcm_audio(prompt)
+        parts = [{"inlineData": {"mimeType": f"audio/L16;codec=pcm;rate={PCM_SAMPLE_RATE}",
+                                 "data": base64.b64encode(pcm).decode("ascii")}}]
+        payload = {"candidates": [_candidate(parts)], "usageMetadata": _usage(prompt, len(pcm) // 50), "modelVersion": model}
+        if stream:
+            return StreamingResponse(iter([f"data: {json.dumps(payload)}\r\n\r\n"]), media_type="text/event-stream")
+        return JSONResponse(payload)
+
+    text = _respond_text(prompt, system)
+    if not stream:
+        return JSONResponse({
+            "candidates": [_candidate([{"text": text}])],
+            "usageMetadata": _usage(prompt, len(text)),
+            "modelVersion": model
+        })
+
+    async def events():
+        pieces = _split_for_stream(text)
+        for index, piece in enumerate(pieces):
+            last = index == len(pieces) - 1
+            chunk = {"candidates": [_candidate([{"text": piece}], finished=last)], "modelVersion": model}
+            if last:
+                chunk["usageMetadata"] = _usage(prompt, len(text))
+            yield f"data: {json.dumps(chunk)}\r\n\r\n"
+            if not last:
+                await asyncio.sleep(STREAM_CHUNK_MS / 1000.0)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.post("/{api_version}/models/{model_action:path}")
+async def models_endpoint(api_version: str, model_action: str, request: Request):
+    model, _, action = model_action.partition(":")
+    if action == "generateContent":
+        return await _handle(model, request, stream=False)
+    if action == "streamGenerateContent":
+        return await _handle(model, request, stream=True)
+    return JSONResponse(
+        {"error": {"code": 404, "message": f"Unsupported action: {action}", "status": "NOT_FOUND"}},
+        status_code=404
+    )
+
+
+@app.get("/stub/stats")
+async def stub_stats():
+    return dict(_stats)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Offline Gemini/TTS stand-in server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
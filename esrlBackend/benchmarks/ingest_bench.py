@@ -0,0 +1,328 @@
+"""Per-stage micro-benchmark of the ``/upload_pdf`` ingestion pipeline.
+
+Every stage runs in isolation over a corpus of generated PDFs (see
+``synthetic_pdfs.py``) at several sizes. By default each (document, stage)
+pair runs in a fresh subprocess. Its inputs are prepared untimed, then the
+stage is timed. That way peak RSS is attributable to the stage and model
+loads from one stage do not leak into the next.
+
+Stages: text_extraction, is_scanned, ocr, clean_structure, classify_discourse,
+chunk_sections, embedding, chroma_upsert, image_extraction, blip_caption,
+tesseract_image_ocr.
+
+    python -m benchmarks.ingest_bench --sizes 5,20,80 --output bench_results/ingest.json
+    python -m benchmarks.ingest_bench --stages embedding,chroma_upsert --sizes 40
+    python -m benchmarks.ingest_bench --compare bench_results/a.json bench_results/b.json
+
+Model stages honour ``EMBEDDING_BACKEND=hash`` and ``CAPTION_BACKEND=stub``,
+which gives an offline run. Model load time is reported separately from
+steady-state throughput.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.synthetic_pdfs import SHAPES, generate_corpus
+
+STAGES = [
+    "text_extraction",
+    "is_scanned",
+    "ocr",
+    "clean_structure",
+    "classify_discourse",
+    "chunk_sections",
+    "embedding",
+    "chroma_upsert",
+    "image_extraction",
+    "blip_caption",
+    "tesseract_image_ocr",
+]
+
+
+def _rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+# =====================================================
+# Stage setup: returns (warmup, run) closures and an item count
+# =====================================================
+
+def _pages(pdf_path: str):
+    import fitz
+
+    return list(fitz.open(pdf_path))
+
+
+def _extracted(pdf_path: str) -> Tuple[str, List[str]]:
+    from app.services.pdf_extraction_service import extract_text_from_pdf
+
+    return extract_text_from_pdf(pdf_path)
+
+
+def _sections(pdf_path: str) -> List[Dict]:
+    from app.services.discourse_service import classify_discourse
+    from app.services.text_processing_service import structure_pages
+
+    _, pages_text = _extracted(pdf_path)
+    return classify_discourse(structure_pages(pages_text))
+
+
+def _chunks(pdf_path: str) -> List[Dict]:
+    from app.services.chunk_service import chunk_sections
+
+    return chunk_sections(_sections(pdf_path), "bench_doc")
+
+
+def _images(pdf_path: str) -> List[Dict]:
+    from app.services.pdf_extraction_service import extract_images_from_pdf
+
+    return extract_images_from_pdf(pdf_path, "bench_doc")
+
+
+def _setup_stage(stage: str, pdf_path: str) -> Tuple[Optional[Callable], Callable, int]:
+    if stage == "text_extraction":
+        pages = _pages(pdf_path)
+        return None, lambda: [page.get_text() for page in pages], len(pages)
+
+    if stage == "is_scanned":
+        from app.services.pdf_extraction_service import is_scanned
+
+        pages = _pages(pdf_path)
+        return None, lambda: [is_scanned(page) for page in pages], len(pages)
+
+    if stage == "ocr":
+        from app.services.pdf_extraction_service import is_scanned, ocr_page
+
+        pages = [page for page in _pages(pdf_path) if is_scanned(page)]
+        return None, lambda: [ocr_page(page) for page in pages], len(pages)
+
+    if stage == "clean_structure":
+        from app.services.text_processing_service import clean_text, structure_pages
+
+        full_text, pages_text = _extracted(pdf_path)
+        return None, lambda: (clean_text(full_text), structure_pages(pages_text)), len(pages_text)
+
+    if stage == "classify_discourse":
+        from app.services.discourse_service import classify_discourse
+        from app.services.text_processing_service import structure_pages
+
+        _, pages_text = _extracted(pdf_path)
+        sections = structure_pages(pages_text)
+        return None, lambda: classify_discourse([dict(s) for s in sections]), len(sections)
+
+    if stage == "chunk_sections":
+        from app.services.chunk_service import chunk_sections
+
+        sections = _sections(pdf_path)
+        return None, lambda: chunk_sections(sections, "bench_doc"), len(sections)
+
+    if stage == "embedding":
+        from app.services.embedding_service import embed_texts, get_embedder
+
+        texts = [chunk["text"] for chunk in _chunks(pdf_path)]
+        return get_embedder, lambda: embed_texts(texts), len(texts)
+
+    if stage == "chroma_upsert":
+        from app.services.embedding_service import embed_texts, get_chroma_collection
+
+        chunks = _chunks(pdf_path)
+        embeddings = embed_texts([chunk["text"] for chunk in chunks]) if chunks else []
+
+        def run():
+            get_chroma_collection().upsert(
+                ids=[chunk["id"] for chunk in chunks],
+                documents=[chunk["text"] for chunk in chunks],
+                embeddings=embeddings,
+                metadatas=[{"document_id": "bench_doc", "page": chunk.get("page"), "type": "text"} for chunk in chunks]
+            )
+
+        return get_chroma_collection, run if chunks else (lambda: None), len(chunks)
+
+    if stage == "image_extraction":
+        from app.services.pdf_extraction_service import extract_images_from_pdf
+
+        page_count = len(_pages(pdf_path))
+        return None, lambda: extract_images_from_pdf(pdf_path, "bench_doc"), page_count
+
+    if stage == "blip_caption":
+        from app.services.image_service import CAPTION_BACKEND, _get_model, generate_caption
+
+        images = _images(pdf_path)
+        warmup = None if CAPTION_BACKEND == "stub" or not images else _get_model
+        return warmup, lambda: [generate_caption(image["path"]) for image in images], len(images)
+
+    if stage == "tesseract_image_ocr":
+        from app.services.image_service import extract_text
+
+        images = _images(pdf_path)
+        return None, lambda: [extract_text(image["path"]) for image in images], len(images)
+
+    raise ValueError(f"Unknown stage {stage!r}")
+
+
+def run_stage(stage: str, pdf_path: str, repeat: int, workdir: str) -> Dict[str, Any]:
+    # Service modules create storage/ relative to the cwd at import time.
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    result: Dict[str, Any] = {"stage": stage}
+    try:
+        warmup, run, items = _setup_stage(stage, pdf_path)
+        rss_before = _rss_mb()
+
+        load_seconds = 0.0
+        if warmup is not None:
+            started = time.perf_counter()
+            warmup()
+            load_seconds = time.perf_counter() - started
+
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+
+        seconds = statistics.median(timings)
+        result.update({
+            "items": items,
+            "seconds": round(seconds, 6),
+            "items_per_second": round(items / seconds, 3) if seconds > 0 and items else 0.0,
+            "model_load_seconds": round(load_seconds, 4),
+            "peak_rss_mb": round(_rss_mb(), 1),
+            "rss_growth_mb": round(_rss_mb() - rss_before, 1),
+            "runs": [round(t, 6) for t in timings]
+        })
+    except Exception as exc:
+        result["error"] = f"{type(exc).__name__}: {exc}"
+    return result
+
+
+def _run_stage_in_child(queue, stage: str, pdf_path: str, repeat: int, workdir: str) -> None:
+    queue.put(run_stage(stage, pdf_path, repeat, workdir))
+
+
+def run_isolated(stage: str, pdf_path: str, repeat: int, workdir: str, timeout: float) -> Dict[str, Any]:
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_run_stage_in_child, args=(queue, stage, pdf_path, repeat, workdir))
+    process.start()
+    try:
+        return queue.get(timeout=timeout)
+    except Exception:
+        return {"stage": stage, "error": f"no result within {timeout}s"}
+    finally:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.kill()
+
+
+# =====================================================
+# Reporting
+# =====================================================
+
+def print_results(results: List[Dict[str, Any]]) -> None:
+    print(f"{'document':24s} {'stage':20s} {'items':>6s} {'seconds':>9s} {'items/s':>9s} {'load s':>7s} {'peak MB':>8s}")
+    for doc in results:
+        for stage in doc["stages"]:
+            if "error" in stage:
+                print(f"{doc['name']:24s} {stage['stage']:20s} ERROR {stage['error']}")
+                continue
+            print(f"{doc['name']:24s} {stage['stage']:20s} {stage['items']:6d} {stage['seconds']:9.4f} "
+                  f"{stage['items_per_second']:9.1f} {stage['model_load_seconds']:7.2f} {stage['peak_rss_mb']:8.1f}")
+
+
+def compare_runs(baseline: Dict[str, Any], current: Dict[str, Any]) -> None:
+    def index(report):
+        return {
+            (doc["name"], stage["stage"]): stage
+            for doc in report["documents"] for stage in doc["stages"] if "error" not in stage
+        }
+
+    old, new = index(baseline), index(current)
+    print(f"{'document':24s} {'stage':20s} {'old s':>9s} {'new s':>9s} {'change':>8s} {'old MB':>8s} {'new MB':>8s}")
+    for key in sorted(set(old) & set(new)):
+        a, b = old[key], new[key]
+        change = (b["seconds"] - a["seconds"]) / a["seconds"] if a["seconds"] else 0.0
+        print(f"{key[0]:24s} {key[1]:20s} {a['seconds']:9.4f} {b['seconds']:9.4f} {change:+8.1%} "
+              f"{a['peak_rss_mb']:8.1f} {b['peak_rss_mb']:8.1f}")
+    for key in sorted(set(old) ^ set(new)):
+        print(f"{key[0]:24s} {key[1]:20s} only in {'baseline' if key in old else 'current'}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="5,20,80", help="page counts")
+    parser.add_argument("--shapes", default=",".join(SHAPES))
+    parser.add_argument("--stages", default=",".join(STAGES))
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage (median reported)")
+    parser.add_argument("--in-process", action="store_true", help="skip per-stage subprocess isolation")
+    parser.add_argument("--timeout", type=float, default=900.0, help="per-stage timeout when isolated")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "esrl_bench_corpus"))
+    parser.add_argument("--output")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"))
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0], "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.compare[1], "r", encoding="utf-8") as f:
+            current = json.load(f)
+        compare_runs(baseline, current)
+        return 0
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    shapes = [shape for shape in args.shapes.split(",") if shape]
+    stages = [stage for stage in args.stages.split(",") if stage]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    corpus = generate_corpus(args.corpus_dir, sizes, shapes, seed=args.seed)
+    scratch = tempfile.mkdtemp(prefix="esrl_ingest_bench_")
+    results = []
+    for entry in corpus:
+        name = f"{entry['shape']}_{entry['pages']}p"
+        pdf_path = os.path.abspath(entry["path"])
+        stage_results = []
+        for stage in stages:
+            workdir = os.path.join(scratch, name, stage)
+            if args.in_process:
+                cwd = os.getcwd()
+                try:
+                    stage_results.append(run_stage(stage, pdf_path, args.repeat, workdir))
+                finally:
+                    os.chdir(cwd)
+            else:
+                stage_results.append(run_isolated(stage, pdf_path, args.repeat, workdir, args.timeout))
+        results.append({"name": name, "shape": entry["shape"], "pages": entry["pages"], "stages": stage_results})
+
+    print_results(results)
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "config": {"sizes": sizes, "shapes": shapes, "stages": stages, "repeat": args.repeat,
+                   "isolated": not args.in_process, "seed": args.seed,
+                   "embedding_backend": os.getenv("EMBEDDING_BACKEND", "minilm"),
+                   "caption_backend": os.getenv("CAPTION_BACKEND", "blip")},
+        "documents": results
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nreport written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,420 @@
+"""Concurrent load test for the esrlBackend HTTP API.
+
+Each virtual user uploads a synthetic PDF (see ``synthetic_pdfs.py``) and then
+drives ``/rag``, ``/chat``, ``/notes``, ``/notes/summary`` and optionally
+``/generate_video`` against it in a closed loop. Latency percentiles,
+throughput and error counts are reported per endpoint and written as JSON so
+two runs can be compared.
+
+Run the whole stack offline (Gemini stand-in, hashing embedder, stub
+captioner) in a scratch directory:
+
+    python -m benchmarks.load_test --start-stack --users 4 --rounds 3 \\
+        --output bench_results/run.json
+
+Or target a running backend:
+
+    python -m benchmarks.load_test --base-url http://127.0.0.1:5140 --users 8
+
+Compare against a baseline (exit code 1 on regression):
+
+    python -m benchmarks.load_test --compare bench_results/base.json bench_results/run.json
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from benchmarks.synthetic_pdfs import SHAPES, TOPICS, generate_corpus
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_ENDPOINTS = ["upload_pdf", "rag", "chat", "notes", "notes_summary"]
+ALL_ENDPOINTS = DEFAULT_ENDPOINTS + ["generate_video"]
+PERCENTILES = (50, 95, 99)
+
+
+# =====================================================
+# Measurement
+# =====================================================
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: List[Dict[str, Any]] = []
+
+    def record(self, endpoint: str, started: float, elapsed: float, status: int, error: Optional[str] = None,
+               timings: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            self.samples.append({
+                "endpoint": endpoint,
+                "started": started,
+                "latency": elapsed,
+                "status": status,
+                "ok": error is None and 200 <= status < 300,
+                "error": error,
+                "timings": timings
+            })
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize_latencies(latencies: List[float]) -> Dict[str, float]:
+    summary = {f"p{pct}": round(percentile(latencies, pct), 4) for pct in PERCENTILES}
+    summary["mean"] = round(statistics.fmean(latencies), 4) if latencies else 0.0
+    summary["max"] = round(max(latencies), 4) if latencies else 0.0
+    return summary
+
+
+def summarize_server_timings(samples: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    # Mean milliseconds per stage over the requests that reported timings
+    # (the backend's opt-in ``timings`` field).
+    totals: Dict[str, List[float]] = {}
+    reported = [s["timings"] for s in samples if s.get("timings")]
+    for timings in reported:
+        for stage, entry in timings.items():
+            totals.setdefault(stage, []).append(entry.get("ms", 0.0))
+    return {
+        stage: {"mean_ms": round(sum(values) / len(reported), 3), "p95_ms": round(percentile(values, 95), 3)}
+        for stage, values in sorted(totals.items())
+    }
+
+
+def build_report(samples: List[Dict[str, Any]], wall_seconds: float, config: Dict[str, Any]) -> Dict[str, Any]:
+    endpoints: Dict[str, Any] = {}
+    for name in sorted({s["endpoint"] for s in samples}):
+        group = [s for s in samples if s["endpoint"] == name]
+        ok = [s["latency"] for s in group if s["ok"]]
+        errors: Dict[str, int] = {}
+        for s in group:
+            if not s["ok"]:
+                key = str(s["status"] or s["error"])
+                errors[key] = errors.get(key, 0) + 1
+        endpoints[name] = {
+            "requests": len(group),
+            "succeeded": len(ok),
+            "errors": errors,
+            "throughput_rps": round(len(group) / wall_seconds, 3) if wall_seconds else 0.0,
+            "latency_seconds": summarize_latencies(ok),
+            "server_timings": summarize_server_timings([s for s in group if s["ok"]])
+        }
+
+    all_ok = [s["latency"] for s in samples if s["ok"]]
+    return {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "config": config,
+        "wall_seconds": round(wall_seconds, 3),
+        "overall": {
+            "requests": len(samples),
+            "succeeded": len(all_ok),
+            "throughput_rps": round(len(samples) / wall_seconds, 3) if wall_seconds else 0.0,
+            "latency_seconds": summarize_latencies(all_ok)
+        },
+        "endpoints": endpoints
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# =====================================================
+# Workload
+# =====================================================
+
+class BackendClient:
+    def __init__(self, base_url: str, recorder: Recorder, timeout: float):
+        self.base_url = base_url.rstrip("/")
+        self.recorder = recorder
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers["X-Timings"] = "1"
+
+    def call(self, endpoint: str, method: str, path: str, **kwargs) -> Optional[Dict[str, Any]]:
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+            elapsed = time.perf_counter() - started
+        except requests.RequestException as exc:
+            self.recorder.record(endpoint, started, time.perf_counter() - started, 0, error=type(exc).__name__)
+            return None
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        timings = data.get("timings") if isinstance(data, dict) else None
+        self.recorder.record(endpoint, started, elapsed, response.status_code, timings=timings)
+        return data
+
+
+def _questions(rng: random.Random, count: int) -> List[str]:
+    templates = [
+        "What is {name}?",
+        "Explain the role of the {part} in {name}.",
+        "How does {name} work?",
+        "Give an example of {name}.",
+    ]
+    questions = []
+    for _ in range(count):
+        name, part, _ = rng.choice(TOPICS)
+        questions.append(rng.choice(templates).format(name=name, part=part))
+    return questions
+
+
+def run_user(user_index: int, client: BackendClient, pdf: Dict[str, Any], rounds: int, endpoints: List[str], seed: int):
+    rng = random.Random(seed * 7919 + user_index)
+    with open(pdf["path"], "rb") as f:
+        uploaded = client.call(
+            "upload_pdf", "POST", "/upload_pdf",
+            files={"file": (os.path.basename(pdf["path"]), f, "application/pdf")}
+        )
+    document_id = (uploaded or {}).get("document_id")
+    if not document_id:
+        return
+
+    for _ in range(rounds):
+        question = _questions(rng, 1)[0]
+        if "rag" in endpoints:
+            client.call("rag", "POST", "/rag", json={"query": question})
+        if "chat" in endpoints:
+            client.call("chat", "POST", "/chat", json={"messages": [{"role": "user", "content": question}]})
+        if "notes" in endpoints:
+            client.call("notes", "POST", "/notes", json={"document_id": document_id})
+        if "notes_summary" in endpoints:
+            client.call("notes_summary", "POST", "/notes/summary", json={"document_id": document_id})
+
+    if "generate_video" in endpoints:
+        client.call("generate_video", "POST", f"/generate_video/{document_id}")
+
+
+def check_document_scoped_notes(base_url: str, timeout: float) -> None:
+    # Backends that predate per-document notes ignore document_id and summarise
+    # the last upload, so concurrent users would time each other's documents.
+    # Those answer an unknown document_id with 200 (or 400 before any upload)
+    # instead of 404; refuse to measure them.
+    try:
+        response = requests.post(
+            f"{base_url.rstrip('/')}/notes", json={"document_id": "load-test-missing-document"}, timeout=timeout
+        )
+    except requests.RequestException as exc:
+        raise RuntimeError(f"backend not reachable at {base_url}: {type(exc).__name__}") from exc
+    if response.status_code != 404:
+        raise RuntimeError(
+            f"/notes answered an unknown document_id with {response.status_code}, not 404: this backend does "
+            "not resolve document_id, so per-user notes latency would mix documents. "
+            "Drop notes,notes_summary from --endpoints to benchmark it."
+        )
+
+
+def run_load(base_url: str, corpus: List[Dict[str, Any]], users: int, rounds: int,
+             endpoints: List[str], timeout: float, seed: int) -> Dict[str, Any]:
+    if "notes" in endpoints or "notes_summary" in endpoints:
+        check_document_scoped_notes(base_url, timeout)
+    recorder = Recorder()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        futures = [
+            pool.submit(
+                run_user, index, BackendClient(base_url, recorder, timeout),
+                corpus[index % len(corpus)], rounds, endpoints, seed
+            )
+            for index in range(users)
+        ]
+        for future in futures:
+            future.result()
+    wall = time.perf_counter() - started
+    return {"samples": recorder.samples, "wall_seconds": wall}
+
+
+# =====================================================
+# Offline stack
+# =====================================================
+
+def _wait_for(url: str, timeout: float, require_ok: bool = False) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            response = requests.get(url, timeout=2)
+            if not require_ok or response.ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+class OfflineStack:
+    """Gemini stand-in + backend (hashing embedder, stub captions) in a scratch dir."""
+
+    def __init__(self, backend_port: int, stub_port: int, extra_env: Optional[Dict[str, str]] = None):
+        self.backend_port = backend_port
+        self.stub_port = stub_port
+        self.extra_env = extra_env or {}
+        self.workdir = tempfile.mkdtemp(prefix="esrl_bench_")
+        self.processes: List[subprocess.Popen] = []
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.backend_port}"
+
+    def __enter__(self):
+        env = dict(os.environ)
+        env.setdefault("EMBEDDING_BACKEND", "hash")
+        env.setdefault("CAPTION_BACKEND", "stub")
+        env.update({
+            "GEMINI_BASE_URL": f"http://127.0.0.1:{self.stub_port}",
+            "GEMINI_API_KEY": env.get("GEMINI_API_KEY") or "stub",
+            "PYTHONPATH": BACKEND_DIR + os.pathsep + env.get("PYTHONPATH", ""),
+        })
+        env.update(self.extra_env)
+        self.processes.append(subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.gemini_stub_server", "--port", str(self.stub_port)],
+            cwd=BACKEND_DIR, env=env
+        ))
+        self.processes.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "--app-dir", BACKEND_DIR, "main:app",
+             "--port", str(self.backend_port), "--log-level", "warning"],
+            cwd=self.workdir, env=env
+        ))
+        _wait_for(f"http://127.0.0.1:{self.stub_port}/stub/stats", 30)
+        # /ready turns 200 once the WARMUP_MODELS are loaded, so cold-start model
+        # loads are not billed to the first measured requests.
+        _wait_for(f"{self.base_url}/ready", 300, require_ok=True)
+        return self
+
+    def __exit__(self, *exc_info):
+        for process in reversed(self.processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+# =====================================================
+# Comparison
+# =====================================================
+
+def compare_reports(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    regressions = []
+    for name, stats in current.get("endpoints", {}).items():
+        base = baseline.get("endpoints", {}).get(name)
+        if not base:
+            continue
+        for key in ("p50", "p95", "p99"):
+            old = base["latency_seconds"].get(key) or 0.0
+            new = stats["latency_seconds"].get(key) or 0.0
+            change = (new - old) / old if old else 0.0
+            marker = "REGRESSION" if change > threshold else ""
+            print(f"{name:16s} {key:4s} {old:9.3f}s -> {new:9.3f}s  {change:+7.1%} {marker}")
+            if marker:
+                regressions.append(f"{name} {key}")
+        old_errors = sum(base.get("errors", {}).values())
+        new_errors = sum(stats.get("errors", {}).values())
+        if new_errors > old_errors:
+            print(f"{name:16s} errors {old_errors} -> {new_errors}  REGRESSION")
+            regressions.append(f"{name} errors")
+    return regressions
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\nwall {report['wall_seconds']:.2f}s, {report['overall']['requests']} requests, "
+          f"{report['overall']['throughput_rps']} req/s")
+    print(f"{'endpoint':16s} {'n':>5s} {'ok':>5s} {'p50':>8s} {'p95':>8s} {'p99':>8s} {'rps':>7s}")
+    for name, stats in report["endpoints"].items():
+        lat = stats["latency_seconds"]
+        print(f"{name:16s} {stats['requests']:5d} {stats['succeeded']:5d} "
+              f"{lat['p50']:8.3f} {lat['p95']:8.3f} {lat['p99']:8.3f} {stats['throughput_rps']:7.2f}")
+
+    for name, stats in report["endpoints"].items():
+        stages = {k: v for k, v in stats.get("server_timings", {}).items() if k != "total"}
+        if not stages:
+            continue
+        print(f"\n{name} server stages (mean ms / p95 ms)")
+        for stage, entry in sorted(stages.items(), key=lambda item: -item[1]["mean_ms"]):
+            print(f"  {stage:28s} {entry['mean_ms']:10.1f} {entry['p95_ms']:10.1f}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:5140")
+    parser.add_argument("--start-stack", action="store_true", help="spawn the stand-in + backend offline")
+    parser.add_argument("--backend-port", type=int, default=5199)
+    parser.add_argument("--stub-port", type=int, default=8765)
+    parser.add_argument("--users", type=int, default=4, help="concurrent virtual users")
+    parser.add_argument("--rounds", type=int, default=3, help="query rounds per user after upload")
+    parser.add_argument("--shapes", default=",".join(SHAPES))
+    parser.add_argument("--pages", type=int, default=8)
+    parser.add_argument("--endpoints", default=",".join(DEFAULT_ENDPOINTS),
+                        help=f"subset of {','.join(ALL_ENDPOINTS)}")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "esrl_bench_corpus"))
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"))
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed relative latency increase")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0], "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.compare[1], "r", encoding="utf-8") as f:
+            current = json.load(f)
+        regressions = compare_reports(baseline, current, args.threshold)
+        return 1 if regressions else 0
+
+    shapes = [s for s in args.shapes.split(",") if s]
+    endpoints = [e for e in args.endpoints.split(",") if e]
+    corpus = generate_corpus(args.corpus_dir, [args.pages], shapes, seed=args.seed)
+    config = {
+        "users": args.users, "rounds": args.rounds, "shapes": shapes, "pages": args.pages,
+        "endpoints": endpoints, "seed": args.seed, "offline_stack": args.start_stack
+    }
+
+    try:
+        if args.start_stack:
+            with OfflineStack(args.backend_port, args.stub_port) as stack:
+                result = run_load(stack.base_url, corpus, args.users, args.rounds, endpoints, args.timeout, args.seed)
+        else:
+            result = run_load(args.base_url, corpus, args.users, args.rounds, endpoints, args.timeout, args.seed)
+    except RuntimeError as exc:
+        print(f"load test aborted: {exc}", file=sys.stderr)
+        return 2
+
+    report = build_report(result["samples"], result["wall_seconds"], config)
+    print_report(report)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nreport written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
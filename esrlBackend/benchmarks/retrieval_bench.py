@@ -0,0 +1,359 @@
+"""Retrieval quality-vs-latency benchmark for ``query_similar``.
+
+Builds a labeled corpus from ``synthetic_pdfs.py``. Every paragraph states one
+topic fact, so generated questions map to a known set of chunk ids. Each
+corpus is ingested through the real pipeline (extraction, structuring,
+``chunk_sections``, ``upsert_chunks``) once per index configuration.
+
+Reported per configuration:
+
+* ``recall@k``         relevant chunks in the top k / min(k, relevant chunks)
+* ``mrr``              mean reciprocal rank of the first relevant chunk
+* ``context_recall``   share of questions whose packed context
+  (``_build_context_blocks``) still contains a relevant chunk
+* ``ann_overlap@k``    overlap of the HNSW top k with an exact brute-force top k
+* p50/p95 latency of query embedding, ``query_similar`` search and packing,
+  plus index build time
+
+Configurations are ``;``-separated ``key=value`` lists mapped onto the
+``CHROMA_HNSW_*`` variables read by ``embedding_service``. ``exact`` is a
+NumPy brute-force baseline over the same embeddings.
+
+    python -m benchmarks.retrieval_bench --sizes 40,200 \\
+        --configs "default;M=8,construction_ef=64,search_ef=10;M=32,construction_ef=200,search_ef=100"
+    python -m benchmarks.retrieval_bench --compare bench_results/a.json bench_results/b.json
+
+Each configuration runs in a fresh subprocess with its own scratch
+``storage/``. Use ``EMBEDDING_BACKEND=hash`` for an offline run.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from benchmarks.load_test import percentile
+from benchmarks.synthetic_pdfs import TOPICS, generate_corpus
+
+HNSW_KEYS = {
+    "space": "CHROMA_HNSW_SPACE",
+    "M": "CHROMA_HNSW_M",
+    "construction_ef": "CHROMA_HNSW_CONSTRUCTION_EF",
+    "search_ef": "CHROMA_HNSW_SEARCH_EF",
+}
+
+# (question template, statement the relevant chunk must contain)
+QUESTION_TEMPLATES = [
+    ("Which concept {fact}?", "the {name} {fact}"),
+    ("What does the {name} do?", "the {name} {fact}"),
+    ("Explain what {name} means.", "the {name} {fact}"),
+    ("What is an important part of {name}?", "an important part of {name} is the {part}"),
+    ("Why does the {part} matter for {name}?", "an important part of {name} is the {part}"),
+]
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def build_questions() -> List[Dict[str, str]]:
+    questions = []
+    for name, part, fact in TOPICS:
+        for template, statement in QUESTION_TEMPLATES:
+            questions.append({
+                "question": template.format(name=name, part=part, fact=fact),
+                "statement": _normalize(statement.format(name=name, part=part, fact=fact))
+            })
+    return questions
+
+
+def label_questions(questions: List[Dict[str, str]], chunks: List[Dict]) -> List[Dict[str, Any]]:
+    normalized = [(chunk["id"], _normalize(chunk["text"])) for chunk in chunks]
+    labeled = []
+    for question in questions:
+        relevant = {chunk_id for chunk_id, text in normalized if question["statement"] in text}
+        if relevant:
+            labeled.append(dict(question, relevant=relevant))
+    return labeled
+
+
+def parse_config(spec: str) -> Dict[str, str]:
+    spec = spec.strip()
+    if spec in ("", "default", "exact"):
+        return {}
+    config = {}
+    for part in spec.split(","):
+        key, _, value = part.partition("=")
+        key = key.strip()
+        if key not in HNSW_KEYS:
+            raise ValueError(f"Unknown HNSW parameter {key!r}; expected one of {sorted(HNSW_KEYS)}")
+        config[key] = value.strip()
+    return config
+
+
+# =====================================================
+# One configuration, run inside a scratch subprocess
+# =====================================================
+
+def _ingest(pdf_path: str, document_id: str) -> List[Dict]:
+    from app.services.chunk_service import chunk_sections
+    from app.services.discourse_service import classify_discourse
+    from app.services.pdf_extraction_service import extract_text_from_pdf
+    from app.services.text_processing_service import structure_pages
+
+    _, pages_text = extract_text_from_pdf(pdf_path)
+    sections = classify_discourse(structure_pages(pages_text))
+    return chunk_sections(sections, document_id)
+
+
+def _exact_top_k(np, matrix, ids: List[str], query, space: str, top_k: int) -> List[str]:
+    if space == "cosine":
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+        distances = 1.0 - (matrix @ query) / np.where(norms == 0, 1.0, norms)
+    elif space == "ip":
+        distances = -(matrix @ query)
+    else:
+        distances = ((matrix - query) ** 2).sum(axis=1)
+    order = np.argsort(distances)[:top_k]
+    return [ids[i] for i in order]
+
+
+def _score(retrieved: List[str], relevant: set, top_k: int) -> Dict[str, float]:
+    hits = len(relevant.intersection(retrieved[:top_k]))
+    reciprocal = 0.0
+    for rank, chunk_id in enumerate(retrieved, start=1):
+        if chunk_id in relevant:
+            reciprocal = 1.0 / rank
+            break
+    return {"recall": hits / min(top_k, len(relevant)), "rr": reciprocal}
+
+
+def _latency_summary(values: List[float]) -> Dict[str, float]:
+    return {
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+    }
+
+
+def run_config(label: str, exact: bool, pdf_path: str, top_k: int, workdir: str) -> Dict[str, Any]:
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    try:
+        import numpy as np
+
+        from app.services import embedding_service
+        from app.services.rag_service import _build_context_blocks
+
+        chunks = _ingest(pdf_path, "bench_doc")
+        questions = label_questions(build_questions(), chunks)
+
+        started = time.perf_counter()
+        embedding_service.upsert_chunks(chunks)
+        build_seconds = time.perf_counter() - started
+
+        collection = embedding_service.get_chroma_collection()
+        stored = collection.get(include=["embeddings"])
+        matrix = np.asarray(stored["embeddings"], dtype=np.float32)
+        space = embedding_service.CHROMA_HNSW_SPACE or "l2"
+
+        # Load the model and warm the index outside the timed loop.
+        embedding_service.query_similar("warm up the index", top_k=top_k)
+
+        embed_times, search_times, pack_times = [], [], []
+        recalls, reciprocal_ranks, overlaps, context_hits = [], [], [], 0
+        for question in questions:
+            text = question["question"]
+            started = time.perf_counter()
+            query = embedding_service.embed_query(text)
+            embed_times.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            if exact:
+                retrieved = _exact_top_k(np, matrix, stored["ids"], np.asarray(query, dtype=np.float32), space, top_k)
+                context = collection.get(ids=retrieved, include=["documents", "metadatas"])
+                order = {chunk_id: i for i, chunk_id in enumerate(retrieved)}
+                rows = sorted(zip(context["ids"], context["documents"], context["metadatas"]), key=lambda r: order[r[0]])
+                context = {
+                    "ids": [[r[0] for r in rows]],
+                    "documents": [[r[1] for r in rows]],
+                    "metadatas": [[r[2] for r in rows]]
+                }
+            else:
+                context = embedding_service.query_similar(text, top_k=top_k)
+                retrieved = context["ids"][0]
+            search_times.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            blocks = _build_context_blocks(text, context)
+            pack_times.append(time.perf_counter() - started)
+
+            score = _score(retrieved, question["relevant"], top_k)
+            recalls.append(score["recall"])
+            reciprocal_ranks.append(score["rr"])
+            exact_ids = _exact_top_k(np, matrix, stored["ids"], np.asarray(query, dtype=np.float32), space, top_k)
+            overlaps.append(len(set(exact_ids) & set(retrieved)) / max(1, len(exact_ids)))
+            packed_ids = {chunk_id for _, meta in blocks for chunk_id in meta.get("chunk_ids", [])}
+            if packed_ids & question["relevant"]:
+                context_hits += 1
+
+        count = max(1, len(questions))
+        return {
+            "config": label,
+            "chunks": len(chunks),
+            "questions": len(questions),
+            f"recall@{top_k}": round(statistics.fmean(recalls), 4) if recalls else 0.0,
+            "mrr": round(statistics.fmean(reciprocal_ranks), 4) if reciprocal_ranks else 0.0,
+            "context_recall": round(context_hits / count, 4),
+            f"ann_overlap@{top_k}": round(statistics.fmean(overlaps), 4) if overlaps else 0.0,
+            "build_seconds": round(build_seconds, 4),
+            "embed": _latency_summary(embed_times),
+            "search": _latency_summary(search_times),
+            "pack": _latency_summary(pack_times)
+        }
+    except Exception as exc:
+        return {"config": label, "error": f"{type(exc).__name__}: {exc}"}
+
+
+def _run_config_in_child(queue, env: Dict[str, str], *args) -> None:
+    os.environ.update(env)
+    queue.put(run_config(*args))
+
+
+def run_isolated(label: str, spec: str, pdf_path: str, top_k: int, workdir: str, timeout: float) -> Dict[str, Any]:
+    env = {variable: "" for variable in HNSW_KEYS.values()}
+    env.update({HNSW_KEYS[key]: value for key, value in parse_config(spec).items()})
+    exact = spec.strip() == "exact"
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(
+        target=_run_config_in_child,
+        args=(queue, env, label, exact, pdf_path, top_k, workdir)
+    )
+    process.start()
+    try:
+        return queue.get(timeout=timeout)
+    except Exception:
+        return {"config": label, "error": f"no result within {timeout}s"}
+    finally:
+        process.join(timeout=5)
+        if process.is_alive():
+            process.kill()
+
+
+# =====================================================
+# Reporting
+# =====================================================
+
+def print_results(corpora: List[Dict[str, Any]], top_k: int) -> None:
+    for corpus in corpora:
+        print(f"\n{corpus['name']}")
+        print(f"  {'config':44s} {'recall':>7s} {'mrr':>6s} {'ctx':>6s} {'ann':>6s} "
+              f"{'search p50':>10s} {'p95':>8s} {'build s':>8s}")
+        for result in corpus["results"]:
+            if "error" in result:
+                print(f"  {result['config']:44s} ERROR {result['error']}")
+                continue
+            print(f"  {result['config']:44s} {result[f'recall@{top_k}']:7.3f} {result['mrr']:6.3f} "
+                  f"{result['context_recall']:6.3f} {result[f'ann_overlap@{top_k}']:6.3f} "
+                  f"{result['search']['p50_ms']:10.2f} {result['search']['p95_ms']:8.2f} {result['build_seconds']:8.2f}")
+
+
+def pick_fastest(results: List[Dict[str, Any]], top_k: int, tolerance: float) -> Optional[Dict[str, Any]]:
+    # Fastest HNSW configuration whose recall stays within tolerance of the exact baseline.
+    valid = [r for r in results if "error" not in r]
+    baseline = next((r for r in valid if r["config"] == "exact"), None)
+    floor = baseline[f"recall@{top_k}"] - tolerance if baseline else 0.0
+    candidates = [r for r in valid if r["config"] != "exact" and r[f"recall@{top_k}"] >= floor]
+    return min(candidates, key=lambda r: r["search"]["p95_ms"], default=None)
+
+
+def compare_runs(baseline: Dict[str, Any], current: Dict[str, Any]) -> None:
+    top_k = current["config"]["top_k"]
+
+    def index(report):
+        return {
+            (corpus["name"], result["config"]): result
+            for corpus in report["corpora"] for result in corpus["results"] if "error" not in result
+        }
+
+    old, new = index(baseline), index(current)
+    print(f"{'corpus':16s} {'config':44s} {'recall':>15s} {'mrr':>15s} {'search p95 ms':>19s}")
+    for key in sorted(set(old) & set(new)):
+        a, b = old[key], new[key]
+        print(f"{key[0]:16s} {key[1]:44s} {a[f'recall@{top_k}']:6.3f}->{b[f'recall@{top_k}']:6.3f} "
+              f"{a['mrr']:6.3f}->{b['mrr']:6.3f} {a['search']['p95_ms']:8.2f}->{b['search']['p95_ms']:8.2f}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="40,200", help="pages per corpus document")
+    parser.add_argument("--configs", default="default;M=8,construction_ef=64,search_ef=10;M=32,construction_ef=200,search_ef=100",
+                        help="';'-separated HNSW configurations")
+    parser.add_argument("--no-exact", action="store_true", help="skip the brute-force baseline")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.01, help="allowed recall drop versus exact when picking")
+    parser.add_argument("--timeout", type=float, default=1800.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "esrl_bench_corpus"))
+    parser.add_argument("--output")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"))
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0], "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.compare[1], "r", encoding="utf-8") as f:
+            current = json.load(f)
+        compare_runs(baseline, current)
+        return 0
+
+    specs = [spec.strip() for spec in args.configs.split(";") if spec.strip()]
+    for spec in specs:
+        try:
+            parse_config(spec)
+        except ValueError as exc:
+            parser.error(str(exc))
+    if not args.no_exact:
+        specs.append("exact")
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    corpus = generate_corpus(args.corpus_dir, sizes, ["text"], seed=args.seed)
+    scratch = tempfile.mkdtemp(prefix="esrl_retrieval_bench_")
+    corpora = []
+    for entry in corpus:
+        name = f"text_{entry['pages']}p"
+        results = []
+        for index, spec in enumerate(specs):
+            workdir = os.path.join(scratch, name, f"config_{index}")
+            results.append(run_isolated(spec, spec, os.path.abspath(entry["path"]), args.top_k, workdir, args.timeout))
+        corpora.append({"name": name, "pages": entry["pages"], "results": results})
+
+    print_results(corpora, args.top_k)
+    for corpus_result in corpora:
+        best = pick_fastest(corpus_result["results"], args.top_k, args.tolerance)
+        if best:
+            print(f"\n{corpus_result['name']}: fastest config holding recall: {best['config']}")
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "config": {"sizes": sizes, "configs": specs, "top_k": args.top_k, "seed": args.seed,
+                   "embedding_backend": os.getenv("EMBEDDING_BACKEND", "minilm")},
+        "corpora": corpora
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nreport written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
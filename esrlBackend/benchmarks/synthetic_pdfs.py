@@ -0,0 +1,148 @@
+"""Deterministic synthetic PDFs for benchmarks.
+
+Three shapes cover the ingestion paths in ``/upload_pdf``:
+
+* ``text``    - born-digital text with numbered headings (no OCR, no images)
+* ``scanned`` - every page is a raster image of text (forces ``is_scanned`` + OCR)
+* ``figures`` - text plus several embedded raster figures per page (BLIP + Tesseract)
+
+Generated text is built from a fixed topic vocabulary and a seeded RNG, and
+each paragraph is tagged with the fact it states so retrieval benchmarks can
+label ground truth.
+"""
+
+import os
+import random
+from typing import Dict, List, Optional
+
+import fitz
+
+SHAPES = ("text", "scanned", "figures")
+
+TOPICS = [
+    ("photosynthesis", "chloroplast", "converts light energy into chemical energy"),
+    ("mitosis", "spindle fibres", "separates duplicated chromosomes into two nuclei"),
+    ("osmosis", "semi-permeable membrane", "moves water toward higher solute concentration"),
+    ("entropy", "closed system", "measures the number of accessible microstates"),
+    ("recursion", "base case", "solves a problem by reducing it to smaller instances"),
+    ("hash table", "bucket array", "maps keys to slots using a hash function"),
+    ("supply curve", "market price", "shows quantity producers offer at each price"),
+    ("plate tectonics", "lithosphere", "explains continental drift through moving plates"),
+    ("binary search", "sorted array", "halves the search interval at each comparison"),
+    ("enzyme", "active site", "lowers the activation energy of a reaction"),
+    ("inflation", "price index", "tracks the general rise of prices over time"),
+    ("gradient descent", "learning rate", "updates parameters against the loss gradient"),
+]
+
+FILLER = [
+    "Students often confuse this with related ideas, so an example helps.",
+    "In practice the effect depends on the conditions described earlier.",
+    "This idea appears again in later chapters with more formal notation.",
+    "A common exam question asks learners to compare it with its opposite.",
+    "Researchers measured this repeatedly to confirm the relationship.",
+    "The definition is short, but applying it correctly takes practice.",
+]
+
+
+def _paragraph(rng: random.Random, topic) -> str:
+    name, part, fact = topic
+    sentences = [
+        f"The {name} {fact}.",
+        f"An important part of {name} is the {part}.",
+    ]
+    sentences += rng.sample(FILLER, 3)
+    if rng.random() < 0.4:
+        sentences.append(f"For example, the {part} changes when the inputs change.")
+    return " ".join(sentences)
+
+
+def build_pages(pages: int, seed: int = 0, paragraphs_per_page: int = 4) -> List[Dict]:
+    """Return ``[{"heading", "paragraphs": [{"text", "topic"}]}]`` for each page."""
+    rng = random.Random(seed)
+    result = []
+    for page_index in range(pages):
+        topic = TOPICS[(page_index + seed) % len(TOPICS)]
+        paragraphs = []
+        for _ in range(paragraphs_per_page):
+            chosen = topic if rng.random() < 0.7 else rng.choice(TOPICS)
+            paragraphs.append({"text": _paragraph(rng, chosen), "topic": chosen[0]})
+        result.append({
+            "heading": f"{page_index + 1}. {topic[0].upper()}",
+            "paragraphs": paragraphs
+        })
+    return result
+
+
+def _insert_text_page(doc, page_spec: Dict) -> None:
+    page = doc.new_page(width=595, height=842)
+    body = "\n\n".join(p["text"] for p in page_spec["paragraphs"])
+    page.insert_text((50, 60), page_spec["heading"], fontsize=14)
+    page.insert_textbox(fitz.Rect(50, 80, 545, 800), body, fontsize=10)
+
+
+def _figure_png(seed: int, width: int = 320, height: int = 200) -> bytes:
+    # Draw a small chart on a scratch page and rasterize it, so the PDF carries a
+    # real embedded image rather than vector graphics.
+    rng = random.Random(seed)
+    scratch = fitz.open()
+    page = scratch.new_page(width=width, height=height)
+    page.draw_rect(page.rect, color=(0, 0, 0), fill=(1, 1, 1))
+    bars = rng.randint(3, 6)
+    bar_width = (width - 40) / bars
+    for i in range(bars):
+        bar_height = rng.uniform(0.2, 0.85) * (height - 60)
+        rect = fitz.Rect(20 + i * bar_width + 4, height - 30 - bar_height, 20 + (i + 1) * bar_width - 4, height - 30)
+        page.draw_rect(rect, color=(0.1, 0.2, 0.6), fill=(0.3, 0.5, 0.9))
+    page.insert_text((20, 20), f"Figure {seed % 97}: measured values", fontsize=11)
+    png = page.get_pixmap(dpi=96).tobytes("png")
+    scratch.close()
+    return png
+
+
+def make_pdf(path: str, shape: str, pages: int, seed: int = 0, figures_per_page: int = 2) -> List[Dict]:
+    """Write a synthetic PDF and return its page specs (for ground truth)."""
+    if shape not in SHAPES:
+        raise ValueError(f"Unknown shape {shape!r}; expected one of {SHAPES}")
+    specs = build_pages(pages, seed=seed)
+    doc = fitz.open()
+
+    if shape == "scanned":
+        text_doc = fitz.open()
+        for spec in specs:
+            _insert_text_page(text_doc, spec)
+        for text_page in text_doc:
+            pix = text_page.get_pixmap(dpi=120)
+            page = doc.new_page(width=text_page.rect.width, height=text_page.rect.height)
+            page.insert_image(page.rect, stream=pix.tobytes("png"))
+        text_doc.close()
+    else:
+        for page_index, spec in enumerate(specs):
+            _insert_text_page(doc, spec)
+            if shape == "figures":
+                page = doc[page_index]
+                for figure in range(figures_per_page):
+                    top = 560 + figure * 120
+                    rect = fitz.Rect(60 + figure * 250, top, 280 + figure * 250, top + 110)
+                    page.insert_image(rect, stream=_figure_png(seed * 1000 + page_index * 10 + figure))
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    doc.save(path)
+    doc.close()
+    return specs
+
+
+def generate_corpus(
+    out_dir: str,
+    sizes: List[int],
+    shapes: Optional[List[str]] = None,
+    seed: int = 0
+) -> List[Dict]:
+    """Generate one PDF per (shape, size) and return ``[{"path", "shape", "pages"}]``."""
+    corpus = []
+    for shape in shapes or list(SHAPES):
+        for pages in sizes:
+            path = os.path.join(out_dir, f"{shape}_{pages}p_seed{seed}.pdf")
+            if not os.path.exists(path):
+                make_pdf(path, shape, pages, seed=seed)
+            corpus.append({"path": path, "shape": shape, "pages": pages})
+    return corpus
@@ -1,44 +1,107 @@
+import json
 import os
-from typing import Any, Dict, List
+import time
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
 
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from dotenv import load_dotenv
+
+# Before the service imports: several services read their settings at import time.
+load_dotenv()
+
 from app.services.pdf_service import (
     save_pdf,
     extract_text_from_pdf,
     extract_images_from_pdf,
     generate_document_id,
+    delete_document_files,
+    get_pdf_path_for_document,
     record_last_uploaded,
     get_last_uploaded
 )
 from app.services.text_processing_service import clean_text, structure_pages
 from app.services.discourse_service import classify_discourse
-from app.services.chunk_service import chunk_sections, get_chunks_for_document
+from app.services.chunk_service import (
+    chunk_sections,
+    delete_chunk_manifest,
+    write_chunk_manifest
+)
 from app.services.embedding_service import (
-    get_images_for_document,
+    delete_document_vectors,
     upsert_chunks,
     upsert_images,
     query_similar,
     query_images_for_document,
-    get_text_for_page
+    get_text_for_page,
+    get_retrieval_cache_stats
 )
 from app.services.image_service import generate_caption, extract_text
-from app.services.rag_service import generate_answer
-from app.services.notes_service import generate_quick_notes
-from app.services.summarizer_service import summarize_text_levels
-from app.services.video_gen_service import (
-    generate_slide_plan,
-    generate_video_parallel,
-    normalize_chroma_images,
+from app.services.rag_service import generate_answer, generate_answer_stream
+from app.services.answer_cache_service import get_answer_cache_stats
+from app.services.artifact_service import (
+    get_notes,
+    get_slide_plan,
+    get_study_notes,
+    get_summary,
+    get_tts_cache_dir,
+    load_slide_inputs
 )
-import requests
-from dotenv import load_dotenv
-load_dotenv()
+from app.services.derived_cache_service import (
+    delete_derived_for_text,
+    delete_document_text,
+    get_derived_cache_stats,
+    load_document_text,
+    text_shared_with_other_document,
+    write_document_text
+)
+from app.services.precompute_service import cancel_precompute, get_precompute_status, schedule_precompute
+from app.services.singleflight_service import coalesce
+from app.services.admission_service import AdmissionRejected, admit, get_admission_stats
+from app.services.game_engine_service import (
+    GameEngineError,
+    GameEngineUnavailable,
+    close_game_engine_client,
+    get_game_engine_stats,
+    open_game_engine_stream,
+    request_game_engine
+)
+from app.services.executor_service import get_executor_stats, run_cpu, run_io, run_subprocess, shutdown_executors
+from app.services.llm_gateway import get_llm_stats
+from app.services.model_registry import get_model_stats
+from app.services.metrics_service import (
+    get_request_timings,
+    observe_request,
+    render_prometheus,
+    reset_request_timings,
+    start_request_timings
+)
+from app.services.profiling_service import (
+    ProfilingMiddleware,
+    is_admin,
+    list_profiles,
+    load_profile,
+    render_folded
+)
+from app.services.warmup_service import get_readiness, start_warmup
+from app.services.summarizer_service import partial_summary_inputs
+from app.services.video_gen_service import delete_video_runs, generate_video_parallel
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start_warmup()
+    yield
+    await close_game_engine_client()
+    shutdown_executors()
 
-app = FastAPI()
-GAME_ENGINE_API_URL = os.getenv("GAME_ENGINE_API_URL", "http://127.0.0.1:8000").rstrip("/")
-REQUEST_TIMEOUT_SECONDS = int(os.getenv("GAME_ENGINE_TIMEOUT_SECONDS", "30"))
+
+app = FastAPI(lifespan=lifespan)
+# Upper bound for one long-poll of /game/status.
+GAME_STATUS_MAX_WAIT_SECONDS = 25.0
 
 os.makedirs("storage", exist_ok=True)
 os.makedirs("media", exist_ok=True)
@@ -51,38 +114,195 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Profile-Id", "X-Cache", "X-Singleflight", "Retry-After"],
 )
+app.add_middleware(ProfilingMiddleware)
+
+def _wants_timings(request: Request) -> bool:
+    flag = request.headers.get("x-timings") or request.query_params.get("timings") or ""
+    return flag.strip().lower() in ("1", "true", "yes")
+
+
+def _server_timing_header(timings: Dict[str, Dict[str, float]]) -> str:
+    return ", ".join(
+        f"{stage.replace('.', '_').replace(':', '_')};dur={entry['ms']:.1f}" for stage, entry in timings.items()
+    )
+
+
+async def _attach_timings(response: Response, timings: Dict[str, Dict[str, float]]) -> Response:
+    # Streaming (NDJSON) bodies are still being produced here, so they only get the
+    # Server-Timing header for the work done before the first byte.
+    if not response.headers.get("content-type", "").startswith("application/json"):
+        response.headers["Server-Timing"] = _server_timing_header(timings)
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    try:
+        data = json.loads(body)
+    except ValueError:
+        data = None
+    if isinstance(data, dict):
+        data["timings"] = timings
+        body = json.dumps(data).encode("utf-8")
+
+    headers = {k: v for k, v in response.headers.items() if k.lower() != "content-length"}
+    headers["Server-Timing"] = _server_timing_header(timings)
+    return Response(content=body, status_code=response.status_code, headers=headers, media_type="application/json")
+
+
+async def _observe_after_body(body_iterator, observe: Callable[[], None]):
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    finally:
+        observe()
+
+
+@app.middleware("http")
+async def request_metrics(request: Request, call_next):
+    # call_next returns once headers are ready, so the latency is observed
+    # when the body finishes; for the NDJSON and event streams that is the
+    # full stream duration rather than time-to-headers.
+    token = start_request_timings() if _wants_timings(request) else None
+    started = time.perf_counter()
+    status = 500
+
+    def observe() -> None:
+        route = request.scope.get("route")
+        observe_request(request.method, getattr(route, "path", "unmatched"), status, time.perf_counter() - started)
+
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    except BaseException:
+        observe()
+        raise
+    finally:
+        timings = get_request_timings() if token is not None else None
+        if token is not None:
+            reset_request_timings(token)
+
+    response.body_iterator = _observe_after_body(response.body_iterator, observe)
+    if timings is None:
+        return response
+    timings["total"] = {"ms": round((time.perf_counter() - started) * 1000, 3), "count": 1}
+    return await _attach_timings(response, timings)
+
 
 @app.get("/")
 async def root():
     return {"message": "Hello World"}
 
-@app.post("/upload_pdf")
-async def upload_pdf(file: UploadFile = File(...)):
+
+@app.get("/ready")
+async def ready():
+    readiness = get_readiness()
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {
+        "retrieval": get_retrieval_cache_stats(),
+        "answers": get_answer_cache_stats(),
+        "derived": get_derived_cache_stats()
+    }
+
+@app.get("/llm/stats")
+async def llm_stats():
+    return get_llm_stats()
+
+
+@app.get("/models")
+async def model_stats():
+    return get_model_stats()
+
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected(request: Request, exc: AdmissionRejected):
+    return JSONResponse(
+        {"detail": str(exc), "endpoint": exc.endpoint, "retry_after": exc.retry_after},
+        status_code=429,
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
+async def _run_admitted(endpoint: str, func, *args):
+    async with admit(endpoint):
+        return await func(*args)
+
+
+@app.get("/admission")
+async def admission_stats():
+    return get_admission_stats()
+
+
+@app.get("/executors")
+async def executor_stats():
+    return get_executor_stats()
+
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+def _require_admin(token: Optional[str]) -> None:
+    if not is_admin(token):
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+
+
+@app.get("/admin/profiles")
+async def admin_list_profiles(x_admin_token: Optional[str] = Header(default=None)):
+    _require_admin(x_admin_token)
+    return {"profiles": await run_io(list_profiles)}
+
+
+@app.get("/admin/profiles/{profile_id}")
+async def admin_download_profile(
+    profile_id: str,
+    format: str = "json",
+    kind: str = "wall",
+    x_admin_token: Optional[str] = Header(default=None)
+):
+    _require_admin(x_admin_token)
+    # Load once and serve from memory: the ring can drop the file at any time.
+    profile = await run_io(load_profile, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Profile not found: {profile_id}")
+    if format == "folded":
+        return PlainTextResponse(render_folded(profile, kind=kind))
+    return JSONResponse(profile, headers={"Content-Disposition": f'attachment; filename="profile_{profile_id}.json"'})
+
+
+async def _ingest_pdf(file: UploadFile) -> Dict[str, Any]:
     path = await save_pdf(file)
 
     document_id = generate_document_id(path)
-    full_text, pages_text = extract_text_from_pdf(path)
-    cleaned = clean_text(full_text)
-    sections = structure_pages(pages_text)
-    sections = classify_discourse(sections)
+    full_text, pages_text = await run_cpu(extract_text_from_pdf, path)
+    cleaned = await run_cpu(clean_text, full_text)
+    await run_io(write_document_text, document_id, cleaned)
+    sections = await run_cpu(structure_pages, pages_text)
+    sections = await run_cpu(classify_discourse, sections)
 
     for section in sections:
         section["document_id"] = document_id
 
-    chunks = chunk_sections(sections, document_id)
-    upsert_chunks(chunks)
+    chunks = await run_cpu(chunk_sections, sections, document_id)
+    # Embedding dominates the upsert, so it runs on the cpu pool.
+    await run_cpu(upsert_chunks, chunks)
+    await run_io(write_chunk_manifest, document_id, chunks)
 
-    images = extract_images_from_pdf(path, document_id)
+    images = await run_cpu(extract_images_from_pdf, path, document_id)
     if images:
         image_chunks = []
         for image in images:
             try:
-                caption = generate_caption(image["path"])
+                caption = await run_cpu(generate_caption, image["path"])
             except Exception:
                 caption = "Image"
             try:
-                ocr_text = extract_text(image["path"])
+                ocr_text = await run_subprocess(extract_text, image["path"])
             except Exception:
                 ocr_text = ""
             if ocr_text:
@@ -96,50 +316,140 @@ async def upload_pdf(file: UploadFile = File(...)):
                 "document_id": image.get("document_id"),
                 "path": image.get("path")
             })
-        upsert_images(image_chunks)
+        await run_cpu(upsert_images, image_chunks)
 
-    record_last_uploaded(path, document_id)
+    await run_io(record_last_uploaded, path, document_id)
+    precompute = schedule_precompute(document_id)
 
     return {
         "message": "PDF processed",
         "document_id": document_id,
         "characters_extracted": len(cleaned),
         "chunks": len(chunks),
-        "images": len(images)
+        "images": len(images),
+        "precompute": precompute
     }
 
 
-@app.post("/rag")
-async def rag_query(payload: dict):
-    query = payload.get("query", "")
-    context = query_similar(query, top_k=8)
-    answer = generate_answer(query, context)
+@app.post("/upload_pdf")
+async def upload_pdf(file: UploadFile = File(...)):
+    return await _run_admitted("upload_pdf", _ingest_pdf, file)
+
+
+@app.get("/documents/{document_id}/precompute")
+async def document_precompute_status(document_id: str):
+    status = get_precompute_status(document_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"No precompute job for document_id: {document_id}")
+    return status
+
+
+def _delete_document_data(document_id: str) -> Tuple[Optional[str], bool, int, int, int]:
+    text = load_document_text(document_id)
+    vectors = delete_document_vectors(document_id)
+    delete_chunk_manifest(document_id)
+    derived_deleted = False
+    if text is not None:
+        # Derived artifacts (notes, summary and its partials, voiceovers) are
+        # keyed by content hash; another upload of the same text keeps them.
+        if not text_shared_with_other_document(document_id, text):
+            for partial_input in partial_summary_inputs(text):
+                delete_derived_for_text(partial_input)
+            delete_derived_for_text(text)
+            derived_deleted = True
+        delete_document_text(document_id)
+    files = delete_document_files(document_id)
+    video_runs = delete_video_runs(document_id)
+    return text, derived_deleted, vectors, files, video_runs
+
+
+@app.delete("/documents/{document_id}")
+async def delete_document(document_id: str):
+    # Cancel first so in-flight precompute does not write artifacts back.
+    precompute_cancelled = await cancel_precompute(document_id)
+    text, derived_deleted, vectors, files, video_runs = await run_io(_delete_document_data, document_id)
+
+    if not (precompute_cancelled or vectors or text is not None or files or video_runs):
+        raise HTTPException(status_code=404, detail=f"Document not found: {document_id}")
+    return {
+        "document_id": document_id,
+        "precompute_cancelled": precompute_cancelled,
+        "deleted": {
+            "vectors": vectors,
+            "files": files,
+            "video_runs": video_runs,
+            "derived_artifacts": derived_deleted
+        }
+    }
+
+
+def _collect_related_images(query: str, context: Dict) -> List[Dict[str, Any]]:
     images = []
     metadatas = (context.get("metadatas") or [[]])[0]
     document_ids = [m.get("document_id") for m in metadatas if m]
-    if document_ids:
-        image_context = query_images_for_document(query, document_ids[0], limit=5)
-        image_docs = (image_context.get("documents") or [[]])[0]
-        image_metas = (image_context.get("metadatas") or [[]])[0]
-        for doc, meta in zip(image_docs, image_metas):
-            meta = meta or {}
-            context_snippet = ""
-            page = meta.get("page")
-            if page is not None:
-                page_context = get_text_for_page(document_ids[0], page, limit=1)
-                page_docs = page_context.get("documents") or []
-                page_docs = page_docs[0] if page_docs and isinstance(page_docs[0], list) else page_docs
-                if page_docs:
-                    context_snippet = page_docs[0][:400]
-            images.append({
-                "path": meta.get("path"),
-                "url": meta.get("path"),
-                "caption": meta.get("caption") or doc or "Image",
-                "ocr": meta.get("ocr") or "",
-                "context": context_snippet,
-                "page": meta.get("page"),
-                "document_id": meta.get("document_id")
-            })
+    if not document_ids:
+        return images
+
+    image_context = query_images_for_document(query, document_ids[0], limit=5)
+    image_docs = (image_context.get("documents") or [[]])[0]
+    image_metas = (image_context.get("metadatas") or [[]])[0]
+    for doc, meta in zip(image_docs, image_metas):
+        meta = meta or {}
+        context_snippet = ""
+        page = meta.get("page")
+        if page is not None:
+            page_context = get_text_for_page(document_ids[0], page, limit=1)
+            page_docs = page_context.get("documents") or []
+            page_docs = page_docs[0] if page_docs and isinstance(page_docs[0], list) else page_docs
+            if page_docs:
+                context_snippet = page_docs[0][:400]
+        images.append({
+            "path": meta.get("path"),
+            "url": meta.get("path"),
+            "caption": meta.get("caption") or doc or "Image",
+            "ocr": meta.get("ocr") or "",
+            "context": context_snippet,
+            "page": meta.get("page"),
+            "document_id": meta.get("document_id")
+        })
+    return images
+
+
+def _ndjson(event: Dict[str, Any]) -> str:
+    return json.dumps(event) + "\n"
+
+
+async def _stream_rag_events(
+    query: str,
+    context: Dict,
+    images: List[Dict[str, Any]],
+    use_cache: bool
+) -> AsyncIterator[str]:
+    # Retrieval metadata goes first so the UI can render sources before the answer.
+    yield _ndjson({"type": "context", "context": context, "images": images})
+    try:
+        async for text in generate_answer_stream(query, context, use_cache=use_cache):
+            yield _ndjson({"type": "token", "text": text})
+    except Exception as exc:
+        yield _ndjson({"type": "error", "detail": str(exc)})
+        return
+    yield _ndjson({"type": "done"})
+
+
+@app.post("/rag")
+async def rag_query(payload: dict):
+    query = payload.get("query", "")
+    use_cache = payload.get("cache", True) is not False
+    context = await run_cpu(query_similar, query, top_k=8)
+    if payload.get("stream"):
+        images = await run_io(_collect_related_images, query, context)
+        return StreamingResponse(
+            _stream_rag_events(query, context, images, use_cache),
+            media_type="application/x-ndjson"
+        )
+
+    answer = await generate_answer(query, context, use_cache=use_cache)
+    images = await run_io(_collect_related_images, query, context)
     return {"answer": answer, "context": context, "images": images}
 
 @app.post("/chat")
@@ -156,120 +466,179 @@ async def chat_query(payload: Dict[str, Any]):
     if not user_query:
         raise HTTPException(status_code=400, detail="Missing user query in messages.")
 
-    return await rag_query({"query": user_query})
+    return await rag_query({
+        "query": user_query,
+        "cache": payload.get("cache", True),
+        "stream": payload.get("stream", False)
+    })
 
 
-@app.post("/notes")
-async def notes_query(payload: dict):
+def _find_document_text(payload: Dict[str, Any]) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    # Returns (text, document_id, pdf_path). text is None when the document
+    # predates the text store and its PDF at pdf_path still has to be extracted.
     text = (payload.get("text") or "").strip()
-    if not text:
+    if text:
+        return text, None, None
+
+    document_id = (payload.get("document_id") or "").strip()
+    pdf_path = None
+    if not document_id:
         last_uploaded = get_last_uploaded()
         if not last_uploaded:
             raise HTTPException(status_code=400, detail="No text provided and no uploaded PDF found.")
-
+        document_id = last_uploaded.get("document_id") or ""
         pdf_path = last_uploaded.get("path")
-        if not pdf_path or not os.path.exists(pdf_path):
-            raise HTTPException(status_code=400, detail="Last uploaded PDF not found.")
 
-        full_text, _ = extract_text_from_pdf(pdf_path)
-        text = clean_text(full_text)
-    notes = generate_quick_notes(text)
+    stored = load_document_text(document_id) if document_id else None
+    if stored is not None:
+        return stored, document_id, None
+
+    if not pdf_path and document_id:
+        pdf_path = get_pdf_path_for_document(document_id)
+    if not pdf_path or not os.path.exists(pdf_path):
+        if payload.get("document_id"):
+            raise HTTPException(status_code=404, detail=f"Document not found: {document_id}")
+        raise HTTPException(status_code=400, detail="Last uploaded PDF not found.")
+    return None, document_id or None, pdf_path
+
+
+async def _resolve_document_text(payload: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+    # Returns (text, document_id); document_id is None for ad-hoc text.
+    text, document_id, pdf_path = await run_io(_find_document_text, payload)
+    if text is not None:
+        return text, document_id
+
+    # Documents ingested before the text store existed: extract once and keep it.
+    full_text, _ = await run_cpu(extract_text_from_pdf, pdf_path)
+    text = await run_cpu(clean_text, full_text)
+    if document_id:
+        await run_io(write_document_text, document_id, text)
+    return text, document_id
+
+
+def _wants_refresh(payload: Dict[str, Any], refresh: bool) -> bool:
+    return refresh or str(payload.get("refresh", "")).strip().lower() in ("1", "true", "yes")
+
+
+def _mark_coalesced(response: Response, shared: bool) -> None:
+    response.headers["X-Singleflight"] = "shared" if shared else "leader"
+
+
+@app.post("/notes")
+async def notes_query(payload: dict, response: Response, refresh: bool = False):
+    text, document_id = await _resolve_document_text(payload)
+    wants_refresh = _wants_refresh(payload, refresh)
+    notes, hit, shared = await get_notes(text, refresh=wants_refresh, document_id=document_id)
+    response.headers["X-Cache"] = "hit" if hit else "miss"
+    _mark_coalesced(response, shared)
     return notes
 
 
 @app.post("/notes/summary")
-async def notes_summary(payload: dict):
-    text = (payload.get("text") or "").strip()
-    if not text:
-        last_uploaded = get_last_uploaded()
-        if not last_uploaded:
-            raise HTTPException(status_code=400, detail="No text provided and no uploaded PDF found.")
+async def notes_summary(payload: dict, response: Response, refresh: bool = False):
+    text, _ = await _resolve_document_text(payload)
+    wants_refresh = _wants_refresh(payload, refresh)
+    summary, hit, shared = await get_summary(text, refresh=wants_refresh)
+    response.headers["X-Cache"] = "hit" if hit else "miss"
+    _mark_coalesced(response, shared)
+    return summary
 
-        pdf_path = last_uploaded.get("path")
-        if not pdf_path or not os.path.exists(pdf_path):
-            raise HTTPException(status_code=400, detail="Last uploaded PDF not found.")
-
-        full_text, _ = extract_text_from_pdf(pdf_path)
-        text = clean_text(full_text)
-    return summarize_text_levels(text)
-
-
-def _build_study_notes_from_document(document_id: str) -> str:
-    chunks = get_chunks_for_document(document_id)
-    if not chunks:
-        raise HTTPException(status_code=404, detail=f"No chunks found for document_id: {document_id}")
-
-    combined = []
-    total_chars = 0
-    max_chars = 12000
-    for chunk in chunks:
-        text = (chunk.get("text") or "").strip()
-        if not text:
-            continue
-        if total_chars + len(text) > max_chars:
-            remaining = max_chars - total_chars
-            if remaining > 0:
-                combined.append(text[:remaining])
-            break
-        combined.append(text)
-        total_chars += len(text)
-
-    study_notes = "\n\n".join(combined).strip()
-    if not study_notes:
-        raise HTTPException(status_code=400, detail="Could not build study notes from document chunks.")
-    return study_notes
 
+def _game_engine_http_error(exc: Exception) -> HTTPException:
+    if isinstance(exc, GameEngineError):
+        return HTTPException(status_code=exc.status_code, detail=exc.detail)
+    if getattr(exc, "retry_after", None) is not None:
+        return HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": str(exc.retry_after)})
+    return HTTPException(status_code=502, detail=str(exc))
 
-def _proxy_game_engine(method: str, path: str, payload: Dict[str, Any] | None = None):
-    url = f"{GAME_ENGINE_API_URL}{path}"
-    try:
-        if method.upper() == "GET":
-            response = requests.get(url, timeout=REQUEST_TIMEOUT_SECONDS)
-        else:
-            response = requests.post(url, json=payload or {}, timeout=REQUEST_TIMEOUT_SECONDS)
-    except requests.RequestException as exc:
-        raise HTTPException(status_code=502, detail=f"Failed to connect to game-engine at {GAME_ENGINE_API_URL}: {exc}") from exc
 
+async def _proxy_game_engine(method: str, path: str, payload: Dict[str, Any] | None = None, **kwargs):
     try:
-        data = response.json()
-    except ValueError:
-        data = {"raw": response.text}
-
-    if not response.ok:
-        raise HTTPException(status_code=response.status_code, detail=data)
-    return data
+        return await request_game_engine(method, path, payload, **kwargs)
+    except (GameEngineUnavailable, GameEngineError) as exc:
+        raise _game_engine_http_error(exc) from exc
 
 
-@app.post("/game/generate/{document_id}")
-async def generate_game(document_id: str):
-    study_notes = _build_study_notes_from_document(document_id)
+async def _generate_game(document_id: str) -> Dict[str, Any]:
+    try:
+        study_notes, _ = await get_study_notes(document_id)
+    except LookupError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    if not study_notes:
+        raise HTTPException(status_code=400, detail="Could not build study notes from document chunks.")
     payload = {"study_notes": study_notes}
-    result = _proxy_game_engine("POST", "/api/generate", payload)
+    result = await _proxy_game_engine("POST", "/api/generate", payload)
     return {"document_id": document_id, **result}
 
 
+@app.post("/game/generate/{document_id}")
+async def generate_game(document_id: str, response: Response):
+    # Coalesced so a double-fired request gets the same game task.
+    result, shared = await coalesce(
+        "game_generate", [document_id], partial(_run_admitted, "game_generate", _generate_game, document_id)
+    )
+    _mark_coalesced(response, shared)
+    return result
+
+
+@app.get("/game/engine")
+async def game_engine_stats():
+    return get_game_engine_stats()
+
+
 @app.get("/game/status/{task_id}")
-async def game_status(task_id: str):
-    return _proxy_game_engine("GET", f"/api/status/{task_id}")
+async def game_status(task_id: str, since: Optional[int] = None, wait: float = 0):
+    # Long-poll fallback for clients that cannot use the event stream: with
+    # `since` (the last `version` seen) and `wait`, the engine holds the
+    # request until the status changes.
+    if since is None or wait <= 0:
+        return await _proxy_game_engine("GET", f"/api/status/{task_id}")
+    wait = min(wait, GAME_STATUS_MAX_WAIT_SECONDS)
+    return await _proxy_game_engine(
+        "GET", f"/api/status/{task_id}", params={"since": since, "wait": wait}, extra_timeout=wait
+    )
+
+
+@app.get("/game/status/{task_id}/events")
+async def game_status_events(task_id: str):
+    # Relays the engine's server-sent events: one `status` event per phase
+    # transition, ending after completed/failed.
+    try:
+        stream = await open_game_engine_stream(f"/api/status/{task_id}/events")
+    except (GameEngineUnavailable, GameEngineError) as exc:
+        raise _game_engine_http_error(exc) from exc
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @app.post("/game/launch/{task_id}")
 async def game_launch(task_id: str):
-    return _proxy_game_engine("POST", f"/api/launch/{task_id}")
+    return await _proxy_game_engine("POST", f"/api/launch/{task_id}")
 
 
-@app.post("/generate_video/{document_id}")
-async def generate_video(document_id: str):
-    text_chunks = get_chunks_for_document(document_id)
-    raw_images = get_images_for_document(document_id)
-    image_chunks = normalize_chroma_images(raw_images)
+async def _generate_video(document_id: str) -> Dict[str, Any]:
+    text_chunks, image_chunks = await run_cpu(load_slide_inputs, document_id)
 
     if not text_chunks:
         return {"error": "No text chunks found for document"}
 
-    slides = generate_slide_plan(text_chunks, image_chunks)
+    slides, _ = await get_slide_plan(document_id, text_chunks, image_chunks)
 
     if not slides:
         return {"error": "Slide generation failed"}
 
-    return await generate_video_parallel(slides, image_chunks, document_id=document_id)
+    return await generate_video_parallel(
+        slides, image_chunks, document_id=document_id, tts_cache_dir=await run_io(get_tts_cache_dir, document_id)
+    )
+
+
+@app.post("/generate_video/{document_id}")
+async def generate_video(document_id: str, response: Response):
+    result, shared = await coalesce(
+        "generate_video", [document_id], partial(_run_admitted, "generate_video", _generate_video, document_id)
+    )
+    _mark_coalesced(response, shared)
+    return result
@@ -0,0 +1,50 @@
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture()
+def client(tmp_path, monkeypatch):
+    # Storage paths are relative to the working directory and created at import.
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("EMBEDDING_BACKEND", "hash")
+    monkeypatch.setenv("CAPTION_BACKEND", "stub")
+    monkeypatch.setenv("WARMUP_MODELS", "")
+    monkeypatch.setenv("PRECOMPUTE_ENABLED", "false")
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+def _upload(client, pdf_path):
+    with open(pdf_path, "rb") as f:
+        response = client.post("/upload_pdf", files={"file": ("lecture.pdf", f, "application/pdf")})
+    assert response.status_code == 200, response.text
+    return response.json()["document_id"]
+
+
+def test_deleting_one_copy_keeps_shared_derived_artifacts(client, tmp_path):
+    from app.services.derived_cache_service import derived_dir, load_derived, load_document_text, store_derived
+    from benchmarks.synthetic_pdfs import make_pdf
+
+    pdf_path = str(tmp_path / "lecture.pdf")
+    make_pdf(pdf_path, "text", pages=2, seed=7)
+    first = _upload(client, pdf_path)
+    second = _upload(client, pdf_path)
+    assert first != second
+
+    text = load_document_text(second)
+    assert text is not None and text == load_document_text(first)
+    store_derived("notes", text, "test", "test-model", {"key_points": ["kept"]})
+
+    response = client.delete(f"/documents/{first}")
+    assert response.status_code == 200
+    assert response.json()["deleted"]["derived_artifacts"] is False
+    assert load_derived("notes", text, "test", "test-model") == {"key_points": ["kept"]}
+
+    response = client.delete(f"/documents/{second}")
+    assert response.status_code == 200
+    assert response.json()["deleted"]["derived_artifacts"] is True
+    assert not os.path.exists(derived_dir(text))
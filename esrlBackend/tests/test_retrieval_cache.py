@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+
+
+def test_version_bump_in_another_process_invalidates_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("EMBEDDING_BACKEND", "hash")
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    monkeypatch.chdir(tmp_path)
+    from app.services import embedding_service
+
+    calls = []
+
+    def run_query():
+        calls.append(1)
+        return {"ids": [[f"chunk-{len(calls)}"]]}
+
+    first = embedding_service._cached_query("text", "what is entropy", None, 5, run_query)
+    assert embedding_service._cached_query("text", "What is  entropy", None, 5, run_query) == first
+    assert len(calls) == 1
+
+    # Stand-in for another uvicorn worker that upserted or deleted vectors.
+    subprocess.run(
+        [sys.executable, "-c", "from app.services.embedding_service import bump_collection_version; bump_collection_version()"],
+        cwd=str(tmp_path),
+        env=dict(os.environ, PYTHONPATH=os.pathsep.join([backend_dir, os.environ.get("PYTHONPATH", "")])),
+        check=True
+    )
+
+    second = embedding_service._cached_query("text", "what is entropy", None, 5, run_query)
+    assert len(calls) == 2
+    assert second != first
@@ -126,10 +126,10 @@ class GameDesignAgent:
         self.client = GeminiClient(model_name)
         self.name = "game_design_agent"
 
-    def run(self, study_notes: str) -> str:
+    async def run(self, study_notes: str) -> str:
         """Generate game design from study notes"""
         print(f"\n🎮 {self.name}: Generating game design...")
-        result = self.client.generate(
+        result = await self.client.generate(
             prompt=study_notes,
             system_instruction=GAME_DESIGN_PROMPT
         )
@@ -144,10 +144,10 @@ class LevelDesignAgent:
         self.client = GeminiClient(model_name)
         self.name = "level_design_agent"
 
-    def run(self, game_design: str) -> str:
+    async def run(self, game_design: str) -> str:
         """Generate level design from game design"""
         print(f"\n📊 {self.name}: Creating level progression...")
-        result = self.client.generate(
+        result = await self.client.generate(
             prompt=f"Based on this game design, create a 3-level progression:\n\n{game_design}",
             system_instruction=LEVEL_DESIGN_PROMPT
         )
@@ -162,7 +162,7 @@ class CodeGenerationAgent:
         self.client = GeminiClient(model_name)
         self.name = "code_generation_agent"
 
-    def run(self, game_design: str, level_design: str) -> str:
+    async def run(self, game_design: str, level_design: str) -> str:
         """Generate Phaser.js code from designs"""
         print(f"\n💻 {self.name}: Generating Phaser.js code...")
 
@@ -174,7 +174,7 @@ Level Design:
 
 Please generate a complete, working Phaser.js game based on the above design."""
 
-        result = self.client.generate(
+        result = await self.client.generate(
             prompt=combined_input,
             system_instruction=CODE_GENERATION_PROMPT
         )
@@ -1,43 +1,104 @@
-from fastapi import FastAPI, Request, BackgroundTasks
+from fastapi import FastAPI, Request, BackgroundTasks, Header
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi.responses import JSONResponse, HTMLResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+import asyncio
+import json
 import subprocess
 import os
 import uuid
 from datetime import datetime
 from typing import Dict, Optional
 from agents import game_design_agent, level_design_agent, code_generation_agent
+from profiling import ProfilingMiddleware, is_admin, list_profiles, load_profile, render_folded
 
 app = FastAPI(title="eSRL Game Generator")
+app.add_middleware(ProfilingMiddleware)
 
 templates = Jinja2Templates(directory="templates")
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 generation_status: Dict[str, Dict] = {}
+# Set (and replaced) whenever a task's status changes, waking its stream and
+# long-poll listeners.
+_status_changed: Dict[str, asyncio.Event] = {}
+
+TERMINAL_STATUSES = ("completed", "failed")
+# Comment lines on idle streams keep proxies from closing them.
+STATUS_STREAM_HEARTBEAT_SECONDS = max(1.0, float(os.getenv("STATUS_STREAM_HEARTBEAT_SECONDS", "15")))
+STATUS_LONG_POLL_MAX_SECONDS = 60.0
 
 class GameRequest(BaseModel):
     study_notes: str
 
-def run_game_generation(task_id: str, study_notes: str):
+
+def _update_status(task_id: str, **fields):
+    status = generation_status[task_id]
+    status.update(fields)
+    status["version"] = status.get("version", 0) + 1
+    changed = _status_changed.pop(task_id, None)
+    if changed is not None:
+        changed.set()
+
+
+async def _wait_for_change(task_id: str, since: int, timeout: float) -> bool:
+    # True once the task's version passes `since`, False on timeout.
+    deadline = asyncio.get_running_loop().time() + timeout
+    while generation_status[task_id].get("version", 0) <= since:
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining <= 0:
+            return False
+        changed = _status_changed.setdefault(task_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(changed.wait(), timeout=remaining)
+        except asyncio.TimeoutError:
+            return False
+    return True
+
+
+def _status_summary(task_id: str) -> Dict:
+    # Stream payload: phase transitions without the notes, designs or code.
+    status = generation_status[task_id]
+    summary = {"task_id": task_id}
+    for key in ("status", "phase", "error", "game_file", "created_at", "completed_at", "version"):
+        if key in status:
+            summary[key] = status[key]
+    return summary
+
+
+async def _status_events(task_id: str, request: Request):
+    sent_version = -1
+    while True:
+        status = generation_status.get(task_id)
+        if status is None:
+            yield f"event: error\ndata: {json.dumps({'error': 'Task not found'})}\n\n"
+            return
+        if status.get("version", 0) > sent_version:
+            sent_version = status.get("version", 0)
+            yield f"id: {sent_version}\nevent: status\ndata: {json.dumps(_status_summary(task_id))}\n\n"
+            if status.get("status") in TERMINAL_STATUSES:
+                return
+        if await request.is_disconnected():
+            return
+        if not await _wait_for_change(task_id, sent_version, STATUS_STREAM_HEARTBEAT_SECONDS):
+            yield ": keep-alive\n\n"
+
+async def run_game_generation(task_id: str, study_notes: str):
     try:
-        generation_status[task_id]["status"] = "generating_design"
-        generation_status[task_id]["phase"] = "Game Design (1/3)"
+        _update_status(task_id, status="generating_design", phase="Game Design (1/3)")
 
-        game_design = game_design_agent.run(study_notes)
+        game_design = await game_design_agent.run(study_notes)
         generation_status[task_id]["game_design"] = game_design
 
-        generation_status[task_id]["status"] = "generating_levels"
-        generation_status[task_id]["phase"] = "Level Design (2/3)"
+        _update_status(task_id, status="generating_levels", phase="Level Design (2/3)")
 
-        level_design = level_design_agent.run(game_design)
+        level_design = await level_design_agent.run(game_design)
         generation_status[task_id]["level_design"] = level_design
 
-        generation_status[task_id]["status"] = "generating_code"
-        generation_status[task_id]["phase"] = "Code Generation (3/3)"
+        _update_status(task_id, status="generating_code", phase="Code Generation (3/3)")
 
-        code = code_generation_agent.run(game_design, level_design)
+        code = await code_generation_agent.run(game_design, level_design)
         code = code.replace('```python', '').replace('```', '').strip()
 
         os.makedirs("pygames", exist_ok=True)
@@ -46,16 +107,17 @@ def run_game_generation(task_id: str, study_notes: str):
         with open(game_file, "w", encoding="utf-8") as f:
             f.write(code)
 
-        generation_status[task_id]["status"] = "completed"
-        generation_status[task_id]["phase"] = "Complete"
-        generation_status[task_id]["game_file"] = game_file
-        generation_status[task_id]["code"] = code
-        generation_status[task_id]["completed_at"] = datetime.now().isoformat()
+        _update_status(
+            task_id,
+            status="completed",
+            phase="Complete",
+            game_file=game_file,
+            code=code,
+            completed_at=datetime.now().isoformat()
+        )
 
     except Exception as e:
-        generation_status[task_id]["status"] = "failed"
-        generation_status[task_id]["error"] = str(e)
-        generation_status[task_id]["phase"] = "Failed"
+        _update_status(task_id, status="failed", error=str(e), phase="Failed")
 
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
@@ -69,7 +131,8 @@ async def generate_game(game_request: GameRequest, background_tasks: BackgroundT
         "status": "queued",
         "phase": "Initializing...",
         "created_at": datetime.now().isoformat(),
-        "study_notes": game_request.study_notes
+        "study_notes": game_request.study_notes,
+        "version": 0
     }
 
     background_tasks.add_task(run_game_generation, task_id, game_request.study_notes)
@@ -77,12 +140,29 @@ async def generate_game(game_request: GameRequest, background_tasks: BackgroundT
     return {"task_id": task_id, "status": "queued"}
 
 @app.get("/api/status/{task_id}")
-async def get_status(task_id: str):
+async def get_status(task_id: str, since: Optional[int] = None, wait: float = 0):
+    # Long-poll: with `since` (the last version seen) and `wait`, holds the
+    # request until the status changes or `wait` seconds pass.
     if task_id not in generation_status:
         return JSONResponse({"error": "Task not found"}, status_code=404)
 
+    if since is not None and wait > 0 and generation_status[task_id].get("status") not in TERMINAL_STATUSES:
+        await _wait_for_change(task_id, since, min(wait, STATUS_LONG_POLL_MAX_SECONDS))
     return generation_status[task_id]
 
+
+@app.get("/api/status/{task_id}/events")
+async def stream_status(task_id: str, request: Request):
+    # Server-sent events: one `status` event per phase transition, closed after
+    # completed/failed.
+    if task_id not in generation_status:
+        return JSONResponse({"error": "Task not found"}, status_code=404)
+    return StreamingResponse(
+        _status_events(task_id, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/api/launch/{task_id}")
 async def launch_game(task_id: str):
     if task_id not in generation_status:
@@ -119,6 +199,29 @@ async def get_history():
     history.sort(key=lambda x: x["created_at"], reverse=True)
     return history[:10]
 
+@app.get("/api/admin/profiles")
+async def admin_list_profiles(x_admin_token: Optional[str] = Header(default=None)):
+    if not is_admin(x_admin_token):
+        return JSONResponse({"error": "Invalid admin token"}, status_code=403)
+    return {"profiles": await asyncio.to_thread(list_profiles)}
+
+@app.get("/api/admin/profiles/{profile_id}")
+async def admin_download_profile(
+    profile_id: str,
+    format: str = "json",
+    kind: str = "wall",
+    x_admin_token: Optional[str] = Header(default=None)
+):
+    if not is_admin(x_admin_token):
+        return JSONResponse({"error": "Invalid admin token"}, status_code=403)
+    # Load once and serve from memory: the ring can drop the file at any time.
+    profile = await asyncio.to_thread(load_profile, profile_id)
+    if profile is None:
+        return JSONResponse({"error": "Profile not found"}, status_code=404)
+    if format == "folded":
+        return PlainTextResponse(render_folded(profile, kind=kind))
+    return JSONResponse(profile, headers={"Content-Disposition": f'attachment; filename="profile_{profile_id}.json"'})
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
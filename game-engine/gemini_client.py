@@ -1,33 +1,119 @@
 """
 Direct Gemini API client for eSRL agents
+
+Each event loop gets one long-lived ``genai.Client`` (its aio transport is
+bound to the loop it was created on), so the FastAPI loop reuses pooled
+connections and the loops ``asyncio.run`` creates in orchestrator threads get
+their own. GEMINI_MAX_CONCURRENCY and GEMINI_RPM are enforced across all
+loops and threads in the process. Calls are native async so they never block
+the event loop, and 429/5xx responses are retried with jittered exponential
+backoff.
 """
 
+import asyncio
+import logging
 import os
+import random
+import threading
+import time
+import weakref
 from google import genai
-from google.genai import types
+from google.genai import errors, types
 from typing import Optional
 from dotenv import load_dotenv
 
 load_dotenv()
 
+GEMINI_MAX_CONCURRENCY = max(1, int(os.getenv("GEMINI_MAX_CONCURRENCY", "4")))
+GEMINI_TIMEOUT_SECONDS = max(1.0, float(os.getenv("GEMINI_TIMEOUT_SECONDS", "180")))
+GEMINI_RPM = max(1, int(os.getenv("GEMINI_RPM", "60")))
+GEMINI_MAX_RETRIES = max(0, int(os.getenv("GEMINI_MAX_RETRIES", "4")))
+GEMINI_BACKOFF_BASE_SECONDS = max(0.01, float(os.getenv("GEMINI_BACKOFF_BASE_SECONDS", "1.0")))
+GEMINI_BACKOFF_MAX_SECONDS = max(0.01, float(os.getenv("GEMINI_BACKOFF_MAX_SECONDS", "30")))
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "").strip()
+
+# How often a call waiting for a concurrency slot checks again.
+_SLOT_POLL_SECONDS = 0.05
+
+logger = logging.getLogger(__name__)
+
+_clients = weakref.WeakKeyDictionary()
+_client_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(GEMINI_MAX_CONCURRENCY)
+_rate_lock = threading.Lock()
+_next_request_at = 0.0
+
+
+def get_shared_client() -> genai.Client:
+    """Return the Gemini client for the running event loop, creating it on first use"""
+    loop = asyncio.get_running_loop()
+    with _client_lock:
+        client = _clients.get(loop)
+        if client is None:
+            api_key = os.getenv('GOOGLE_API_KEY')
+            if not api_key:
+                raise ValueError("GOOGLE_API_KEY environment variable not set")
+            http_options = types.HttpOptions(timeout=int(GEMINI_TIMEOUT_SECONDS * 1000))
+            if GEMINI_BASE_URL:
+                # e.g. the offline stand-in at esrlBackend/benchmarks/gemini_stub_server.py
+                http_options.base_url = GEMINI_BASE_URL
+            client = genai.Client(api_key=api_key, http_options=http_options)
+            _clients[loop] = client
+    return client
+
+
+async def _acquire_slot() -> None:
+    """Take one of the process-wide GEMINI_MAX_CONCURRENCY slots without blocking the loop"""
+    while not _slots.acquire(blocking=False):
+        await asyncio.sleep(_SLOT_POLL_SECONDS)
+
+
+async def _wait_for_rate_slot() -> None:
+    """Space requests evenly so the process stays under GEMINI_RPM"""
+    global _next_request_at
+    with _rate_lock:
+        now = time.monotonic()
+        slot = max(now, _next_request_at)
+        _next_request_at = slot + 60.0 / GEMINI_RPM
+    if slot > now:
+        await asyncio.sleep(slot - now)
+
+
+def _penalize_rate(seconds: float) -> None:
+    """Push back the next free slot after a 429 so all agents back off"""
+    global _next_request_at
+    with _rate_lock:
+        _next_request_at = max(_next_request_at, time.monotonic() + seconds)
+
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, errors.APIError):
+        code = getattr(exc, "code", None) or 0
+        return code == 429 or code >= 500
+    return False
+
+
 class GeminiClient:
     """Wrapper for Gemini API calls"""
 
     def __init__(self, model_name: str = "gemini-2.5-flash"):
-        api_key = os.getenv('GOOGLE_API_KEY')
-        if not api_key:
+        if not os.getenv('GOOGLE_API_KEY'):
             raise ValueError("GOOGLE_API_KEY environment variable not set")
-
-        self.client = genai.Client(api_key=api_key)
         self.model_name = model_name
 
-    def generate(self, prompt: str, system_instruction: Optional[str] = None) -> str:
+    async def generate(
+        self,
+        prompt: str,
+        system_instruction: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> str:
         """
         Generate content using Gemini
 
         Args:
             prompt: The user prompt/input
             system_instruction: System instruction for the model
+            timeout: Per-call timeout in seconds (defaults to GEMINI_TIMEOUT_SECONDS)
 
         Returns:
             Generated text
@@ -38,10 +124,33 @@ class GeminiClient:
                 system_instruction=system_instruction
             )
 
-        response = self.client.models.generate_content(
-            model=self.model_name,
-            contents=prompt,
-            config=config
-        )
-
-        return response.text
+        client = get_shared_client()
+        attempt = 0
+        while True:
+            try:
+                await _acquire_slot()
+                try:
+                    await _wait_for_rate_slot()
+                    response = await asyncio.wait_for(
+                        client.aio.models.generate_content(
+                            model=self.model_name,
+                            contents=prompt,
+                            config=config
+                        ),
+                        timeout=timeout or GEMINI_TIMEOUT_SECONDS
+                    )
+                finally:
+                    _slots.release()
+                return response.text
+            except Exception as exc:
+                if not _is_retryable(exc) or attempt >= GEMINI_MAX_RETRIES:
+                    raise
+                ceiling = min(GEMINI_BACKOFF_MAX_SECONDS, GEMINI_BACKOFF_BASE_SECONDS * (2 ** attempt))
+                delay = random.uniform(ceiling / 2, ceiling)
+                if getattr(exc, "code", None) == 429:
+                    _penalize_rate(delay)
+                logger.warning(
+                    "Gemini call failed (%s); retry %d/%d in %.1fs", exc, attempt + 1, GEMINI_MAX_RETRIES, delay
+                )
+                attempt += 1
+                await asyncio.sleep(delay)
@@ -2,8 +2,9 @@
 Orchestrator using direct Gemini API calls
 """
 
+import asyncio
 import os
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
 from agents import game_design_agent, level_design_agent, code_generation_agent
 
 
@@ -15,6 +16,25 @@ class Orchestrator:
         self.level_design_agent = level_design_agent
         self.code_generation_agent = code_generation_agent
 
+    async def _run_agents(self, study_notes: str) -> Tuple[str, str, str]:
+        """Run the three agents in sequence on a single event loop"""
+        # Phase 1: Game Design
+        print("\n📋 Phase 1/3: Game Design")
+        print("-" * 80)
+        game_design = await self.game_design_agent.run(study_notes)
+
+        # Phase 2: Level Design
+        print("\n📋 Phase 2/3: Level Design")
+        print("-" * 80)
+        level_design = await self.level_design_agent.run(game_design)
+
+        # Phase 3: Code Generation
+        print("\n📋 Phase 3/3: Code Generation")
+        print("-" * 80)
+        code = await self.code_generation_agent.run(game_design, level_design)
+
+        return game_design, level_design, code
+
     def run(self, study_notes: str, save_output: bool = True) -> Dict[str, Any]:
         """
         Run the complete workflow: notes -> game design -> levels -> code
@@ -30,20 +50,7 @@ class Orchestrator:
         print(" eSRL Notes-to-Game Generator".center(80))
         print("=" * 80)
 
-        # Phase 1: Game Design
-        print("\n📋 Phase 1/3: Game Design")
-        print("-" * 80)
-        game_design = self.game_design_agent.run(study_notes)
-
-        # Phase 2: Level Design
-        print("\n📋 Phase 2/3: Level Design")
-        print("-" * 80)
-        level_design = self.level_design_agent.run(game_design)
-
-        # Phase 3: Code Generation
-        print("\n📋 Phase 3/3: Code Generation")
-        print("-" * 80)
-        code = self.code_generation_agent.run(game_design, level_design)
+        game_design, level_design, code = asyncio.run(self._run_agents(study_notes))
 
         # Clean up code (remove markdown if present)
         code = code.replace('```python', '').replace('```', '').strip()
@@ -0,0 +1,88 @@
+"""
+On-demand request profiling for the game-engine API
+
+A request is profiled when it carries ``X-Profile: 1`` plus a matching
+``X-Admin-Token`` (so only once ADMIN_TOKEN is set) or is picked by
+PROFILE_SAMPLE_RATE. Profiles go to a bounded ring in PROFILE_DIR.
+
+The sampler is esrlBackend/app/services/request_profiler.py, loaded by path
+so both services run the same code. That module uses only the standard
+library. Game generation runs on the event loop (the Gemini calls are
+async), so only the loop thread is sampled.
+"""
+
+import asyncio
+import importlib.util
+import os
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_RATE = max(0.0, float(os.getenv("PROFILE_SAMPLE_RATE", "0")))
+PROFILE_INTERVAL_MS = max(1.0, float(os.getenv("PROFILE_INTERVAL_MS", "5")))
+PROFILE_MAX_FILES = max(1, int(os.getenv("PROFILE_MAX_FILES", "50")))
+PROFILE_MAX_CONCURRENT = max(1, int(os.getenv("PROFILE_MAX_CONCURRENT", "2")))
+# Game generation runs as a background task inside the /api/generate request,
+# so the default window is long enough to cover all three agents.
+PROFILE_MAX_SECONDS = max(1.0, float(os.getenv("PROFILE_MAX_SECONDS", "900")))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "").strip()
+# The X-Profile header trigger is off unless ADMIN_TOKEN is configured.
+PROFILE_HEADER_ENABLED = os.getenv("PROFILE_HEADER_ENABLED", "true" if ADMIN_TOKEN else "false").strip().lower() in ("1", "true", "yes", "on")
+
+_REQUEST_PROFILER_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "esrlBackend", "app", "services", "request_profiler.py"
+)
+_spec = importlib.util.spec_from_file_location("request_profiler", _REQUEST_PROFILER_PATH)
+request_profiler = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(request_profiler)
+
+render_folded = request_profiler.render_folded
+
+_profiler = request_profiler.RequestProfiler(
+    profile_dir=PROFILE_DIR,
+    admin_token=ADMIN_TOKEN,
+    admin_prefix="/api/admin/",
+    offload=asyncio.to_thread,
+    sample_rate=PROFILE_SAMPLE_RATE,
+    header_enabled=PROFILE_HEADER_ENABLED,
+    interval_ms=PROFILE_INTERVAL_MS,
+    max_files=PROFILE_MAX_FILES,
+    max_concurrent=PROFILE_MAX_CONCURRENT,
+    max_seconds=PROFILE_MAX_SECONDS
+)
+
+
+def is_admin(token: Optional[str]) -> bool:
+    """Return True when ADMIN_TOKEN is configured and the token matches"""
+    return _profiler.is_admin(token)
+
+
+class ProfilingMiddleware:
+    """
+    Plain ASGI middleware (not BaseHTTPMiddleware) so the endpoint runs in
+    the same task and its await chain can be sampled
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        await _profiler.profile_request(self.app, scope, receive, send)
+
+
+def get_profile_path(profile_id: str) -> Optional[str]:
+    """Return the stored profile's path, or None if it is not in the ring"""
+    return _profiler.get_profile_path(profile_id)
+
+
+def load_profile(profile_id: str) -> Optional[Dict]:
+    """Return the stored profile, or None if it is not in the ring"""
+    return _profiler.load_profile(profile_id)
+
+
+def list_profiles() -> List[Dict]:
+    """Return profile summaries, newest first"""
+    return _profiler.list_profiles()